@@ -0,0 +1,95 @@
+import collections
+import itertools
+import random
+from datetime import date, timedelta
+from typing import List
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+
+'''
+    Generates and bulk-loads a synthetic dataset for the benchmarks. Popularity is skewed the way real bookings are:
+    the rank r apartment (and customer, owner, city) is picked with weight 1 / r ** skew, so a few are very busy and
+    most are rarely seen. The same parameters and seed always give the same dataset.
+'''
+
+FIRST_DATE = date(2015, 1, 1)
+
+Dataset = collections.namedtuple('Dataset', ['owners', 'apartments', 'customers', 'owns', 'reservations', 'reviews'])
+
+
+def zipf_weights(n: int, skew: float) -> List[float]:
+    return [1 / rank ** skew for rank in range(1, n + 1)]
+
+
+def generate(owners: int = 1000, apartments: int = 5000, customers: int = 20000, reservations: int = 100000,
+             reviews: int = 50000, cities: int = 50, skew: float = 1.1, seed: int = 0) -> Dataset:
+    rng = random.Random(seed)
+    owner_list = [Owner(i, 'owner %d' % i) for i in range(1, owners + 1)]
+    customer_list = [Customer(i, 'customer %d' % i) for i in range(1, customers + 1)]
+    city_names = ['city %d' % i for i in range(1, cities + 1)]
+    apartment_list = [Apartment(i, 'street %d' % i, city, 'country', rng.randint(20, 200))
+                      for i, city in zip(range(1, apartments + 1),
+                                         rng.choices(city_names, zipf_weights(cities, skew), k=apartments))]
+    # about one apartment in ten has no owner
+    owned = rng.sample(range(1, apartments + 1), apartments - apartments // 10)
+    owns = list(zip(rng.choices(range(1, owners + 1), zipf_weights(owners, skew), k=len(owned)), owned))
+
+    # every apartment is booked back to back from FIRST_DATE, with a random gap between its reservations
+    next_free = [FIRST_DATE] * (apartments + 1)
+    reservation_list = []
+    customer_ids = rng.choices(range(1, customers + 1), zipf_weights(customers, skew), k=reservations)
+    apartment_ids = rng.choices(range(1, apartments + 1), zipf_weights(apartments, skew), k=reservations)
+    for customer_id, apartment_id in zip(customer_ids, apartment_ids):
+        start = next_free[apartment_id] + timedelta(days=rng.randint(0, 30))
+        end = start + timedelta(days=rng.randint(1, 14))
+        next_free[apartment_id] = end
+        price = round((end - start).days * rng.uniform(50, 500), 2)
+        reservation_list.append((customer_id, apartment_id, start, end, price))
+
+    # reviews of distinct (customer, apartment) reservations, after their stay. every apartment has a quality around
+    # which its ratings are spread
+    quality = [rng.gauss(6.5, 1.5) for _ in range(apartments + 1)]
+    reviewable = {}
+    for customer_id, apartment_id, _, end, _ in reservation_list:
+        reviewable.setdefault((customer_id, apartment_id), end)
+    review_list = [(customer_id, apartment_id, end + timedelta(days=rng.randint(1, 30)),
+                    min(10, max(1, round(rng.gauss(quality[apartment_id], 1.5)))), 'review')
+                   for (customer_id, apartment_id), end in rng.sample(sorted(reviewable.items()),
+                                                                      min(reviews, len(reviewable)))]
+    return Dataset(owner_list, apartment_list, customer_list, owns, reservation_list, review_list)
+
+
+# recreates the tables and loads the dataset, returns the number of rows loaded per table
+def load(dataset: Dataset) -> dict:
+    Solution.drop_tables()
+    Solution.create_tables()
+    Solution.add_owners(dataset.owners)
+    Solution.add_apartments(dataset.apartments)
+    Solution.add_customers(dataset.customers)
+    starts = [start for _, _, start, _, _ in dataset.reservations]
+    if starts:
+        Solution.add_reservation_partitions(min(starts).year, max(starts).year)
+    with Connector.DBConnector() as conn:
+        with conn.transaction():
+            conn.execute_values("INSERT INTO Owns(owner_id, apartment_id) VALUES %s", dataset.owns)
+            conn.execute_values("INSERT INTO Reservation(customer_id, apartment_id, start_date, end_date, "
+                                "total_price) VALUES %s", dataset.reservations)
+            conn.execute_values("INSERT INTO Review(customer_id, apartment_id, review_date, rating, review_text) "
+                                "VALUES %s", dataset.reviews)
+    Solution.analyze_tables()
+    return {name: len(rows) for name, rows in dataset._asdict().items()}
+
+
+# the years the reservations of the dataset end in
+def years(dataset: Dataset) -> List[int]:
+    return sorted({end.year for _, _, _, end, _ in dataset.reservations}) or [FIRST_DATE.year]
+
+
+# ids above those of the dataset, for entities added while benchmarking
+def fresh_ids(dataset: Dataset, base: int):
+    return itertools.count(max(len(dataset.owners), len(dataset.apartments), len(dataset.customers)) + base + 1)
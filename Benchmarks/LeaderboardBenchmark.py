@@ -0,0 +1,82 @@
+import time
+from datetime import date, timedelta
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+
+'''
+    Compares get_top_customer and reservations_per_owner, which read the maintained reservation counts, with
+    aggregating the reservations at request time (get_top_customer_direct, reservations_per_owner_direct).
+    The reservations are generated by the server and loaded with the counting triggers disabled, then counted once
+    with rebuild_reservation_counts. Needs the database of database.ini and recreates the tables in it, run from the
+    project root:
+    python -m Benchmarks.LeaderboardBenchmark
+'''
+
+
+def load(conn: Connector.DBConnector, owners: int, apartments: int, customers: int, reservations: int) -> float:
+    conn.execute("INSERT INTO Owner SELECT i, 'owner ' || i FROM generate_series(1, %d) i" % owners)
+    conn.execute("INSERT INTO Apartment SELECT i, 'street ' || i, 'city ' || i %% 100, 'country', 50 "
+                 "FROM generate_series(1, %d) i" % apartments)
+    conn.execute("INSERT INTO Customer SELECT i, 'customer ' || i FROM generate_series(1, %d) i" % customers)
+    conn.execute("INSERT INTO Owns SELECT 1 + i %% %d, i FROM generate_series(1, %d) i" % (owners, apartments))
+    # the k-th reservation of an apartment takes the k-th night after 2000-01-01, so none of them overlap
+    Solution.add_reservation_partitions(2000, (date(2000, 1, 1) + timedelta(days=reservations // apartments)).year)
+    conn.execute("ALTER TABLE Reservation DISABLE TRIGGER USER")
+    try:
+        conn.execute("""
+            INSERT INTO Reservation(customer_id, apartment_id, start_date, end_date, total_price)
+            SELECT 1 + (i * 7919) %% %(customers)d, 1 + i %% %(apartments)d,
+                   DATE '2000-01-01' + i / %(apartments)d, DATE '2000-01-02' + i / %(apartments)d, 100
+            FROM generate_series(0, %(reservations)d - 1) i
+        """ % {'customers': customers, 'apartments': apartments, 'reservations': reservations})
+    finally:
+        conn.execute("ALTER TABLE Reservation ENABLE TRIGGER USER")
+    Solution.rebuild_profit_rollup()
+    began = time.perf_counter()
+    Solution.rebuild_reservation_counts()
+    took = time.perf_counter() - began
+    Solution.analyze_tables()
+    return took
+
+
+def timed(conn: Connector.DBConnector, query: str, repeat: int, prepared: bool) -> (float, list):
+    began = time.perf_counter()
+    for _ in range(repeat):
+        _, result = conn.execute_prepared(query, ()) if prepared else conn.execute(query)
+    took = (time.perf_counter() - began) / repeat
+    return took, sorted(tuple(row.values) for row in result)
+
+
+def run(owners: int = 10000, apartments: int = 100000, customers: int = 1000000, reservations: int = 10000000,
+        repeat: int = 5) -> dict:
+    Solution.drop_tables()
+    Solution.create_tables()
+    try:
+        conn = Connector.DBConnector()
+        try:
+            rebuild_time = load(conn, owners, apartments, customers, reservations)
+            report = {'reservations': reservations, 'rebuild': rebuild_time}
+            for name, prepared in (('get_top_customer', True), ('reservations_per_owner', False)):
+                statements = Solution.PREPARED_STATEMENTS if prepared else Solution.STREAMED_QUERIES
+                counter_time, counter_result = timed(conn, name if prepared else statements[name], repeat, prepared)
+                direct = name + '_direct'
+                direct_time, direct_result = timed(conn, direct if prepared else statements[direct], repeat,
+                                                   prepared)
+                if counter_result != direct_result:
+                    raise AssertionError('the counters and the reservations disagree on ' + name)
+                report[name] = {'counter': counter_time, 'direct': direct_time}
+            return report
+        finally:
+            conn.close()
+    finally:
+        Solution.drop_tables()
+
+
+if __name__ == '__main__':
+    report = run()
+    print('counted %d reservations in %.2fs' % (report['reservations'], report['rebuild']))
+    for name in ('get_top_customer', 'reservations_per_owner'):
+        print('%s: direct %.4fs   counter %.4fs   speedup %.1fx'
+              % (name, report[name]['direct'], report[name]['counter'],
+                 report[name]['direct'] / report[name]['counter']))
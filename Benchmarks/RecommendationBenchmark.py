@@ -0,0 +1,82 @@
+import random
+import time
+from datetime import date, timedelta
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+
+'''
+    Compares get_apartment_recommendation, which reads the CustomerRatio index, with computing the ratios from the
+    reviews at request time (get_apartment_recommendation_direct), on a synthetic dataset.
+    Needs the database of database.ini and recreates the tables in it, run from the project root:
+    python -m Benchmarks.RecommendationBenchmark
+'''
+
+FIRST_DATE = date(2000, 1, 1)
+
+
+def load(customers: int, apartments: int, reviews_per_customer: int, seed: int) -> float:
+    rng = random.Random(seed)
+    Solution.add_customers(Customer(i, 'customer %d' % i) for i in range(1, customers + 1))
+    Solution.add_apartments(Apartment(i, 'street %d' % i, 'city %d' % (i % 100), 'country', 50)
+                            for i in range(1, apartments + 1))
+    reservations, reviews = [], []
+    for customer_id in range(1, customers + 1):
+        # a customer's nights are their own, so reservations of different customers never overlap
+        start = FIRST_DATE + timedelta(days=2 * customer_id)
+        for apartment_id in rng.sample(range(1, apartments + 1), reviews_per_customer):
+            reservations.append((customer_id, apartment_id, start, start + timedelta(days=1), 100))
+            reviews.append((customer_id, apartment_id, start + timedelta(days=2), rng.randint(1, 10), 'text'))
+    Solution.add_reservation_partitions(FIRST_DATE.year, (FIRST_DATE + timedelta(days=2 * customers)).year)
+    conn = Connector.DBConnector()
+    try:
+        conn.execute_values("INSERT INTO Reservation(customer_id, apartment_id, start_date, end_date, total_price) "
+                            "VALUES %s", reservations)
+        began = time.perf_counter()
+        conn.execute_values("INSERT INTO Review(customer_id, apartment_id, review_date, rating, review_text) "
+                            "VALUES %s", reviews)
+        took = time.perf_counter() - began
+    finally:
+        conn.close()
+    Solution.analyze_tables()
+    return took
+
+
+def query(statement: str, customer_ids: list) -> (float, list):
+    conn = Connector.DBConnector()
+    try:
+        results = []
+        began = time.perf_counter()
+        for customer_id in customer_ids:
+            _, result = conn.execute_prepared(statement, (customer_id,))
+            results.append([] if result.isEmpty() else [(row['id'], round(row['rating'], 9)) for row in result])
+        return time.perf_counter() - began, results
+    finally:
+        conn.close()
+
+
+def run(customers: int = 100000, apartments: int = 50000, reviews_per_customer: int = 3, queries: int = 200,
+        seed: int = 0) -> dict:
+    Solution.drop_tables()
+    Solution.create_tables()
+    try:
+        load_time = load(customers, apartments, reviews_per_customer, seed)
+        customer_ids = random.Random(seed).sample(range(1, customers + 1), queries)
+        index_time, index_results = query('get_apartment_recommendation', customer_ids)
+        direct_time, direct_results = query('get_apartment_recommendation_direct', customer_ids)
+        if index_results != direct_results:
+            raise AssertionError('the index and the reviews disagree')
+        return {'reviews': customers * reviews_per_customer, 'load': load_time, 'queries': queries,
+                'index': index_time, 'direct': direct_time}
+    finally:
+        Solution.drop_tables()
+
+
+if __name__ == '__main__':
+    report = run()
+    print('loaded %d reviews (maintaining the index) in %.2fs' % (report['reviews'], report['load']))
+    print('%d recommendations: direct %.3fs   index %.3fs   speedup %.1fx'
+          % (report['queries'], report['direct'], report['index'], report['direct'] / report['index']))
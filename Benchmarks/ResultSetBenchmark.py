@@ -0,0 +1,71 @@
+import collections
+import timeit
+
+from Utility.DBConnector import ResultSet, ResultSetDict
+
+'''
+    Compares the tuple-backed ResultSet rows with the previous dict-per-row implementation.
+    Does not need a database, run from the project root: python -m Benchmarks.ResultSetBenchmark
+'''
+
+Column = collections.namedtuple('Column', ['name'])
+
+
+class LegacyResultSet:
+    # the ResultSet implementation before rows became ResultSetRow, kept for comparison
+    def __init__(self, description, results):
+        self.rows = results.copy()
+        self.cols_header = [d.name for d in description]
+        self.cols = ResultSetDict()
+        for col, index in zip(self.cols_header, range(len(results[0]))):
+            self.cols[col] = index
+
+    def __getitem__(self, idx):
+        if type(idx) == str:
+            return [x[self.cols[idx]] for x in self.rows]
+        return self.__getRow(idx)
+
+    def __iter__(self):
+        for row in range(len(self.rows)):
+            yield self.__getRow(row)
+
+    def __getRow(self, row: int):
+        row_to_return = ResultSetDict()
+        for val, col in zip(self.rows[row], self.cols_header):
+            row_to_return[col] = val
+        return row_to_return
+
+
+def make_results(n: int):
+    description = [Column('id'), Column('address'), Column('city'), Column('country'), Column('size')]
+    rows = [(i, 'street %d' % i, 'city %d' % (i % 100), 'country %d' % (i % 10), 50 + i % 200) for i in range(n)]
+    return description, rows
+
+
+def iterate(result_set):
+    total = 0
+    for row in result_set:
+        total += row['size']
+    return total
+
+
+def column(result_set):
+    return result_set['size']
+
+
+def run(n: int = 1000000, repeat: int = 3) -> dict:
+    description, rows = make_results(n)
+    legacy, current = LegacyResultSet(description, rows), ResultSet(description, rows)
+    report = {}
+    for name, function in (('iterate', iterate), ('column', column)):
+        report[name] = {
+            'legacy': min(timeit.repeat(lambda: function(legacy), number=1, repeat=repeat)),
+            'current': min(timeit.repeat(lambda: function(current), number=1, repeat=repeat)),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    for name, times in run().items():
+        print('%-8s legacy %.3fs   current %.3fs   speedup %.1fx'
+              % (name, times['legacy'], times['current'], times['legacy'] / times['current']))
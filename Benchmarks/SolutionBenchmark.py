@@ -0,0 +1,256 @@
+import argparse
+import inspect
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, List
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Benchmarks import DataGenerator
+
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+
+'''
+    Times every public Solution function on a generated dataset (see DataGenerator), once with a single thread and
+    once for every other requested number of threads, and prints a JSON report: per function the latency percentiles
+    in milliseconds, the throughput in calls per second and the round trips to the server per call.
+    Needs the database of database.ini and recreates the tables in it, run from the project root:
+    python -m Benchmarks.SolutionBenchmark --threads 1,8 --output report.json
+
+    The functions run one after the other, each called calls times, in an order where the writes build on each
+    other: owners, apartments and customers are added, own apartments, make reservations and review them, and the
+    reservations, ownerships and entities are removed again at the end, leaving the dataset as it was loaded.
+'''
+
+# the reports scan the whole dataset, they are called this many times less often than the other functions
+REPORT_DIVISOR = 20
+# the items of every call of the bulk loads and of the batch lookups, which are called this many times less often
+BULK_SIZE = 100
+
+
+class Workload:
+    # the calls of one run. the entities it adds are remembered, so that the functions that change or remove them have
+    # something to act on, and get ids and reservation dates of their own
+    def __init__(self, dataset: DataGenerator.Dataset, calls: int, run_number: int, skew: float, seed: int):
+        self.dataset = dataset
+        self.calls = calls
+        self.rng = random.Random(seed)
+        self.ids = DataGenerator.fresh_ids(dataset, run_number * (10 * calls + 10 * BULK_SIZE))
+        self.first_day = date(2100, 1, 1) + timedelta(days=run_number * 2 * calls)
+        self.owners, self.apartments, self.customers = [], [], []
+        self.owns, self.reservations, self.reviews = [], [], []
+        self.years = DataGenerator.years(dataset)
+        self.apartment_weights = DataGenerator.zipf_weights(len(dataset.apartments), skew)
+        self.customer_weights = DataGenerator.zipf_weights(len(dataset.customers), skew)
+        self.owner_weights = DataGenerator.zipf_weights(len(dataset.owners), skew)
+
+    def apartment_ids(self, k: int) -> List[int]:
+        return self.rng.choices(range(1, len(self.dataset.apartments) + 1), self.apartment_weights, k=k)
+
+    def customer_ids(self, k: int) -> List[int]:
+        return self.rng.choices(range(1, len(self.dataset.customers) + 1), self.customer_weights, k=k)
+
+    def owner_ids(self, k: int) -> List[int]:
+        return self.rng.choices(range(1, len(self.dataset.owners) + 1), self.owner_weights, k=k)
+
+    def new_owner(self) -> Owner:
+        id = next(self.ids)
+        return Owner(id, 'bench owner %d' % id)
+
+    def new_apartment(self) -> Apartment:
+        id = next(self.ids)
+        return Apartment(id, 'bench street %d' % id, 'city 1', 'country', 80)
+
+    def new_customer(self) -> Customer:
+        id = next(self.ids)
+        return Customer(id, 'bench customer %d' % id)
+
+    # the phases of the benchmark in order: (function, arguments of every call, what to remember of the calls that
+    # returned OK)
+    def phases(self):
+        calls, reports = self.calls, max(1, self.calls // REPORT_DIVISOR)
+        yield 'add_owner', lambda: [(self.new_owner(),) for _ in range(calls)], \
+            lambda args: self.owners.append(args[0].get_owner_id())
+        yield 'add_apartment', lambda: [(self.new_apartment(),) for _ in range(calls)], \
+            lambda args: self.apartments.append(args[0].get_id())
+        yield 'add_customer', lambda: [(self.new_customer(),) for _ in range(calls)], \
+            lambda args: self.customers.append(args[0].get_customer_id())
+        bulk = max(1, calls // BULK_SIZE)
+        yield 'add_owners', lambda: [([self.new_owner() for _ in range(BULK_SIZE)],) for _ in range(bulk)], \
+            lambda args: self.owners.extend(owner.get_owner_id() for owner in args[0])
+        yield 'add_apartments', lambda: [([self.new_apartment() for _ in range(BULK_SIZE)],) for _ in range(bulk)], \
+            lambda args: self.apartments.extend(apartment.get_id() for apartment in args[0])
+        yield 'add_customers', lambda: [([self.new_customer() for _ in range(BULK_SIZE)],) for _ in range(bulk)], \
+            lambda args: self.customers.extend(customer.get_customer_id() for customer in args[0])
+        yield 'get_owner', lambda: [(id,) for id in self.owner_ids(calls)], None
+        yield 'get_apartment', lambda: [(id,) for id in self.apartment_ids(calls)], None
+        yield 'get_customer', lambda: [(id,) for id in self.customer_ids(calls)], None
+        yield 'get_owners', lambda: [(self.owner_ids(BULK_SIZE),) for _ in range(bulk)], None
+        yield 'get_apartments', lambda: [(self.apartment_ids(BULK_SIZE),) for _ in range(bulk)], None
+        yield 'get_customers', lambda: [(self.customer_ids(BULK_SIZE),) for _ in range(bulk)], None
+        yield 'owner_owns_apartment', \
+            lambda: [(self.owners[k % len(self.owners)], apartment_id)
+                     for k, apartment_id in enumerate(self.apartments[:calls] if self.owners else [])], \
+            lambda args: self.owns.append(args)
+        yield 'get_apartment_owner', lambda: [(id,) for id in self.apartment_ids(calls)], None
+        yield 'get_apartment_owners', lambda: [(self.apartment_ids(BULK_SIZE),) for _ in range(bulk)], None
+        yield 'get_owner_apartments', lambda: [(id,) for id in self.owner_ids(calls)], None
+        yield 'customer_made_reservation', self.reservations_to_make, lambda args: self.reservations.append(args)
+        yield 'customer_reviewed_apartment', \
+            lambda: [(customer_id, apartment_id, end + timedelta(days=1), self.rng.randint(1, 10), 'bench')
+                     for customer_id, apartment_id, _, end, _ in self.reservations], \
+            lambda args: self.reviews.append(args)
+        yield 'customer_updated_review', \
+            lambda: [(customer_id, apartment_id, review_date + timedelta(days=1), self.rng.randint(1, 10), 'bench')
+                     for customer_id, apartment_id, review_date, _, _ in self.reviews], None
+        yield 'get_apartment_rating', lambda: [(id,) for id in self.apartment_ids(calls)], None
+        yield 'get_owner_rating', lambda: [(id,) for id in self.owner_ids(calls)], None
+        yield 'get_top_customer', lambda: [() for _ in range(calls)], None
+        yield 'reservations_per_owner', lambda: [() for _ in range(reports)], None
+        yield 'get_all_location_owners', lambda: [() for _ in range(reports)], None
+        yield 'best_value_for_money', lambda: [() for _ in range(reports)], None
+        yield 'profit_per_month', lambda: [(self.rng.choice(self.years),) for _ in range(calls)], None
+        yield 'get_apartment_recommendation', lambda: [(id,) for id in self.customer_ids(calls)], None
+        yield 'customer_cancelled_reservation', \
+            lambda: [(customer_id, apartment_id, start) for customer_id, apartment_id, start, _, _ in self.reservations], \
+            None
+        yield 'owner_drops_apartment', lambda: list(self.owns), None
+        yield 'delete_apartment', lambda: [(id,) for id in self.apartments], None
+        yield 'delete_owner', lambda: [(id,) for id in self.owners], None
+        yield 'delete_customer', lambda: [(id,) for id in self.customers], None
+
+    # the added customers book the popular apartments, every reservation on nights of its own
+    def reservations_to_make(self) -> list:
+        reservations = []
+        if not self.customers:
+            return reservations
+        for k, apartment_id in enumerate(self.apartment_ids(self.calls)):
+            start = self.first_day + timedelta(days=2 * k)
+            reservations.append((self.customers[k % len(self.customers)], apartment_id, start,
+                                 start + timedelta(days=1), 250.0))
+        return reservations
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+# calls function with every arguments tuple, split between threads, returns the report of the function and the
+# arguments of the calls that returned OK
+def measure(function: Callable, arguments: list, threads: int) -> (dict, list):
+    latencies, succeeded = [], []
+    lock = threading.Lock()
+
+    def worker(share: list):
+        mine, ok = [], []
+        for args in share:
+            began = time.perf_counter()
+            result = function(*args)
+            mine.append(time.perf_counter() - began)
+            # the bulk functions return a list, one ReturnValue per item
+            if result == ReturnValue.OK or isinstance(result, list) and ReturnValue.OK in result:
+                ok.append(args)
+        with lock:
+            latencies.extend(mine)
+            succeeded.extend(ok)
+
+    workers = [threading.Thread(target=worker, args=(arguments[i::threads],)) for i in range(threads)]
+    round_trips = Connector.DBConnector.round_trips()
+    began = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - began
+    round_trips = Connector.DBConnector.round_trips() - round_trips
+
+    latencies.sort()
+    calls = len(latencies)
+    if calls == 0:
+        return {'calls': 0}, succeeded
+    return {
+        'calls': calls,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': sum(latencies) / calls * 1000,
+        'throughput': calls / wall if wall > 0 else None,
+        'round_trips_per_call': round_trips / calls,
+        'ok': len(succeeded),
+    }, succeeded
+
+
+def run_workload(workload: Workload, threads: int) -> dict:
+    report = {}
+    for name, make_arguments, remember in workload.phases():
+        report[name], succeeded = measure(getattr(Solution, name), make_arguments(), threads)
+        if remember is not None:
+            for args in succeeded:
+                remember(args)
+    return report
+
+
+def run(owners: int = 1000, apartments: int = 5000, customers: int = 20000, reservations: int = 100000,
+        reviews: int = 50000, skew: float = 1.1, seed: int = 0, calls: int = 1000, threads: List[int] = (1, 8)) -> dict:
+    dataset = DataGenerator.generate(owners, apartments, customers, reservations, reviews, skew=skew, seed=seed)
+    began = time.perf_counter()
+    rows = DataGenerator.load(dataset)
+    report = {
+        'dataset': {'owners': owners, 'apartments': apartments, 'customers': customers, 'reservations': reservations,
+                    'reviews': reviews, 'skew': skew, 'seed': seed, 'rows': rows},
+        'load_seconds': time.perf_counter() - began,
+        'calls': calls,
+        'runs': [],
+    }
+    try:
+        for run_number, thread_count in enumerate(threads):
+            # every run starts with cold caches
+            Solution._clear_caches()
+            workload = Workload(dataset, calls, run_number, skew, seed)
+            report['runs'].append({'threads': thread_count, 'functions': run_workload(workload, thread_count)})
+    finally:
+        Solution.drop_tables()
+    # the schema changes and maintenance tools
+    timed = set(report['runs'][0]['functions']) if report['runs'] else set()
+    report['untimed'] = sorted(name for name, function in inspect.getmembers(Solution, inspect.isfunction)
+                               if not name.startswith('_') and function.__module__ == Solution.__name__
+                               and name not in timed)
+    # the retries of failed statements and transactions while loading and benchmarking, see DBConnector.retries
+    report['retries'] = Connector.DBConnector.retries()
+    # the hit rates of the cached results of the BASIC and ADVANCED API over all the runs, see Solution.RESULT_CACHE
+    report['result_cache'] = Solution.RESULT_CACHE.stats()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Solution API on a generated dataset.')
+    parser.add_argument('--owners', type=int, default=1000)
+    parser.add_argument('--apartments', type=int, default=5000)
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--reservations', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=50000)
+    parser.add_argument('--skew', type=float, default=1.1, help='popularity skew, 0 for uniform')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--calls', type=int, default=1000, help='calls per function')
+    parser.add_argument('--threads', default='1,8', help='comma separated numbers of threads, one run each')
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+    report = run(args.owners, args.apartments, args.customers, args.reservations, args.reviews, args.skew, args.seed,
+                 args.calls, [int(threads) for threads in args.threads.split(',')])
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,9 @@
+from typing import List
+
+
 class Apartment:
+    __slots__ = ('__id', '__address', '__city', '__country', '__size')
+
     def __init__(self, id: int=None, address: str=None, city: str=None, country: str=None, size: float=None) -> None:
         self.__id = id
         self.__address = address
@@ -40,9 +45,53 @@ class Apartment:
     def bad_apartment():
         return Apartment()
 
+    # builds an object from a DBConnector row with columns id, address, city, country and size
+    @classmethod
+    def from_row(cls, row) -> 'Apartment':
+        return cls(row['id'], row['address'], row['city'], row['country'], row['size'])
+
+    # builds objects from every row of a DBConnector ResultSet (or any iterable of rows) with columns id, address,
+    # city, country and size
+    @classmethod
+    def from_resultset(cls, result) -> List['Apartment']:
+        if hasattr(result, 'rows') and not result.isEmpty():
+            return list(map(cls, result['id'], result['address'], result['city'], result['country'],
+                            result['size']))
+        return [cls.from_row(row) for row in result]
+
+    # an immutable copy, which is safe to use in sets and as a dict key
+    def freeze(self) -> 'FrozenApartment':
+        return FrozenApartment(self.__id, self.__address, self.__city, self.__country, self.__size)
+
+    # a mutable copy, e.g. of a frozen object taken from a cache
+    def thaw(self) -> 'Apartment':
+        return Apartment(self.__id, self.__address, self.__city, self.__country, self.__size)
+
     def __eq__(self, __value: object) -> bool:
-        if type(self) != type(__value): return False
+        if not isinstance(__value, Apartment): return False
         else: return self.__id == __value.__id and self.__address == __value.__address and self.__city == __value.__city and self.__country == __value.__country
 
     def __str__(self) -> str:
-        return f'apartment_id={self.__id}, address={self.__address}, city={self.__city}, country={self.__country}'
\ No newline at end of file
+        return f'apartment_id={self.__id}, address={self.__address}, city={self.__city}, country={self.__country}'
+
+
+class FrozenApartment(Apartment):
+    __slots__ = ()
+
+    def set_id(self, id):
+        raise AttributeError('FrozenApartment is immutable')
+
+    def set_address(self, address):
+        raise AttributeError('FrozenApartment is immutable')
+
+    def set_city(self, city):
+        raise AttributeError('FrozenApartment is immutable')
+
+    def set_country(self, country):
+        raise AttributeError('FrozenApartment is immutable')
+
+    def set_size(self, size):
+        raise AttributeError('FrozenApartment is immutable')
+
+    def __hash__(self) -> int:
+        return hash((self.get_id(), self.get_address(), self.get_city(), self.get_country()))
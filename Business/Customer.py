@@ -1,4 +1,9 @@
+from typing import List
+
+
 class Customer:
+    __slots__ = ('__id', '__name')
+
     def __init__(self, customer_id: int=None, customer_name: str=None) -> None:
         self.__id = customer_id
         self.__name = customer_name
@@ -19,9 +24,42 @@ class Customer:
     def bad_customer():
         return Customer()
 
+    # builds an object from a DBConnector row with columns id and name
+    @classmethod
+    def from_row(cls, row) -> 'Customer':
+        return cls(row['id'], row['name'])
+
+    # builds objects from every row of a DBConnector ResultSet (or any iterable of rows) with columns id and name
+    @classmethod
+    def from_resultset(cls, result) -> List['Customer']:
+        if hasattr(result, 'rows') and not result.isEmpty():
+            return list(map(cls, result['id'], result['name']))
+        return [cls.from_row(row) for row in result]
+
+    # an immutable copy, which is safe to use in sets and as a dict key
+    def freeze(self) -> 'FrozenCustomer':
+        return FrozenCustomer(self.__id, self.__name)
+
+    # a mutable copy, e.g. of a frozen object taken from a cache
+    def thaw(self) -> 'Customer':
+        return Customer(self.__id, self.__name)
+
     def __eq__(self, __value: object) -> bool:
-        if type(self) != type(__value): return False
+        if not isinstance(__value, Customer): return False
         else: return self.__id == __value.__id and self.__name == __value.__name
 
     def __str__(self) -> str:
-        return f'customer_id={self.__id}, customer_name={self.__name}'
\ No newline at end of file
+        return f'customer_id={self.__id}, customer_name={self.__name}'
+
+
+class FrozenCustomer(Customer):
+    __slots__ = ()
+
+    def set_customer_id(self, id):
+        raise AttributeError('FrozenCustomer is immutable')
+
+    def set_customer_name(self, name):
+        raise AttributeError('FrozenCustomer is immutable')
+
+    def __hash__(self) -> int:
+        return hash((self.get_customer_id(), self.get_customer_name()))
@@ -1,4 +1,9 @@
+from typing import List
+
+
 class Owner:
+    __slots__ = ('__id', '__name')
+
     def __init__(self, owner_id: int=None, owner_name: str=None) -> None:
         self.__id = owner_id
         self.__name = owner_name
@@ -19,9 +24,43 @@ class Owner:
     def bad_owner():
         return Owner()
 
+    # builds an object from a DBConnector row with columns id and name
+    @classmethod
+    def from_row(cls, row) -> 'Owner':
+        return cls(row['id'], row['name'])
+
+    # builds objects from every row of a DBConnector ResultSet (or any iterable of rows) with columns id and name
+    @classmethod
+    def from_resultset(cls, result) -> List['Owner']:
+        if hasattr(result, 'rows') and not result.isEmpty():
+            return list(map(cls, result['id'], result['name']))
+        return [cls.from_row(row) for row in result]
+
+    # an immutable copy, which is safe to use in sets and as a dict key
+    def freeze(self) -> 'FrozenOwner':
+        return FrozenOwner(self.__id, self.__name)
+
+    # a mutable copy, e.g. of a frozen object taken from a cache
+    def thaw(self) -> 'Owner':
+        return Owner(self.__id, self.__name)
+
     def __eq__(self, __value: object) -> bool:
-        if type(self) != type(__value): return False
+        if not isinstance(__value, Owner): return False
         else: return self.__id == __value.__id and self.__name == __value.__name
 
     def __str__(self) -> str:
-        return f'owner_id={self.__id}, owner_name={self.__name}'
\ No newline at end of file
+        return f'owner_id={self.__id}, owner_name={self.__name}'
+
+
+class FrozenOwner(Owner):
+    __slots__ = ()
+
+    def set_owner_id(self, id):
+        raise AttributeError('FrozenOwner is immutable')
+
+    def set_owner_name(self, name):
+        raise AttributeError('FrozenOwner is immutable')
+
+    # only the immutable copy is hashable, a mutable object could change while in a set or dict
+    def __hash__(self) -> int:
+        return hash((self.get_owner_id(), self.get_owner_name()))
@@ -1,15 +1,207 @@
-from typing import List, Tuple
+import gzip
+import os
+import re
+from typing import Callable, Iterable, List, Optional, Tuple
+from itertools import islice
 from psycopg2 import sql
 from datetime import date, datetime
 
 import Utility.DBConnector as Connector
 from Utility.ReturnValue import ReturnValue
 from Utility.Exceptions import DatabaseException
+from Utility.Cache import LRUCache, ResultCache
 
 from Business.Owner import Owner
 from Business.Customer import Customer
 from Business.Apartment import Apartment
 
+# statements of the CRUD hot paths, executed with DBConnector.execute_prepared. parameters are $1, $2, ...
+PREPARED_STATEMENTS = {
+    'get_owner': "SELECT * FROM Owner WHERE id = $1",
+    'get_customer': "SELECT * FROM Customer WHERE id = $1",
+    'get_apartment': "SELECT * FROM Apartment WHERE id = $1",
+    'owner_owns_apartment': "INSERT INTO Owns(owner_id, apartment_id) VALUES($1, $2)",
+    'owner_drops_apartment': "DELETE FROM Owns WHERE owner_id = $1 AND apartment_id = $2",
+    'get_apartment_owner': "SELECT O.* FROM Owner O JOIN Owns W ON O.id = W.owner_id WHERE W.apartment_id = $1",
+    # the batch lookups take an array of ids, each row is keyed by the id it answers (see _get_many)
+    'get_owners': "SELECT id AS key, * FROM Owner WHERE id = ANY($1)",
+    'get_customers': "SELECT id AS key, * FROM Customer WHERE id = ANY($1)",
+    'get_apartments': "SELECT id AS key, * FROM Apartment WHERE id = ANY($1)",
+    'get_apartment_owners': """
+        SELECT W.apartment_id AS key, O.* FROM Owner O JOIN Owns W ON O.id = W.owner_id WHERE W.apartment_id = ANY($1)
+    """,
+    # the apartments the owner owned are returned, one row per apartment (one row with NULL if there are none)
+    'delete_owner': """
+        WITH Deleted AS (DELETE FROM Owner WHERE id = $1 RETURNING id)
+        SELECT W.apartment_id FROM Deleted D LEFT JOIN Owns W ON W.owner_id = D.id
+    """,
+    'delete_customer': "DELETE FROM Customer WHERE id = $1",
+    'delete_apartment': "DELETE FROM Apartment WHERE id = $1",
+    'customer_made_reservation': """
+        INSERT INTO Reservation(customer_id, apartment_id, start_date, end_date, total_price)
+        VALUES($1, $2, $3, $4, $5)
+    """,
+    'customer_cancelled_reservation':
+        "DELETE FROM Reservation WHERE customer_id = $1 AND apartment_id = $2 AND start_date = $3",
+    # nothing is inserted unless the customer has a reservation at the apartment that ended before the review
+    'customer_reviewed_apartment': """
+        INSERT INTO Review(customer_id, apartment_id, review_date, rating, review_text)
+        SELECT $1::INTEGER, $2::INTEGER, $3::DATE, $4::INTEGER, $5::TEXT
+        WHERE EXISTS (SELECT 1 FROM Reservation WHERE customer_id = $1 AND apartment_id = $2 AND end_date < $3)
+    """,
+    'customer_updated_review': """
+        UPDATE Review SET review_date = $3, rating = $4, review_text = $5
+        WHERE customer_id = $1 AND apartment_id = $2 AND review_date <= $3
+    """,
+    # the first entry of the customer_reservation_rank index (see _create_reservation_counts)
+    'get_top_customer': """
+        SELECT C.* FROM CustomerReservationCount T JOIN Customer C ON C.id = T.customer_id
+        ORDER BY T.reservations DESC, T.customer_id LIMIT 1
+    """,
+    # the same result computed from the reservations, the reference for rebuild_reservation_counts
+    'get_top_customer_direct': """
+        SELECT C.* FROM Customer C JOIN (
+            SELECT customer_id, COUNT(*) AS reservations FROM Reservation GROUP BY customer_id
+            ORDER BY reservations DESC, customer_id LIMIT 1
+        ) T ON C.id = T.customer_id
+    """,
+    # the month of a reservation is the month of its end date, the app takes 15% of the price. the revenues come from
+    # MonthlyRevenueTotal (see _create_profit_rollup)
+    'profit_per_month': """
+        SELECT M.month, (COALESCE(T.revenue, 0) * 0.15)::FLOAT AS profit
+        FROM generate_series(1, 12) AS M(month) LEFT JOIN MonthlyRevenueTotal T ON T.year = $1 AND T.month = M.month
+        ORDER BY M.month
+    """,
+    # the same result computed from the reservations, the reference for rebuild_profit_rollup. a reservation starts
+    # before it ends, which prunes the partitions of the later years
+    'profit_per_month_direct': """
+        SELECT M.month, COALESCE(SUM(R.total_price), 0) * 0.15 AS profit
+        FROM generate_series(1, 12) AS M(month) LEFT JOIN Reservation R
+            ON R.end_date >= make_date($1, 1, 1) AND R.end_date < make_date($1 + 1, 1, 1)
+            AND R.start_date < make_date($1 + 1, 1, 1) AND EXTRACT(MONTH FROM R.end_date) = M.month
+        GROUP BY M.month ORDER BY M.month
+    """,
+    # an owner owns an apartment in every location iff they own one in as many distinct locations as there are, both
+    # counts are maintained (see _create_location_totals), so this is one index lookup per qualifying owner
+    'get_all_location_owners': """
+        SELECT O.* FROM OwnerLocationCount C JOIN Owner O ON O.id = C.owner_id
+        WHERE C.location_count = (SELECT COUNT(*) FROM LocationTotal)
+        ORDER BY O.id
+    """,
+    # the average rating (0 without reviews, see ApartmentRating) over the average price per night of the reservations,
+    # for the apartments that have reservations
+    'best_value_for_money': """
+        SELECT A.* FROM Apartment A JOIN ApartmentRating V ON V.apartment_id = A.id JOIN (
+            SELECT apartment_id, AVG(total_price / (end_date - start_date)) AS price
+            FROM Reservation GROUP BY apartment_id
+        ) P ON P.apartment_id = A.id
+        ORDER BY V.rating / P.price DESC, A.id LIMIT 1
+    """,
+    'get_apartment_rating': "SELECT rating FROM ApartmentRating WHERE apartment_id = $1",
+    'get_owner_rating': "SELECT rating FROM OwnerRating WHERE owner_id = $1",
+    # the approximations are averaged as they are, even outside the 1 to 10 rating scale. the ratios come from
+    # CustomerRatio (see _create_recommendation_index), so only the reviews of the customer's peers are read
+    'get_apartment_recommendation': """
+        SELECT A.*, AVG(P.ratio_sum / P.common_count * R.rating)::FLOAT AS rating
+        FROM CustomerRatio P JOIN Review R ON R.customer_id = P.other_id JOIN Apartment A ON A.id = R.apartment_id
+        WHERE P.customer_id = $1
+            AND NOT EXISTS (SELECT 1 FROM Review M WHERE M.customer_id = $1 AND M.apartment_id = R.apartment_id)
+        GROUP BY A.id ORDER BY A.id
+    """,
+    # the same result computed from the reviews alone, the reference for rebuild_recommendation_index and the
+    # baseline of Benchmarks.RecommendationBenchmark
+    'get_apartment_recommendation_direct': """
+        WITH P AS (
+            SELECT O.customer_id AS other_id, AVG(M.rating::NUMERIC / O.rating) AS ratio
+            FROM Review M JOIN Review O ON O.apartment_id = M.apartment_id AND O.customer_id <> M.customer_id
+            WHERE M.customer_id = $1 GROUP BY O.customer_id
+        )
+        SELECT A.*, AVG(P.ratio * R.rating)::FLOAT AS rating
+        FROM P JOIN Review R ON R.customer_id = P.other_id JOIN Apartment A ON A.id = R.apartment_id
+        WHERE NOT EXISTS (SELECT 1 FROM Review M WHERE M.customer_id = $1 AND M.apartment_id = R.apartment_id)
+        GROUP BY A.id ORDER BY A.id
+    """,
+}
+# writes that have the same effect and result when run twice, so they are run again if the connection is lost while
+# they are committed
+IDEMPOTENT_STATEMENTS = ('customer_updated_review',)
+for _name, _query in PREPARED_STATEMENTS.items():
+    Connector.DBConnector.define_statement(_name, _query, idempotent=_name in IDEMPOTENT_STATEMENTS)
+
+# queries whose results can be large, executed with DBConnector.execute_stream after formatting their parameters
+STREAMED_QUERIES = {
+    'get_owner_apartments':
+        "SELECT A.* FROM Apartment A JOIN Owns O ON A.id = O.apartment_id WHERE O.owner_id = {owner_id}",
+    'reservations_per_owner': """
+        SELECT O.name, COALESCE(T.reservations, 0) AS reservations
+        FROM Owner O LEFT JOIN OwnerReservationCount T ON O.id = T.owner_id
+    """,
+    'reservations_per_owner_direct': """
+        SELECT O.name, COUNT(R.apartment_id) AS reservations
+        FROM Owner O LEFT JOIN Owns W ON O.id = W.owner_id LEFT JOIN Reservation R ON W.apartment_id = R.apartment_id
+        GROUP BY O.id, O.name
+    """,
+}
+
+# the secondary indexes created by create_tables, and the API functions whose access path each one serves.
+# Reservation(apartment_id, start_date) is its primary key, used by the overlap check and cancellations
+INDEXES = {
+    # get_owner_apartments, reservations_per_owner_direct
+    'owns_owner_id': "CREATE INDEX owns_owner_id ON Owns(owner_id)",
+    # get_top_customer_direct, the deletes cascaded from Customer
+    'reservation_customer_id': "CREATE INDEX reservation_customer_id ON Reservation(customer_id)",
+    # get_top_customer, the leaderboard in order, which covers the query
+    'customer_reservation_rank':
+        "CREATE INDEX customer_reservation_rank ON CustomerReservationCount(reservations DESC, customer_id)",
+    # profit_per_month_direct. reservations are mostly inserted in date order, so a BRIN index is tiny and selective
+    'reservation_end_date': "CREATE INDEX reservation_end_date ON Reservation USING BRIN(end_date)",
+    # the CustomerRatio triggers and get_apartment_recommendation_direct, finding the other reviewers of an apartment
+    'review_apartment_id': "CREATE INDEX review_apartment_id ON Review(apartment_id)",
+}
+
+# bulk loads of at least this many rows refresh the planner statistics of the table
+ANALYZE_THRESHOLD = 1000
+
+# create_tables creates the Reservation partitions of this year and of this many years ahead, the partition of any
+# other year is created by the first reservation starting in it (or by add_reservation_partitions). _RESERVATION_YEARS
+# are the years whose partition is known to exist
+RESERVATION_YEARS_AHEAD = 1
+_RESERVATION_YEARS = set()
+
+# read-through caches of get_owner, get_customer, get_apartment and get_apartment_owner, keyed by id. every write
+# that can change a cached answer invalidates its keys. the cached objects are frozen, callers get mutable copies
+ENTITY_CACHE_SIZE = 10000
+ENTITY_CACHE_TTL = 60.0
+OWNER_CACHE = LRUCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+CUSTOMER_CACHE = LRUCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+APARTMENT_CACHE = LRUCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+APARTMENT_OWNER_CACHE = LRUCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+
+# the results of the BASIC and ADVANCED API, keyed by function and arguments (see _get_result). each one is computed
+# from the tables RESULT_TABLES gives for its function, and served until one of them is written: every write of the
+# API bumps the tables it changed, those of its cascaded deletes included, once it is committed. the rebuilds of the
+# aggregates clear it
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 60.0
+RESULT_CACHE = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+RESULT_TABLES = {
+    'get_apartment_rating': ('Review',),
+    'get_owner_rating': ('Review', 'Owns'),
+    'get_top_customer': ('Customer', 'Reservation'),
+    'reservations_per_owner': ('Owner', 'Owns', 'Reservation'),
+    'get_all_location_owners': ('Owner', 'Owns', 'Apartment'),
+    'best_value_for_money': ('Apartment', 'Review', 'Reservation'),
+    'profit_per_month': ('Reservation',),
+    'get_apartment_recommendation': ('Apartment', 'Review'),
+}
+
+# the functions taking read_your_writes only read, and run on a replica of database.ini if there is one. a replica
+# may not have applied the latest commits yet, read_your_writes=True reads the primary instead. the cached lookups
+# always read the primary, so that a read right after an invalidation does not cache an outdated answer. a result
+# read from a replica is only cached once the replica has applied the writes of this process (see _get_result), it
+# may miss those of other processes until RESULT_CACHE_TTL; read_your_writes=True also replaces it with the answer of
+# the primary
+
 
 # ---------------------------------- CRUD API: ----------------------------------
 
@@ -17,26 +209,63 @@ def create_tables():
     conn = None
     try:
         conn = Connector.DBConnector()
-        conn.execute("CREATE TABLE Owner(id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
-        conn.execute("CREATE TABLE Customer(id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
-        conn.execute("""
-            CREATE TABLE Apartment(
-                id          INTEGER PRIMARY KEY, 
-                address     TEXT NOT NULL,
-                city        TEXT NOT NULL,
-                country     TEXT NOT NULL,
-                size        INTEGER NOT NULL,
-                CONSTRAINT positive_size CHECK (size > 0)
-                CONSTRAINT unique_address UNIQUE (address, city, country)
-            )
-        """)
-        conn.execute("""
-            CREATE TABLE Owns(
-                owner_id        INTEGER REFERENCES Owner(id) ON DELETE CASCADE,
-                apartment_id    INTEGER REFERENCES Apartment(id) ON DELETE CASCADE,
-                PRIMARY KEY(apartment_id)
-            )
-        """)
+        with conn.transaction():
+            # for the = operator on integers in the reservations' exclusion constraint
+            conn.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            conn.execute("CREATE TABLE Owner(id INTEGER PRIMARY KEY CHECK (id > 0), name TEXT NOT NULL)")
+            conn.execute("CREATE TABLE Customer(id INTEGER PRIMARY KEY CHECK (id > 0), name TEXT NOT NULL)")
+            conn.execute("""
+                CREATE TABLE Apartment(
+                    id          INTEGER PRIMARY KEY CHECK (id > 0),
+                    address     TEXT NOT NULL,
+                    city        TEXT NOT NULL,
+                    country     TEXT NOT NULL,
+                    size        INTEGER NOT NULL,
+                    CONSTRAINT positive_size CHECK (size > 0),
+                    CONSTRAINT unique_address UNIQUE (address, city, country)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE Owns(
+                    owner_id        INTEGER NOT NULL REFERENCES Owner(id) ON DELETE CASCADE,
+                    apartment_id    INTEGER REFERENCES Apartment(id) ON DELETE CASCADE,
+                    PRIMARY KEY(apartment_id),
+                    CONSTRAINT positive_ids CHECK (owner_id > 0 AND apartment_id > 0)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE Reservation(
+                    customer_id     INTEGER NOT NULL REFERENCES Customer(id) ON DELETE CASCADE,
+                    apartment_id    INTEGER NOT NULL REFERENCES Apartment(id) ON DELETE CASCADE,
+                    start_date      DATE NOT NULL,
+                    end_date        DATE NOT NULL,
+                    total_price     FLOAT NOT NULL,
+                    PRIMARY KEY(apartment_id, start_date),
+                    CONSTRAINT positive_ids CHECK (customer_id > 0 AND apartment_id > 0),
+                    CONSTRAINT positive_length CHECK (end_date > start_date),
+                    CONSTRAINT positive_price CHECK (total_price > 0)
+                ) PARTITION BY RANGE (start_date)
+            """)
+            conn.execute("""
+                CREATE TABLE Review(
+                    customer_id     INTEGER NOT NULL REFERENCES Customer(id) ON DELETE CASCADE,
+                    apartment_id    INTEGER NOT NULL REFERENCES Apartment(id) ON DELETE CASCADE,
+                    review_date     DATE NOT NULL,
+                    rating          INTEGER NOT NULL,
+                    review_text     TEXT NOT NULL,
+                    PRIMARY KEY(customer_id, apartment_id),
+                    CONSTRAINT positive_ids CHECK (customer_id > 0 AND apartment_id > 0),
+                    CONSTRAINT valid_rating CHECK (rating BETWEEN 1 AND 10)
+                )
+            """)
+            _create_rating_aggregates(conn)
+            _create_recommendation_index(conn)
+            _create_profit_rollup(conn)
+            _create_location_totals(conn)
+            _create_reservation_counts(conn)
+            _create_reservation_partitions(conn)
+            for index in INDEXES.values():
+                conn.execute(index)
     except DatabaseException.ConnectionInvalid as e:
         print(e)
     except DatabaseException.NOT_NULL_VIOLATION as e:
@@ -52,142 +281,1475 @@ def create_tables():
     finally:
         # will happen any way after try termination or exception handling
         if conn: conn.close()
+        _clear_caches()
 
 
 def clear_tables():
-    # TODO: implement
-    pass
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        conn.execute("TRUNCATE Review, Reservation, Owns, Apartment, Customer, Owner, "
+                     "ApartmentRatingTotal, OwnerRatingTotal, CustomerRatio, MonthlyRevenueTotal, LocationTotal, "
+                     "OwnerLocationTotal, OwnerLocationCount, CustomerReservationCount, ApartmentReservationCount, "
+                     "OwnerReservationCount")
+    except DatabaseException.ConnectionInvalid as e:
+        print(e)
+    except DatabaseException.NOT_NULL_VIOLATION as e:
+        print(e)
+    except DatabaseException.CHECK_VIOLATION as e:
+        print(e)
+    except DatabaseException.UNIQUE_VIOLATION as e:
+        print(e)
+    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
+        print(e)
+    except Exception as e:
+        print(e)
+    finally:
+        # will happen any way after try termination or exception handling
+        if conn: conn.close()
+        _clear_caches()
 
 
 def drop_tables():
-    # TODO: implement
-    pass
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        conn.execute("DROP TABLE IF EXISTS Review, Reservation, Owns, Apartment, Customer, Owner, "
+                     "ApartmentRatingTotal, OwnerRatingTotal, CustomerRatio, MonthlyRevenueTotal, LocationTotal, "
+                     "OwnerLocationTotal, OwnerLocationCount, CustomerReservationCount, ApartmentReservationCount, "
+                     "OwnerReservationCount CASCADE")
+        conn.execute("DROP FUNCTION IF EXISTS apply_rating_delta, apartment_average, review_changed, owns_changed, "
+                     "apply_ratio_changes, review_ratios_changed, apply_revenue_delta, reservation_changed, "
+                     "apply_location_delta, apply_owner_location_delta, apartment_location_changed, "
+                     "owns_location_changed, apply_reservation_count_delta, reservation_counts_changed, "
+                     "owns_reservations_changed, add_reservation_partition, reservation_overlaps CASCADE")
+    except DatabaseException.ConnectionInvalid as e:
+        print(e)
+    except DatabaseException.NOT_NULL_VIOLATION as e:
+        print(e)
+    except DatabaseException.CHECK_VIOLATION as e:
+        print(e)
+    except DatabaseException.UNIQUE_VIOLATION as e:
+        print(e)
+    except DatabaseException.FOREIGN_KEY_VIOLATION as e:
+        print(e)
+    except Exception as e:
+        print(e)
+    finally:
+        # will happen any way after try termination or exception handling
+        if conn: conn.close()
+        _clear_caches()
 
 
 def add_owner(owner: Owner) -> ReturnValue:
-    # TODO: implement
-    pass
+    return _written('add_owner', _insert(_owner_insert_query(owner)), owner.get_owner_id())
+
+
+def add_owners(owners: Iterable[Owner]) -> List[ReturnValue]:
+    return _bulk_insert("Owner", "INSERT INTO Owner(id, name) VALUES %s ON CONFLICT DO NOTHING RETURNING id",
+                        owners, lambda o: (o.get_owner_id(), o.get_owner_name()), _owner_insert_query,
+                        OWNER_CACHE)
 
 
 def get_owner(owner_id: int) -> Owner:
-    # TODO: implement
-    pass
+    return _get_one('get_owner', owner_id, Owner.from_row, Owner.bad_owner(), OWNER_CACHE)
+
+
+def get_owners(owner_ids: Iterable[int]) -> List[Owner]:
+    return _get_many('get_owners', owner_ids, Owner.from_row, Owner.bad_owner(), OWNER_CACHE)
 
 
 def delete_owner(owner_id: int) -> ReturnValue:
-    # TODO: implement
-    pass
+    if not _valid_ids(owner_id):
+        return ReturnValue.BAD_PARAMS
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        _, owned = conn.execute_prepared('delete_owner', (owner_id,))
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    finally:
+        if conn: conn.close()
+    return _owner_deleted(owner_id, owned)
 
 
 def add_apartment(apartment: Apartment) -> ReturnValue:
-    # TODO: implement
-    pass
+    return _written('add_apartment', _insert(_apartment_insert_query(apartment)), apartment.get_id())
+
+
+def add_apartments(apartments: Iterable[Apartment]) -> List[ReturnValue]:
+    return _bulk_insert("Apartment", "INSERT INTO Apartment(id, address, city, country, size) VALUES %s "
+                        "ON CONFLICT DO NOTHING RETURNING id",
+                        apartments, lambda a: (a.get_id(), a.get_address(), a.get_city(), a.get_country(),
+                                               a.get_size()),
+                        _apartment_insert_query, APARTMENT_CACHE)
 
 
 def get_apartment(apartment_id: int) -> Apartment:
-    # TODO: implement
-    pass
+    return _get_one('get_apartment', apartment_id, Apartment.from_row, Apartment.bad_apartment(), APARTMENT_CACHE)
+
+
+def get_apartments(apartment_ids: Iterable[int]) -> List[Apartment]:
+    return _get_many('get_apartments', apartment_ids, Apartment.from_row, Apartment.bad_apartment(),
+                     APARTMENT_CACHE)
 
 
 def delete_apartment(apartment_id: int) -> ReturnValue:
-    # TODO: implement
-    pass
+    return _written('delete_apartment', _delete('delete_apartment', (apartment_id,)), apartment_id)
 
 
 def add_customer(customer: Customer) -> ReturnValue:
-    # TODO: implement
-    pass
+    return _written('add_customer', _insert(_customer_insert_query(customer)), customer.get_customer_id())
+
+
+def add_customers(customers: Iterable[Customer]) -> List[ReturnValue]:
+    return _bulk_insert("Customer", "INSERT INTO Customer(id, name) VALUES %s ON CONFLICT DO NOTHING RETURNING id",
+                        customers, lambda c: (c.get_customer_id(), c.get_customer_name()), _customer_insert_query,
+                        CUSTOMER_CACHE)
 
 
 def get_customer(customer_id: int) -> Customer:
-    # TODO: implement
-    pass
+    return _get_one('get_customer', customer_id, Customer.from_row, Customer.bad_customer(), CUSTOMER_CACHE)
+
+
+def get_customers(customer_ids: Iterable[int]) -> List[Customer]:
+    return _get_many('get_customers', customer_ids, Customer.from_row, Customer.bad_customer(), CUSTOMER_CACHE)
 
 
 def delete_customer(customer_id: int) -> ReturnValue:
-    # TODO: implement
-    pass
+    return _written('delete_customer', _delete('delete_customer', (customer_id,)), customer_id)
 
 
 def customer_made_reservation(customer_id: int, apartment_id: int, start_date: date, end_date: date, total_price: float) -> ReturnValue:
-    # TODO: implement
-    pass
+    if not _valid_reservation(customer_id, apartment_id, start_date, end_date, total_price):
+        return ReturnValue.BAD_PARAMS
+    params = (customer_id, apartment_id, start_date, end_date, total_price)
+    year = start_date.year
+    known = year in _RESERVATION_YEARS
+    try:
+        if _reservation_partition(year, customer_id, apartment_id) is None:
+            return ReturnValue.NOT_EXISTS
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    # a reservation that overlaps an existing one violates the no_overlap constraint of its partition, the
+    # reservation_overlaps trigger or the primary key (if it starts on the same day), the apartment is not available
+    # so the parameters are illegal
+    result = _write('customer_made_reservation', params, ReturnValue.ERROR, if_conflict=ReturnValue.ALREADY_EXISTS)
+    try:
+        # a row without a partition is a check violation too: the partition may have been archived by another
+        # process since this one saw it. if so it is created again and the reservation made once more
+        if result == ReturnValue.BAD_PARAMS and known and \
+                _reservation_partition(year, customer_id, apartment_id, recheck=True):
+            result = _write('customer_made_reservation', params, ReturnValue.ERROR,
+                            if_conflict=ReturnValue.ALREADY_EXISTS)
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    return _written('customer_made_reservation', _reservation_made(result))
 
 
 def customer_cancelled_reservation(customer_id: int, apartment_id: int, start_date: date) -> ReturnValue:
-    # TODO: implement
-    pass
+    if not _valid_ids(customer_id, apartment_id):
+        return ReturnValue.BAD_PARAMS
+    return _written('customer_cancelled_reservation',
+                    _write('customer_cancelled_reservation', (customer_id, apartment_id, start_date),
+                           ReturnValue.NOT_EXISTS))
 
 
 def customer_reviewed_apartment(customer_id: int, apartment_id: int, review_date: date, rating: int, review_text: str) -> ReturnValue:
-    # TODO: implement
-    pass
+    if not _valid_review(customer_id, apartment_id, review_date, rating, review_text):
+        return ReturnValue.BAD_PARAMS
+    return _written('customer_reviewed_apartment',
+                    _write('customer_reviewed_apartment',
+                           (customer_id, apartment_id, review_date, rating, review_text), ReturnValue.NOT_EXISTS))
 
 
 def customer_updated_review(customer_id: int, apartmetn_id: int, update_date: date, new_rating: int, new_text: str) -> ReturnValue:
-    # TODO: implement
-    pass
+    if not _valid_review(customer_id, apartmetn_id, update_date, new_rating, new_text):
+        return ReturnValue.BAD_PARAMS
+    return _written('customer_updated_review',
+                    _write('customer_updated_review', (customer_id, apartmetn_id, update_date, new_rating, new_text),
+                           ReturnValue.NOT_EXISTS))
 
 
 def owner_owns_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
-    # TODO: implement
-    pass
+    return _written('owner_owns_apartment',
+                    _write('owner_owns_apartment', (owner_id, apartment_id), ReturnValue.ERROR), apartment_id)
 
 
 def owner_drops_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
-    # TODO: implement
-    pass
+    return _written('owner_drops_apartment', _delete('owner_drops_apartment', (owner_id, apartment_id)),
+                    apartment_id)
 
 
 def get_apartment_owner(apartment_id: int) -> Owner:
-    # TODO: implement
-    pass
+    return _get_one('get_apartment_owner', apartment_id, Owner.from_row, Owner.bad_owner(), APARTMENT_OWNER_CACHE)
+
 
+def get_apartment_owners(apartment_ids: Iterable[int]) -> List[Owner]:
+    return _get_many('get_apartment_owners', apartment_ids, Owner.from_row, Owner.bad_owner(), APARTMENT_OWNER_CACHE)
 
-def get_owner_apartments(owner_id: int) -> List[Apartment]:
-    # TODO: implement
-    pass
+
+def get_owner_apartments(owner_id: int, read_your_writes: bool = False) -> List[Apartment]:
+    conn = None
+    apartments = []
+    try:
+        conn = Connector.DBConnector(read_only=not read_your_writes)
+        query = sql.SQL(STREAMED_QUERIES['get_owner_apartments']).format(owner_id=sql.Literal(owner_id))
+        # an owner may have a large portfolio, stream it instead of fetching it all at once
+        with conn.execute_stream(query, itersize=STREAM_ITERSIZE) as rows:
+            apartments = Apartment.from_resultset(rows)
+    except Exception as e:
+        print(e)
+        apartments = []
+    finally:
+        if conn: conn.close()
+    return apartments
 
 
 # ---------------------------------- BASIC API: ----------------------------------
 
-def get_apartment_rating(apartment_id: int) -> float:
-    # TODO: implement
-    pass
+# ratings are read from ApartmentRatingTotal and OwnerRatingTotal, which triggers keep up to date on every change to
+# Review and Owns (see _create_rating_aggregates), so both are a single primary key lookup
+
+def get_apartment_rating(apartment_id: int, read_your_writes: bool = False) -> float:
+    return _get_result('get_apartment_rating', (apartment_id,), read_your_writes)
+
+
+def get_owner_rating(owner_id: int, read_your_writes: bool = False) -> float:
+    return _get_result('get_owner_rating', (owner_id,), read_your_writes)
+
+
+# recomputes the rating aggregates from the raw reviews and ownerships, returns the number of apartments and owners
+# whose aggregate was wrong. writers of Review and Owns are blocked while it runs
+def rebuild_rating_aggregates() -> int:
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        with conn.transaction():
+            conn.execute("LOCK TABLE Review, Owns IN SHARE MODE")
+            _, stale = conn.execute("""
+                SELECT (SELECT COUNT(*) FROM ApartmentRatingTotal T FULL JOIN (
+                            SELECT apartment_id, SUM(rating) AS rating_sum, COUNT(*) AS rating_count
+                            FROM Review GROUP BY apartment_id
+                        ) R ON T.apartment_id = R.apartment_id
+                        WHERE T.rating_sum IS DISTINCT FROM R.rating_sum
+                           OR T.rating_count IS DISTINCT FROM R.rating_count)
+                     + (SELECT COUNT(*) FROM OwnerRatingTotal T FULL JOIN (
+                            SELECT W.owner_id, SUM(apartment_average(W.apartment_id)) AS average_sum,
+                                   COUNT(*) AS apartment_count
+                            FROM Owns W GROUP BY W.owner_id
+                        ) R ON T.owner_id = R.owner_id
+                        WHERE T.apartment_count IS DISTINCT FROM R.apartment_count
+                           OR ABS(T.average_sum - R.average_sum) > 1e-9
+                           OR (T.average_sum IS NULL) <> (R.average_sum IS NULL)) AS stale
+            """)
+            conn.execute("DELETE FROM ApartmentRatingTotal")
+            conn.execute("""
+                INSERT INTO ApartmentRatingTotal(apartment_id, rating_sum, rating_count)
+                SELECT apartment_id, SUM(rating), COUNT(*) FROM Review GROUP BY apartment_id
+            """)
+            conn.execute("DELETE FROM OwnerRatingTotal")
+            conn.execute("""
+                INSERT INTO OwnerRatingTotal(owner_id, average_sum, apartment_count)
+                SELECT owner_id, SUM(apartment_average(apartment_id)), COUNT(*) FROM Owns GROUP BY owner_id
+            """)
+        RESULT_CACHE.clear()
+        return stale[0]['stale']
+    except Exception as e:
+        print(e)
+        return -1
+    finally:
+        if conn: conn.close()
 
 
-def get_owner_rating(owner_id: int) -> float:
-    # TODO: implement
-    pass
+def get_top_customer(read_your_writes: bool = False) -> Customer:
+    return _get_result('get_top_customer', (), read_your_writes)
 
 
-def get_top_customer() -> Customer:
-    # TODO: implement
-    pass
+def reservations_per_owner(read_your_writes: bool = False) -> List[Tuple[str, int]]:
+    return _get_result('reservations_per_owner', (), read_your_writes)
 
 
-def reservations_per_owner() -> List[Tuple[str, int]]:
-    # TODO: implement
-    pass
+# recomputes CustomerReservationCount, ApartmentReservationCount and OwnerReservationCount from the reservations and
+# ownerships, returns the number of rows that were wrong (-1 on errors). writers of Reservation and Owns are blocked
+# while it runs
+def rebuild_reservation_counts() -> int:
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        with conn.transaction():
+            conn.execute("LOCK TABLE Reservation, Owns IN SHARE MODE")
+            counts = {
+                'CustomerReservationCount': ('customer_id', """
+                    SELECT customer_id, COUNT(*) AS reservations FROM Reservation GROUP BY customer_id
+                """),
+                'ApartmentReservationCount': ('apartment_id', """
+                    SELECT apartment_id, COUNT(*) AS reservations FROM Reservation GROUP BY apartment_id
+                """),
+                'OwnerReservationCount': ('owner_id', """
+                    SELECT W.owner_id, COUNT(*) AS reservations
+                    FROM Owns W JOIN Reservation R ON R.apartment_id = W.apartment_id GROUP BY W.owner_id
+                """),
+            }
+            stale = 0
+            for table, (key, query) in counts.items():
+                _, result = conn.execute(sql.SQL("""
+                    SELECT COUNT(*) AS stale FROM {table} T FULL JOIN ({query}) R ON T.{key} = R.{key}
+                    WHERE T.reservations IS DISTINCT FROM R.reservations
+                """).format(table=sql.Identifier(table.lower()), query=sql.SQL(query), key=sql.Identifier(key)))
+                stale += result[0]['stale']
+                conn.execute(sql.SQL("DELETE FROM {}").format(sql.Identifier(table.lower())))
+                conn.execute(sql.SQL("INSERT INTO {}({}, reservations) ").format(
+                    sql.Identifier(table.lower()), sql.Identifier(key)) + sql.SQL(query))
+        RESULT_CACHE.clear()
+        return stale
+    except Exception as e:
+        print(e)
+        return -1
+    finally:
+        if conn: conn.close()
 
 
 # ---------------------------------- ADVANCED API: ----------------------------------
 
-def get_all_location_owners() -> List[Owner]:
-    # TODO: implement
-    pass
+def get_all_location_owners(read_your_writes: bool = False) -> List[Owner]:
+    return _get_result('get_all_location_owners', (), read_your_writes)
+
+
+# recomputes LocationTotal, OwnerLocationTotal and OwnerLocationCount from the apartments and ownerships, returns the
+# number of rows that were wrong (-1 on errors). writers of Apartment and Owns are blocked while it runs
+def rebuild_location_totals() -> int:
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        with conn.transaction():
+            conn.execute("LOCK TABLE Apartment, Owns IN SHARE MODE")
+            locations = "SELECT city, country, COUNT(*) AS apartment_count FROM Apartment GROUP BY city, country"
+            owner_locations = """
+                SELECT W.owner_id, A.city, A.country, COUNT(*) AS apartment_count
+                FROM Owns W JOIN Apartment A ON A.id = W.apartment_id GROUP BY W.owner_id, A.city, A.country
+            """
+            owner_counts = """
+                SELECT W.owner_id, COUNT(DISTINCT (A.city, A.country)) AS location_count
+                FROM Owns W JOIN Apartment A ON A.id = W.apartment_id GROUP BY W.owner_id
+            """
+            _, stale = conn.execute("""
+                SELECT (SELECT COUNT(*) FROM LocationTotal T FULL JOIN ({}) R
+                            ON T.city = R.city AND T.country = R.country
+                        WHERE T.apartment_count IS DISTINCT FROM R.apartment_count)
+                     + (SELECT COUNT(*) FROM OwnerLocationTotal T FULL JOIN ({}) R
+                            ON T.owner_id = R.owner_id AND T.city = R.city AND T.country = R.country
+                        WHERE T.apartment_count IS DISTINCT FROM R.apartment_count)
+                     + (SELECT COUNT(*) FROM OwnerLocationCount T FULL JOIN ({}) R ON T.owner_id = R.owner_id
+                        WHERE T.location_count IS DISTINCT FROM R.location_count) AS stale
+            """.format(locations, owner_locations, owner_counts))
+            conn.execute("DELETE FROM LocationTotal")
+            conn.execute("INSERT INTO LocationTotal(city, country, apartment_count) " + locations)
+            conn.execute("DELETE FROM OwnerLocationTotal")
+            conn.execute("INSERT INTO OwnerLocationTotal(owner_id, city, country, apartment_count) " + owner_locations)
+            conn.execute("DELETE FROM OwnerLocationCount")
+            conn.execute("INSERT INTO OwnerLocationCount(owner_id, location_count) " + owner_counts)
+        RESULT_CACHE.clear()
+        return stale[0]['stale']
+    except Exception as e:
+        print(e)
+        return -1
+    finally:
+        if conn: conn.close()
+
+
+# the average over the reservations of an apartment of its price per night is unweighted, a long stay counts as
+# much as a short one. every reservation is read, the result cache is what keeps this cheap
+def best_value_for_money(read_your_writes: bool = False) -> Apartment:
+    return _get_result('best_value_for_money', (), read_your_writes)
+
+
+def profit_per_month(year: int, read_your_writes: bool = False) -> List[Tuple[int, float]]:
+    return _get_result('profit_per_month', (year,), read_your_writes)
+
+
+# recomputes MonthlyRevenueTotal from the reservations, returns the number of months whose total was wrong (-1 on
+# errors). writers of Reservation are blocked while it runs
+def rebuild_profit_rollup() -> int:
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        with conn.transaction():
+            conn.execute("LOCK TABLE Reservation IN SHARE MODE")
+            revenues = """
+                SELECT EXTRACT(YEAR FROM end_date)::INTEGER AS year, EXTRACT(MONTH FROM end_date)::INTEGER AS month,
+                       SUM(total_price::NUMERIC) AS revenue, COUNT(*) AS reservation_count
+                FROM Reservation GROUP BY 1, 2
+            """
+            _, stale = conn.execute("""
+                SELECT COUNT(*) AS stale FROM MonthlyRevenueTotal T FULL JOIN ({}) R
+                    ON T.year = R.year AND T.month = R.month
+                WHERE T.revenue IS DISTINCT FROM R.revenue
+                   OR T.reservation_count IS DISTINCT FROM R.reservation_count
+            """.format(revenues))
+            conn.execute("DELETE FROM MonthlyRevenueTotal")
+            conn.execute("INSERT INTO MonthlyRevenueTotal(year, month, revenue, reservation_count) " + revenues)
+        RESULT_CACHE.clear()
+        return stale[0]['stale']
+    except Exception as e:
+        print(e)
+        return -1
+    finally:
+        if conn: conn.close()
+
+
+def get_apartment_recommendation(customer_id: int, read_your_writes: bool = False) -> List[Tuple[Apartment, float]]:
+    return _get_result('get_apartment_recommendation', (customer_id,), read_your_writes)
+
+
+# recomputes CustomerRatio from the reviews, returns the number of customer pairs whose entry was wrong (-1 on
+# errors). writers of Review are blocked while it runs
+def rebuild_recommendation_index() -> int:
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        with conn.transaction():
+            conn.execute("LOCK TABLE Review IN SHARE MODE")
+            ratios = """
+                SELECT M.customer_id, O.customer_id AS other_id, SUM(M.rating::NUMERIC / O.rating) AS ratio_sum,
+                       COUNT(*) AS common_count
+                FROM Review M JOIN Review O ON O.apartment_id = M.apartment_id AND O.customer_id <> M.customer_id
+                GROUP BY M.customer_id, O.customer_id
+            """
+            _, stale = conn.execute("""
+                SELECT COUNT(*) AS stale FROM CustomerRatio T FULL JOIN ({}) R
+                    ON T.customer_id = R.customer_id AND T.other_id = R.other_id
+                WHERE T.ratio_sum IS DISTINCT FROM R.ratio_sum OR T.common_count IS DISTINCT FROM R.common_count
+            """.format(ratios))
+            conn.execute("DELETE FROM CustomerRatio")
+            conn.execute("INSERT INTO CustomerRatio(customer_id, other_id, ratio_sum, common_count) " + ratios)
+        RESULT_CACHE.clear()
+        return stale[0]['stale']
+    except Exception as e:
+        print(e)
+        return -1
+    finally:
+        if conn: conn.close()
+
+
+# ---------------------------------- HELPERS: ----------------------------------
+
+# refreshes the planner statistics of the given tables (all of them if none are given), to be run after bulk loads
+def analyze_tables(*tables: str):
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        if tables:
+            names = [sql.Identifier(table.lower()) for table in tables]
+            conn.execute(sql.SQL("ANALYZE {}").format(sql.SQL(', ').join(names)))
+        else:
+            conn.execute("ANALYZE")
+    except Exception as e:
+        print(e)
+    finally:
+        if conn: conn.close()
+
+
+# creates the Reservation partition of year, for a reservation of the customer at the apartment, if it does not exist
+# yet. returns whether it was created, None if the customer or the apartment does not exist (then no partition is
+# created for it). the years known to exist are remembered, so this is a lookup in a set but for the first
+# reservation of a year. another process may drop a partition this one knows, recheck looks it up in the database
+# again. raises on errors
+def _reservation_partition(year: int, customer_id: int, apartment_id: int, recheck: bool = False) -> Optional[bool]:
+    if year in _RESERVATION_YEARS and not recheck:
+        return False
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        _, result = conn.execute(_reservation_partition_query(year, customer_id, apartment_id))
+    finally:
+        if conn: conn.close()
+    return _partition_created(year, result)
+
+
+# the result of _reservation_partition from that of _reservation_partition_query, remembers that the year exists
+def _partition_created(year: int, result: Connector.ResultSet) -> Optional[bool]:
+    if result.isEmpty():
+        return None
+    _RESERVATION_YEARS.add(year)
+    return result[0]['created']
+
+
+# creates the partition of the year if it does not exist, only if the customer and the apartment of the reservation
+# it is for exist: no row if they do not. created tells whether the partition was created
+def _reservation_partition_query(year: int, customer_id: int, apartment_id: int) -> sql.Composed:
+    return sql.SQL("""
+        SELECT add_reservation_partition({year}) AS created
+        WHERE EXISTS (SELECT 1 FROM Customer WHERE id = {customer_id})
+          AND EXISTS (SELECT 1 FROM Apartment WHERE id = {apartment_id})
+    """).format(year=sql.Literal(year), customer_id=sql.Literal(customer_id),
+                apartment_id=sql.Literal(apartment_id))
+
+
+# creates the Reservation partitions of the years first_year to last_year that do not exist yet (by default this
+# year's and those of the next RESERVATION_YEARS_AHEAD years, for a yearly maintenance job), returns the number of
+# partitions created (-1 on errors). creating a partition briefly blocks every use of Reservation
+def add_reservation_partitions(first_year: Optional[int] = None, last_year: Optional[int] = None) -> int:
+    first_year = date.today().year if first_year is None else first_year
+    last_year = first_year + RESERVATION_YEARS_AHEAD if last_year is None else last_year
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        _, result = conn.execute(sql.SQL(
+            "SELECT COUNT(*) FILTER (WHERE add_reservation_partition(year)) AS created "
+            "FROM generate_series({}, {}) AS year").format(sql.Literal(first_year), sql.Literal(last_year)))
+        _RESERVATION_YEARS.update(range(first_year, last_year + 1))
+        return result[0]['created']
+    except Exception as e:
+        print(e)
+        return -1
+    finally:
+        if conn: conn.close()
+
+
+# moves the reservations starting before before_year out of the database, a year at a time: the partition of the
+# year is written to directory/reservation_<year>.csv.gz, its reservations are taken out of the aggregates (so they
+# no longer count in profit_per_month or the leaderboards), and it is detached and dropped. each year is archived in a
+# transaction that blocks every use of Reservation, and writes to Owns. returns the paths of the files written, a
+# year that fails is printed and stays in the database
+def archive_reservations(before_year: int, directory: str) -> List[str]:
+    conn = None
+    paths = []
+    try:
+        conn = Connector.DBConnector()
+        _, partitions = conn.execute("""
+            SELECT C.relname AS partition FROM pg_inherits I JOIN pg_class C ON C.oid = I.inhrelid
+            WHERE I.inhparent = 'reservation'::regclass ORDER BY 1
+        """)
+        for name in ([] if partitions.isEmpty() else partitions['partition']):
+            year = int(name[len('reservation_'):])
+            if year >= before_year:
+                continue
+            path = os.path.join(directory, '%s.csv.gz' % name)
+            try:
+                with conn.transaction():
+                    _archive_partition(conn, name, path + '.part')
+                    # before the partition is dropped, so that the file is complete once the drop commits
+                    _durable_replace(path + '.part', path)
+                paths.append(path)
+                RESULT_CACHE.bump('Reservation')
+            except Exception as e:
+                print(e)
+                # still there only if the transaction did not commit, the reservations are in the partition
+                if os.path.exists(path + '.part'):
+                    os.remove(path + '.part')
+            finally:
+                _RESERVATION_YEARS.discard(year)
+    except Exception as e:
+        print(e)
+    finally:
+        if conn: conn.close()
+    return paths
+
+
+# loads a file written by archive_reservations back into Reservation (creating the partition of its year if needed),
+# and into the aggregates through the triggers, one reservation at a time. the reservations are checked like new
+# ones: a customer or apartment that was deleted or a reservation made meanwhile on the same nights makes the whole
+# file fail. returns the number of reservations restored, -1 on errors
+def restore_reservations(path: str) -> int:
+    conn = None
+    try:
+        year = int(re.fullmatch(r'reservation_(\d+)\.csv\.gz', os.path.basename(path)).group(1))
+        conn = Connector.DBConnector()
+        with conn.transaction():
+            conn.execute(sql.SQL("SELECT add_reservation_partition({})").format(sql.Literal(year)))
+            with gzip.open(path, 'rb') as file:
+                restored = conn.copy_expert("COPY Reservation(" + _RESERVATION_COLUMNS + ") "
+                                            "FROM STDIN WITH (FORMAT csv, HEADER)", file)
+        _RESERVATION_YEARS.add(year)
+        RESULT_CACHE.bump('Reservation')
+        return restored
+    except Exception as e:
+        print(e)
+        return -1
+    finally:
+        if conn: conn.close()
+
+
+BULK_CHUNK_SIZE = 1000
+STREAM_ITERSIZE = 2000
+
+
+def _owner_insert_query(owner: Owner) -> sql.Composed:
+    return sql.SQL("INSERT INTO Owner(id, name) VALUES({id}, {name})").format(
+        id=sql.Literal(owner.get_owner_id()), name=sql.Literal(owner.get_owner_name()))
+
+
+def _customer_insert_query(customer: Customer) -> sql.Composed:
+    return sql.SQL("INSERT INTO Customer(id, name) VALUES({id}, {name})").format(
+        id=sql.Literal(customer.get_customer_id()), name=sql.Literal(customer.get_customer_name()))
+
+
+def _apartment_insert_query(apartment: Apartment) -> sql.Composed:
+    return sql.SQL("INSERT INTO Apartment(id, address, city, country, size) "
+                   "VALUES({id}, {address}, {city}, {country}, {size})").format(
+        id=sql.Literal(apartment.get_id()), address=sql.Literal(apartment.get_address()),
+        city=sql.Literal(apartment.get_city()), country=sql.Literal(apartment.get_country()),
+        size=sql.Literal(apartment.get_size()))
+
+
+# executes a prepared SELECT by id (or without parameters if id is None) and converts its first row with from_row, or returns bad if there is none.
+# with a cache the (frozen) answer is looked up there first and stored on a miss, errors are not cached
+def _get_one(statement: str, id: int, from_row: Callable, bad, cache: LRUCache = None):
+    def load():
+        conn = None
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.execute_prepared(statement, () if id is None else (id,))
+            return _frozen_first(result, from_row, bad)
+        finally:
+            if conn: conn.close()
+
+    try:
+        # the cache keeps the frozen instance, callers get their own copy to modify
+        return (load() if cache is None else cache.get_or_load(id, load)).thaw()
+    except Exception as e:
+        print(e)
+        return bad
+
+
+# the frozen first row of result converted with from_row, or bad frozen if there is none
+def _frozen_first(result: Connector.ResultSet, from_row: Callable, bad):
+    return (bad if result.isEmpty() else from_row(result[0])).freeze()
+
+
+# the batch version of _get_one: the ids missing from cache are looked up with a single execution of a prepared
+# SELECT taking an array of ids, whose rows have a column key with the id they answer. returns the answers in the
+# order of ids, bad for the ids without one (every id is bad on errors)
+def _get_many(statement: str, ids: Iterable[int], from_row: Callable, bad, cache: LRUCache) -> list:
+    def load(missing: list) -> dict:
+        conn = None
+        try:
+            conn = Connector.DBConnector()
+            _, result = conn.execute_prepared(statement, (missing,))
+            return _frozen_by_key(result, missing, from_row, frozen_bad)
+        finally:
+            if conn: conn.close()
+
+    ids = list(ids)
+    frozen_bad = bad.freeze()
+    try:
+        return [value.thaw() for value in cache.get_or_load_many(ids, load)]
+    except Exception as e:
+        print(e)
+        return [bad.thaw() for _ in ids]
+
+
+# the frozen answers of _get_many for the missing ids from the rows of its statement, frozen_bad for those without
+def _frozen_by_key(result: Connector.ResultSet, missing: list, from_row: Callable, frozen_bad) -> dict:
+    found = {row['key']: from_row(row).freeze() for row in result}
+    return {id: found.get(id, frozen_bad) for id in missing}
+
+
+# how _get_result computes the result of each function of RESULT_TABLES from the rows of its statement (the prepared
+# statement of the same name, or its entry in STREAMED_QUERIES): from_rows converts them to the immutable value kept
+# in RESULT_CACHE, copy gives every caller a copy of its own, and default is the value (before copy) on errors
+_RESULTS = {
+    'get_apartment_rating': (lambda result: 0 if result.isEmpty() else result[0].values[0], lambda value: value, 0),
+    'get_owner_rating': (lambda result: 0 if result.isEmpty() else result[0].values[0], lambda value: value, 0),
+    'get_top_customer': (lambda result: _frozen_first(result, Customer.from_row, Customer.bad_customer()),
+                         lambda customer: customer.thaw(), Customer.bad_customer().freeze()),
+    'reservations_per_owner': (lambda rows: tuple((row['name'], row['reservations']) for row in rows), list, ()),
+    'get_all_location_owners': (lambda result: tuple(owner.freeze() for owner in Owner.from_resultset(result)),
+                                lambda owners: [owner.thaw() for owner in owners], ()),
+    'best_value_for_money': (lambda result: _frozen_first(result, Apartment.from_row, Apartment.bad_apartment()),
+                             lambda apartment: apartment.thaw(), Apartment.bad_apartment().freeze()),
+    'profit_per_month': (lambda result: tuple(zip(result['month'], result['profit'])), list, ()),
+    'get_apartment_recommendation': (
+        lambda result: tuple(zip((apartment.freeze() for apartment in Apartment.from_resultset(result)),
+                                 result['rating'])),
+        lambda recommendations: [(apartment.thaw(), rating) for apartment, rating in recommendations], ()),
+}
 
 
-def best_value_for_money() -> Apartment:
-    # TODO: implement
-    pass
+# the result of the API function called with args (see _RESULTS), cached in RESULT_CACHE until one of the
+# RESULT_TABLES of function is written. it is read on a replica unless read_your_writes, which also replaces the
+# cached result. the cached result is shared by the callers, so it is immutable: its entities are frozen, and the
+# callers get thawed copies of them. the default on errors, which are not cached
+def _get_result(function: str, args: tuple = (), read_your_writes: bool = False):
+    tables = RESULT_TABLES[function]
+    from_rows, copy, default = _RESULTS[function]
+
+    def load(conn: Connector.DBConnector):
+        if function in STREAMED_QUERIES:
+            with conn.execute_stream(STREAMED_QUERIES[function], itersize=STREAM_ITERSIZE) as rows:
+                return from_rows(rows)
+        _, result = conn.execute_prepared(function, args)
+        return from_rows(result)
+
+    def run():
+        conn = None
+        try:
+            conn = Connector.DBConnector(read_only=not read_your_writes)
+            written = RESULT_CACHE.unreplicated(tables) if conn.on_replica() else None
+            if written is not None:
+                if not _replica_caught_up(conn):
+                    # the replica may not have the latest writes of this process yet, its answer is not stored
+                    return ResultCache.Uncached(load(conn))
+                RESULT_CACHE.replicated(written)
+            return load(conn)
+        finally:
+            if conn: conn.close()
+
+    try:
+        return copy(RESULT_CACHE.get_or_load(function, args, tables, run, refresh=read_your_writes))
+    except Exception as e:
+        print(e)
+        return copy(default)
+
+
+# has the replica conn is connected to applied every write committed on the primary so far? compares the position
+# the replica replayed the write-ahead log to with the current position of the primary
+def _replica_caught_up(conn: Connector.DBConnector) -> bool:
+    primary = None
+    try:
+        primary = Connector.DBConnector()
+        _, position = primary.execute("SELECT pg_current_wal_lsn()::TEXT AS lsn")
+    finally:
+        if primary: primary.close()
+    _, replayed = conn.execute(sql.SQL("SELECT COALESCE(pg_last_wal_replay_lsn() >= {}::PG_LSN, "
+                                       "NOT pg_is_in_recovery()) AS caught_up").format(sql.Literal(position[0]['lsn'])))
+    return replayed[0]['caught_up']
+
+
+# executes a prepared INSERT, UPDATE or DELETE, mapping constraint violations to ReturnValue (unique and exclusion
+# violations to if_conflict). if no row was effected the statement's own condition did not hold, and
+# if_nothing_done is returned
+def _write(statement: str, params: tuple, if_nothing_done: ReturnValue,
+           if_conflict: ReturnValue = ReturnValue.ALREADY_EXISTS) -> ReturnValue:
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        rows_effected, _ = conn.execute_prepared(statement, params)
+    except Exception as e:
+        return _write_error(e, if_conflict)
+    finally:
+        if conn: conn.close()
+    return ReturnValue.OK if rows_effected > 0 else if_nothing_done
+
+
+# the ReturnValue of a write that raised error: constraint violations are illegal parameters, missing references or
+# conflicts with an existing row (if_conflict), anything else is printed and an ERROR
+def _write_error(error: Exception, if_conflict: ReturnValue = ReturnValue.ALREADY_EXISTS) -> ReturnValue:
+    if isinstance(error, (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION)):
+        return ReturnValue.BAD_PARAMS
+    if isinstance(error, DatabaseException.FOREIGN_KEY_VIOLATION):
+        return ReturnValue.NOT_EXISTS
+    if isinstance(error, (DatabaseException.UNIQUE_VIOLATION, DatabaseException.EXCLUSION_VIOLATION)):
+        return if_conflict
+    print(error)
+    return ReturnValue.ERROR
+
+
+# the entity caches (invalidated at the key of the write) and the RESULT_CACHE tables (bumped) each write of the API
+# changes, see _written
+_WRITE_EFFECTS = {
+    'add_owner': ((OWNER_CACHE,), ('Owner',)),
+    'delete_owner': ((OWNER_CACHE,), ('Owner', 'Owns')),
+    'add_apartment': ((APARTMENT_CACHE,), ('Apartment',)),
+    'delete_apartment': ((APARTMENT_CACHE, APARTMENT_OWNER_CACHE), ('Apartment', 'Owns', 'Reservation', 'Review')),
+    'add_customer': ((CUSTOMER_CACHE,), ('Customer',)),
+    'delete_customer': ((CUSTOMER_CACHE,), ('Customer', 'Reservation', 'Review')),
+    'customer_made_reservation': ((), ('Reservation',)),
+    'customer_cancelled_reservation': ((), ('Reservation',)),
+    'customer_reviewed_apartment': ((), ('Review',)),
+    'customer_updated_review': ((), ('Review',)),
+    'owner_owns_apartment': ((APARTMENT_OWNER_CACHE,), ('Owns',)),
+    'owner_drops_apartment': ((APARTMENT_OWNER_CACHE,), ('Owns',)),
+}
+
+
+# applies the effects of the write function on the caches once it succeeded (result is OK), returns result
+def _written(function: str, result: ReturnValue, key: int = None) -> ReturnValue:
+    if result == ReturnValue.OK:
+        caches, tables = _WRITE_EFFECTS[function]
+        for cache in caches:
+            cache.invalidate(key)
+        RESULT_CACHE.bump(*tables)
+    return result
+
+
+# the result of delete_owner from the rows of its statement, the apartments the owner owned (a single row with a NULL
+# apartment_id if none). their owner is cached too
+def _owner_deleted(owner_id: int, owned: Connector.ResultSet) -> ReturnValue:
+    if owned.isEmpty():
+        return ReturnValue.NOT_EXISTS
+    APARTMENT_OWNER_CACHE.invalidate(*(apartment_id for apartment_id in owned['apartment_id'] if apartment_id))
+    return _written('delete_owner', ReturnValue.OK, owner_id)
+
+
+# the result of customer_made_reservation from that of its write: a reservation that conflicts with another one is
+# for an apartment that is not available, so its parameters are illegal
+def _reservation_made(result: ReturnValue) -> ReturnValue:
+    return ReturnValue.BAD_PARAMS if result == ReturnValue.ALREADY_EXISTS else result
+
+
+def _valid_ids(*ids: int) -> bool:
+    return all(id is not None and id > 0 for id in ids)
+
+
+def _valid_reservation(customer_id: int, apartment_id: int, start_date: date, end_date: date,
+                       total_price: float) -> bool:
+    return _valid_ids(customer_id, apartment_id) \
+        and isinstance(start_date, date) and isinstance(end_date, date) and end_date > start_date \
+        and total_price is not None and total_price > 0
+
+
+def _valid_review(customer_id: int, apartment_id: int, review_date: date, rating: int, review_text: str) -> bool:
+    return _valid_ids(customer_id, apartment_id) \
+        and review_date is not None and rating is not None and 1 <= rating <= 10 and review_text is not None
+
+
+# per apartment sum and count of review ratings, and per owner sum and count of the average ratings of the
+# apartments they own (an apartment without reviews counts as 0). triggers on Review and Owns keep both up to date
+# within the writing transaction, an apartment's aggregate row is locked by the upsert that changes it so
+# concurrent reviews of the same apartment are serialized. rebuild_rating_aggregates recomputes them from scratch
+def _create_rating_aggregates(conn: Connector.DBConnector):
+    conn.execute("""
+        CREATE TABLE ApartmentRatingTotal(
+            apartment_id    INTEGER PRIMARY KEY,
+            rating_sum      BIGINT NOT NULL,
+            rating_count    INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE OwnerRatingTotal(
+            owner_id        INTEGER PRIMARY KEY REFERENCES Owner(id) ON DELETE CASCADE,
+            average_sum     NUMERIC NOT NULL,
+            apartment_count INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE VIEW ApartmentRating AS
+        SELECT A.id AS apartment_id, COALESCE(T.rating_sum::FLOAT / NULLIF(T.rating_count, 0), 0) AS rating
+        FROM Apartment A LEFT JOIN ApartmentRatingTotal T ON A.id = T.apartment_id
+    """)
+    conn.execute("""
+        CREATE VIEW OwnerRating AS
+        SELECT owner_id, (average_sum / apartment_count)::FLOAT AS rating
+        FROM OwnerRatingTotal WHERE apartment_count > 0
+    """)
+    conn.execute("""
+        CREATE FUNCTION apartment_average(apartment INTEGER) RETURNS NUMERIC AS $$
+            SELECT COALESCE((SELECT rating_sum::NUMERIC / NULLIF(rating_count, 0)
+                             FROM ApartmentRatingTotal WHERE apartment_id = apartment), 0)
+        $$ LANGUAGE SQL STABLE
+    """)
+    # the averages before and after the change are both derived from the row returned by the upsert, so they are
+    # consistent even when another transaction changed the row in between
+    conn.execute("""
+        CREATE FUNCTION apply_rating_delta(p_apartment INTEGER, p_sum_delta INTEGER, p_count_delta INTEGER)
+        RETURNS VOID AS $$
+        DECLARE
+            new_sum     BIGINT;
+            new_count   INTEGER;
+        BEGIN
+            -- serializes with owns_changed, so the owner read below is the current one
+            PERFORM 1 FROM Apartment WHERE id = p_apartment FOR NO KEY UPDATE;
+            INSERT INTO ApartmentRatingTotal AS T VALUES (p_apartment, p_sum_delta, p_count_delta)
+            ON CONFLICT (apartment_id) DO UPDATE
+                SET rating_sum = T.rating_sum + p_sum_delta, rating_count = T.rating_count + p_count_delta
+            RETURNING rating_sum, rating_count INTO new_sum, new_count;
+            IF new_count = 0 THEN
+                DELETE FROM ApartmentRatingTotal WHERE apartment_id = p_apartment;
+            END IF;
+            UPDATE OwnerRatingTotal
+            SET average_sum = average_sum + COALESCE(new_sum::NUMERIC / NULLIF(new_count, 0), 0)
+                - COALESCE((new_sum - p_sum_delta)::NUMERIC / NULLIF(new_count - p_count_delta, 0), 0)
+            WHERE owner_id = (SELECT owner_id FROM Owns WHERE apartment_id = p_apartment);
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("""
+        CREATE FUNCTION review_changed() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM apply_rating_delta(OLD.apartment_id, -OLD.rating, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM apply_rating_delta(NEW.apartment_id, NEW.rating, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("""
+        CREATE FUNCTION owns_changed() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM 1 FROM Apartment WHERE id = OLD.apartment_id FOR NO KEY UPDATE;
+                UPDATE OwnerRatingTotal
+                SET average_sum = average_sum - apartment_average(OLD.apartment_id),
+                    apartment_count = apartment_count - 1
+                WHERE owner_id = OLD.owner_id;
+                DELETE FROM OwnerRatingTotal WHERE owner_id = OLD.owner_id AND apartment_count = 0;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM 1 FROM Apartment WHERE id = NEW.apartment_id FOR NO KEY UPDATE;
+                INSERT INTO OwnerRatingTotal AS T VALUES (NEW.owner_id, apartment_average(NEW.apartment_id), 1)
+                ON CONFLICT (owner_id) DO UPDATE
+                    SET average_sum = T.average_sum + EXCLUDED.average_sum,
+                        apartment_count = T.apartment_count + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("CREATE TRIGGER review_rating AFTER INSERT OR UPDATE OR DELETE ON Review "
+                 "FOR EACH ROW EXECUTE FUNCTION review_changed()")
+    conn.execute("CREATE TRIGGER owns_rating AFTER INSERT OR UPDATE OR DELETE ON Owns "
+                 "FOR EACH ROW EXECUTE FUNCTION owns_changed()")
+
+
+# CustomerRatio holds, for every ordered pair of customers who reviewed a common apartment, the sum of the ratios
+# between their ratings of the common apartments and how many there are, so get_apartment_recommendation reads the
+# average ratio of each peer instead of joining all the reviews. a statement level trigger applies the pairs gained
+# and lost by every change to Review, a whole bulk insert or cascaded delete at once. NUMERIC keeps the sums exact,
+# so removing a review subtracts exactly what adding it added
+def _create_recommendation_index(conn: Connector.DBConnector):
+    conn.execute("""
+        CREATE TABLE CustomerRatio(
+            customer_id     INTEGER NOT NULL,
+            other_id        INTEGER NOT NULL,
+            ratio_sum       NUMERIC NOT NULL,
+            common_count    INTEGER NOT NULL,
+            PRIMARY KEY(customer_id, other_id)
+        )
+    """)
+    # PriorReviews are the affected apartments' reviews before the statement (the current ones without the added rows,
+    # with the removed ones), CurrentReviews the ones after it. the pairs lost are those of PriorReviews with a removed
+    # review on either side, the pairs gained those of CurrentReviews with an added review on either side
+    conn.execute("""
+        CREATE FUNCTION apply_ratio_changes(removed Review[], added Review[]) RETURNS VOID AS $$
+        DECLARE
+            zero_customers  INTEGER[];
+            zero_others     INTEGER[];
+        BEGIN
+            -- serializes with the other writers of these apartments' reviews, so the reviews read below are current
+            PERFORM 1 FROM Apartment
+            WHERE id IN (SELECT apartment_id FROM unnest(removed) UNION SELECT apartment_id FROM unnest(added))
+            ORDER BY id FOR NO KEY UPDATE;
+            WITH D AS (SELECT customer_id, apartment_id, rating FROM unnest(removed)),
+                 I AS (SELECT customer_id, apartment_id, rating FROM unnest(added)),
+                 CurrentReviews AS (
+                    SELECT customer_id, apartment_id, rating FROM Review
+                    WHERE apartment_id IN (SELECT apartment_id FROM D UNION SELECT apartment_id FROM I)
+                 ),
+                 PriorReviews AS (
+                    SELECT * FROM CurrentReviews
+                    WHERE (customer_id, apartment_id) NOT IN (SELECT customer_id, apartment_id FROM I)
+                    UNION ALL SELECT * FROM D
+                 ),
+                 Delta AS (
+                    SELECT C.customer_id, V.customer_id AS other_id, -(C.rating::NUMERIC / V.rating) AS ratio, -1 AS n
+                    FROM D C JOIN PriorReviews V ON V.apartment_id = C.apartment_id AND V.customer_id <> C.customer_id
+                    UNION ALL
+                    SELECT V.customer_id, C.customer_id, -(V.rating::NUMERIC / C.rating), -1
+                    FROM D C JOIN PriorReviews V ON V.apartment_id = C.apartment_id AND V.customer_id <> C.customer_id
+                    WHERE (V.customer_id, V.apartment_id) NOT IN (SELECT customer_id, apartment_id FROM D)
+                    UNION ALL
+                    SELECT C.customer_id, V.customer_id, C.rating::NUMERIC / V.rating, 1
+                    FROM I C JOIN CurrentReviews V ON V.apartment_id = C.apartment_id AND V.customer_id <> C.customer_id
+                    UNION ALL
+                    SELECT V.customer_id, C.customer_id, V.rating::NUMERIC / C.rating, 1
+                    FROM I C JOIN CurrentReviews V ON V.apartment_id = C.apartment_id AND V.customer_id <> C.customer_id
+                    WHERE (V.customer_id, V.apartment_id) NOT IN (SELECT customer_id, apartment_id FROM I)
+                 ),
+                 Applied AS (
+                    INSERT INTO CustomerRatio AS T
+                    SELECT customer_id, other_id, SUM(ratio), SUM(n) FROM Delta GROUP BY customer_id, other_id
+                    ON CONFLICT (customer_id, other_id) DO UPDATE
+                        SET ratio_sum = T.ratio_sum + EXCLUDED.ratio_sum,
+                            common_count = T.common_count + EXCLUDED.common_count
+                    RETURNING customer_id, other_id, common_count
+                 )
+            SELECT array_agg(customer_id), array_agg(other_id) INTO zero_customers, zero_others
+            FROM Applied WHERE common_count = 0;
+            DELETE FROM CustomerRatio T USING unnest(zero_customers, zero_others) AS Z(customer_id, other_id)
+            WHERE T.customer_id = Z.customer_id AND T.other_id = Z.other_id;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("""
+        CREATE FUNCTION review_ratios_changed() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM apply_ratio_changes('{}'::Review[], ARRAY(SELECT N::Review FROM added N));
+            ELSIF TG_OP = 'DELETE' THEN
+                PERFORM apply_ratio_changes(ARRAY(SELECT O::Review FROM removed O), '{}'::Review[]);
+            ELSE
+                PERFORM apply_ratio_changes(ARRAY(SELECT O::Review FROM removed O), ARRAY(SELECT N::Review FROM added N));
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("CREATE TRIGGER review_ratios_insert AFTER INSERT ON Review REFERENCING NEW TABLE AS added "
+                 "FOR EACH STATEMENT EXECUTE FUNCTION review_ratios_changed()")
+    conn.execute("CREATE TRIGGER review_ratios_delete AFTER DELETE ON Review REFERENCING OLD TABLE AS removed "
+                 "FOR EACH STATEMENT EXECUTE FUNCTION review_ratios_changed()")
+    conn.execute("CREATE TRIGGER review_ratios_update AFTER UPDATE ON Review "
+                 "REFERENCING OLD TABLE AS removed NEW TABLE AS added "
+                 "FOR EACH STATEMENT EXECUTE FUNCTION review_ratios_changed()")
+
+
+# MonthlyRevenueTotal holds the total price of the reservations ending in every month, kept up to date by a trigger on
+# Reservation, so profit_per_month reads at most 12 rows. a month without reservations has no row. NUMERIC keeps the
+# totals exact, so cancelling a reservation subtracts exactly what making it added
+def _create_profit_rollup(conn: Connector.DBConnector):
+    conn.execute("""
+        CREATE TABLE MonthlyRevenueTotal(
+            year                INTEGER NOT NULL,
+            month               INTEGER NOT NULL,
+            revenue             NUMERIC NOT NULL,
+            reservation_count   INTEGER NOT NULL,
+            PRIMARY KEY(year, month)
+        )
+    """)
+    conn.execute("""
+        CREATE FUNCTION apply_revenue_delta(end_date DATE, revenue_delta NUMERIC, count_delta INTEGER)
+        RETURNS VOID AS $$
+            INSERT INTO MonthlyRevenueTotal AS T
+            VALUES (EXTRACT(YEAR FROM end_date), EXTRACT(MONTH FROM end_date), revenue_delta, count_delta)
+            ON CONFLICT (year, month) DO UPDATE
+                SET revenue = T.revenue + revenue_delta, reservation_count = T.reservation_count + count_delta;
+            DELETE FROM MonthlyRevenueTotal
+            WHERE year = EXTRACT(YEAR FROM end_date) AND month = EXTRACT(MONTH FROM end_date)
+                AND reservation_count = 0;
+        $$ LANGUAGE SQL
+    """)
+    conn.execute("""
+        CREATE FUNCTION reservation_changed() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM apply_revenue_delta(OLD.end_date, -OLD.total_price::NUMERIC, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM apply_revenue_delta(NEW.end_date, NEW.total_price::NUMERIC, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("CREATE TRIGGER reservation_revenue AFTER INSERT OR UPDATE OR DELETE ON Reservation "
+                 "FOR EACH ROW EXECUTE FUNCTION reservation_changed()")
+
+
+# "for all" questions over locations are answered by comparing counts. LocationTotal holds the number of apartments
+# in every (city, country), OwnerLocationTotal the number of apartments every owner owns there, and
+# OwnerLocationCount the number of locations every owner owns apartments in. triggers on Apartment and Owns keep them
+# up to date; an owner owns an apartment in every location iff their location count equals the number of rows of
+# LocationTotal, which does not depend on the number of owners times locations
+def _create_location_totals(conn: Connector.DBConnector):
+    conn.execute("""
+        CREATE TABLE LocationTotal(
+            city            TEXT NOT NULL,
+            country         TEXT NOT NULL,
+            apartment_count INTEGER NOT NULL,
+            PRIMARY KEY(city, country)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE OwnerLocationTotal(
+            owner_id        INTEGER NOT NULL,
+            city            TEXT NOT NULL,
+            country         TEXT NOT NULL,
+            apartment_count INTEGER NOT NULL,
+            PRIMARY KEY(owner_id, city, country)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE OwnerLocationCount(
+            owner_id        INTEGER PRIMARY KEY,
+            location_count  INTEGER NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX owner_location_count ON OwnerLocationCount(location_count)")
+    conn.execute("""
+        CREATE FUNCTION apply_location_delta(apartment_city TEXT, apartment_country TEXT, delta INTEGER)
+        RETURNS VOID AS $$
+            INSERT INTO LocationTotal AS T VALUES (apartment_city, apartment_country, delta)
+            ON CONFLICT (city, country) DO UPDATE SET apartment_count = T.apartment_count + delta;
+            DELETE FROM LocationTotal WHERE city = apartment_city AND country = apartment_country
+                AND apartment_count = 0;
+        $$ LANGUAGE SQL
+    """)
+    # delta is 1 or -1. the location count of the owner changes when their first apartment in the location is added
+    # or their last one there is removed
+    conn.execute("""
+        CREATE FUNCTION apply_owner_location_delta(owner INTEGER, apartment_city TEXT, apartment_country TEXT,
+                                                   delta INTEGER)
+        RETURNS VOID AS $$
+        DECLARE
+            new_count   INTEGER;
+        BEGIN
+            IF delta > 0 THEN
+                INSERT INTO OwnerLocationTotal AS T VALUES (owner, apartment_city, apartment_country, 1)
+                ON CONFLICT (owner_id, city, country) DO UPDATE SET apartment_count = T.apartment_count + 1
+                RETURNING apartment_count INTO new_count;
+                IF new_count = 1 THEN
+                    INSERT INTO OwnerLocationCount AS T VALUES (owner, 1)
+                    ON CONFLICT (owner_id) DO UPDATE SET location_count = T.location_count + 1;
+                END IF;
+            ELSE
+                UPDATE OwnerLocationTotal SET apartment_count = apartment_count - 1
+                WHERE owner_id = owner AND city = apartment_city AND country = apartment_country
+                RETURNING apartment_count INTO new_count;
+                IF new_count = 0 THEN
+                    DELETE FROM OwnerLocationTotal
+                    WHERE owner_id = owner AND city = apartment_city AND country = apartment_country;
+                    UPDATE OwnerLocationCount SET location_count = location_count - 1 WHERE owner_id = owner;
+                    DELETE FROM OwnerLocationCount WHERE owner_id = owner AND location_count = 0;
+                END IF;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # a deleted apartment is accounted for before it is deleted, while its owner can still be found. the Owns row
+    # deleted by the cascade then no longer finds the apartment and is skipped by owns_location_changed
+    conn.execute("""
+        CREATE FUNCTION apartment_location_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            owner   INTEGER;
+        BEGIN
+            SELECT owner_id INTO owner FROM Owns WHERE apartment_id = COALESCE(OLD.id, NEW.id);
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM apply_location_delta(OLD.city, OLD.country, -1);
+                IF owner IS NOT NULL THEN
+                    PERFORM apply_owner_location_delta(owner, OLD.city, OLD.country, -1);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM apply_location_delta(NEW.city, NEW.country, 1);
+                IF owner IS NOT NULL THEN
+                    PERFORM apply_owner_location_delta(owner, NEW.city, NEW.country, 1);
+                END IF;
+            END IF;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("""
+        CREATE FUNCTION owns_location_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            apartment   Apartment%ROWTYPE;
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT * INTO apartment FROM Apartment WHERE id = OLD.apartment_id;
+                IF FOUND THEN
+                    PERFORM apply_owner_location_delta(OLD.owner_id, apartment.city, apartment.country, -1);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT * INTO apartment FROM Apartment WHERE id = NEW.apartment_id;
+                PERFORM apply_owner_location_delta(NEW.owner_id, apartment.city, apartment.country, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("CREATE TRIGGER apartment_location_delete BEFORE DELETE ON Apartment "
+                 "FOR EACH ROW EXECUTE FUNCTION apartment_location_changed()")
+    conn.execute("CREATE TRIGGER apartment_location AFTER INSERT OR UPDATE OF city, country ON Apartment "
+                 "FOR EACH ROW EXECUTE FUNCTION apartment_location_changed()")
+    conn.execute("CREATE TRIGGER owns_location AFTER INSERT OR UPDATE OR DELETE ON Owns "
+                 "FOR EACH ROW EXECUTE FUNCTION owns_location_changed()")
+
+
+# the leaderboards count the reservations of every customer (CustomerReservationCount), of every apartment
+# (ApartmentReservationCount) and on the apartments every owner owns (OwnerReservationCount). triggers on Reservation
+# and Owns keep them up to date, a count that drops to 0 is removed. both triggers lock the apartment row, so a
+# reservation and a change of its apartment's owner are counted in the order they commit
+def _create_reservation_counts(conn: Connector.DBConnector):
+    for table, key in (('CustomerReservationCount', 'customer_id'), ('ApartmentReservationCount', 'apartment_id'),
+                       ('OwnerReservationCount', 'owner_id')):
+        conn.execute(sql.SQL("CREATE TABLE {}({} INTEGER PRIMARY KEY, reservations INTEGER NOT NULL)").format(
+            sql.Identifier(table.lower()), sql.Identifier(key)))
+    conn.execute("""
+        CREATE FUNCTION apply_reservation_count_delta(p_customer INTEGER, p_apartment INTEGER, p_delta INTEGER)
+        RETURNS VOID AS $$
+        DECLARE
+            owner   INTEGER;
+        BEGIN
+            PERFORM 1 FROM Apartment WHERE id = p_apartment FOR NO KEY UPDATE;
+            SELECT owner_id INTO owner FROM Owns WHERE apartment_id = p_apartment;
+            IF p_delta > 0 THEN
+                INSERT INTO CustomerReservationCount AS T VALUES (p_customer, p_delta)
+                ON CONFLICT (customer_id) DO UPDATE SET reservations = T.reservations + p_delta;
+                INSERT INTO ApartmentReservationCount AS T VALUES (p_apartment, p_delta)
+                ON CONFLICT (apartment_id) DO UPDATE SET reservations = T.reservations + p_delta;
+                IF owner IS NOT NULL THEN
+                    INSERT INTO OwnerReservationCount AS T VALUES (owner, p_delta)
+                    ON CONFLICT (owner_id) DO UPDATE SET reservations = T.reservations + p_delta;
+                END IF;
+            ELSE
+                UPDATE CustomerReservationCount SET reservations = reservations + p_delta
+                WHERE customer_id = p_customer;
+                DELETE FROM CustomerReservationCount WHERE customer_id = p_customer AND reservations = 0;
+                UPDATE ApartmentReservationCount SET reservations = reservations + p_delta
+                WHERE apartment_id = p_apartment;
+                DELETE FROM ApartmentReservationCount WHERE apartment_id = p_apartment AND reservations = 0;
+                UPDATE OwnerReservationCount SET reservations = reservations + p_delta WHERE owner_id = owner;
+                DELETE FROM OwnerReservationCount WHERE owner_id = owner AND reservations = 0;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("""
+        CREATE FUNCTION reservation_counts_changed() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM apply_reservation_count_delta(OLD.customer_id, OLD.apartment_id, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM apply_reservation_count_delta(NEW.customer_id, NEW.apartment_id, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # the reservations of an apartment move with it from its old owner to its new one
+    conn.execute("""
+        CREATE FUNCTION owns_reservations_changed() RETURNS TRIGGER AS $$
+        DECLARE
+            reservation_count   INTEGER;
+        BEGIN
+            PERFORM 1 FROM Apartment WHERE id = COALESCE(OLD.apartment_id, NEW.apartment_id) FOR NO KEY UPDATE;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                SELECT reservations INTO reservation_count FROM ApartmentReservationCount
+                WHERE apartment_id = OLD.apartment_id;
+                IF reservation_count IS NOT NULL THEN
+                    UPDATE OwnerReservationCount SET reservations = reservations - reservation_count
+                    WHERE owner_id = OLD.owner_id;
+                    DELETE FROM OwnerReservationCount WHERE owner_id = OLD.owner_id AND reservations = 0;
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT reservations INTO reservation_count FROM ApartmentReservationCount
+                WHERE apartment_id = NEW.apartment_id;
+                IF reservation_count IS NOT NULL THEN
+                    INSERT INTO OwnerReservationCount AS T VALUES (NEW.owner_id, reservation_count)
+                    ON CONFLICT (owner_id) DO UPDATE SET reservations = T.reservations + reservation_count;
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("CREATE TRIGGER reservation_counts AFTER INSERT OR UPDATE OF customer_id, apartment_id OR DELETE "
+                 "ON Reservation FOR EACH ROW EXECUTE FUNCTION reservation_counts_changed()")
+    conn.execute("CREATE TRIGGER owns_reservations AFTER INSERT OR UPDATE OR DELETE ON Owns "
+                 "FOR EACH ROW EXECUTE FUNCTION owns_reservations_changed()")
+
+
+# Reservation is partitioned by the year of start_date, one partition reservation_<year> per year (created by
+# add_reservation_partition, see also _reservation_partition). the partitions share the indexes and triggers of
+# Reservation, and each one has its own no_overlap exclusion constraint: the nights [start_date, end_date) of an
+# apartment are reserved at most once, checked with a single probe of the GiST index, which also makes concurrent
+# conflicting bookings wait. a stay that crosses into a later year can overlap reservations of another partition,
+# which the reservation_overlaps trigger checks while holding the lock of the apartment row, so that two such bookings
+# see each other
+def _create_reservation_partitions(conn: Connector.DBConnector):
+    conn.execute("""
+        CREATE FUNCTION add_reservation_partition(year INTEGER) RETURNS BOOLEAN AS $$
+        DECLARE
+            partition TEXT := 'reservation_' || year;
+        BEGIN
+            IF to_regclass(partition) IS NULL THEN
+                -- creating the partition takes this lock anyway, once it is held nobody else can be creating it
+                LOCK TABLE Reservation IN ACCESS EXCLUSIVE MODE;
+            END IF;
+            IF to_regclass(partition) IS NOT NULL THEN
+                RETURN FALSE;
+            END IF;
+            EXECUTE format('CREATE TABLE %I PARTITION OF Reservation FOR VALUES FROM (%L) TO (%L)',
+                           partition, make_date(year, 1, 1), make_date(year + 1, 1, 1));
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING GIST '
+                           '(apartment_id WITH =, daterange(start_date, end_date) WITH &&)',
+                           partition, partition || '_no_overlap');
+            RETURN TRUE;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("""
+        CREATE FUNCTION reservation_overlaps() RETURNS TRIGGER AS $$
+        BEGIN
+            -- an empty or reversed stay (or a missing date) is left to the constraints of Reservation
+            IF (NEW.end_date > NEW.start_date) IS NOT TRUE THEN
+                RETURN NEW;
+            END IF;
+            PERFORM 1 FROM Apartment WHERE id = NEW.apartment_id FOR NO KEY UPDATE;
+            IF EXISTS (SELECT 1 FROM Reservation
+                       WHERE apartment_id = NEW.apartment_id AND start_date < NEW.end_date
+                           AND (start_date < date_trunc('year', NEW.start_date)
+                                OR start_date >= date_trunc('year', NEW.start_date) + INTERVAL '1 year')
+                           AND daterange(start_date, end_date) && daterange(NEW.start_date, NEW.end_date)
+                           AND (TG_OP = 'INSERT' OR (apartment_id, start_date) <> (OLD.apartment_id, OLD.start_date)))
+            THEN
+                RAISE EXCEPTION 'the reservation overlaps another one of apartment %', NEW.apartment_id
+                    USING ERRCODE = 'exclusion_violation';
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    conn.execute("CREATE TRIGGER reservation_overlaps BEFORE INSERT OR UPDATE OF apartment_id, start_date, end_date "
+                 "ON Reservation FOR EACH ROW EXECUTE FUNCTION reservation_overlaps()")
+    this_year = date.today().year
+    conn.execute(sql.SQL("SELECT add_reservation_partition(year) FROM generate_series({}, {}) AS year").format(
+        sql.Literal(this_year), sql.Literal(this_year + RESERVATION_YEARS_AHEAD)))
+
+
+# executes a prepared DELETE whose parameters are ids, NOT_EXISTS if nothing was deleted
+def _delete(statement: str, ids: tuple) -> ReturnValue:
+    if not _valid_ids(*ids):
+        return ReturnValue.BAD_PARAMS
+    conn = None
+    try:
+        conn = Connector.DBConnector()
+        rows_effected, _ = conn.execute_prepared(statement, ids)
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    finally:
+        if conn: conn.close()
+    return ReturnValue.OK if rows_effected > 0 else ReturnValue.NOT_EXISTS
+
+
+_RESERVATION_COLUMNS = "customer_id, apartment_id, start_date, end_date, total_price"
+
+
+# writes the Reservation partition to a gzip compressed CSV file at path, subtracts its reservations from the
+# aggregates the triggers of Reservation maintain, and detaches and drops it. the rows are counted with a few
+# aggregate queries instead of running the triggers once per archived reservation. to be run in a transaction
+def _archive_partition(conn: Connector.DBConnector, name: str, path: str):
+    partition = sql.Identifier(name)
+    conn.execute("LOCK TABLE Reservation IN ACCESS EXCLUSIVE MODE")
+    conn.execute("LOCK TABLE Owns IN SHARE MODE")
+    with gzip.open(path, 'wb') as file:
+        conn.copy_expert(sql.SQL("COPY {} (" + _RESERVATION_COLUMNS + ") TO STDOUT WITH (FORMAT csv, HEADER)")
+                         .format(partition), file)
+    counts = {
+        'CustomerReservationCount': ('customer_id', "SELECT customer_id, COUNT(*) AS n FROM {} GROUP BY 1"),
+        'ApartmentReservationCount': ('apartment_id', "SELECT apartment_id, COUNT(*) AS n FROM {} GROUP BY 1"),
+        'OwnerReservationCount': ('owner_id', "SELECT W.owner_id, COUNT(*) AS n FROM {} R "
+                                              "JOIN Owns W ON W.apartment_id = R.apartment_id GROUP BY 1"),
+    }
+    for table, (key, query) in counts.items():
+        conn.execute(sql.SQL("""
+            WITH Archived AS ({query})
+            UPDATE {table} T SET reservations = T.reservations - A.n FROM Archived A WHERE T.{key} = A.{key}
+        """).format(query=sql.SQL(query).format(partition), table=sql.Identifier(table.lower()),
+                     key=sql.Identifier(key)))
+        conn.execute(sql.SQL("DELETE FROM {} WHERE reservations = 0").format(sql.Identifier(table.lower())))
+    conn.execute(sql.SQL("""
+        WITH Archived AS (
+            SELECT EXTRACT(YEAR FROM end_date) AS year, EXTRACT(MONTH FROM end_date) AS month,
+                   SUM(total_price::NUMERIC) AS revenue, COUNT(*) AS reservation_count
+            FROM {} GROUP BY 1, 2
+        )
+        UPDATE MonthlyRevenueTotal T
+        SET revenue = T.revenue - A.revenue, reservation_count = T.reservation_count - A.reservation_count
+        FROM Archived A WHERE T.year = A.year AND T.month = A.month
+    """).format(partition))
+    conn.execute("DELETE FROM MonthlyRevenueTotal WHERE reservation_count = 0")
+    conn.execute(sql.SQL("ALTER TABLE Reservation DETACH PARTITION {}").format(partition))
+    conn.execute(sql.SQL("DROP TABLE {}").format(partition))
+
+
+# renames part to path once its content is on disk, and syncs the rename where directories can be synced
+def _durable_replace(part: str, path: str):
+    with open(part, 'rb') as file:
+        os.fsync(file.fileno())
+    os.replace(part, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        directory = os.open(os.path.dirname(path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+def _clear_caches():
+    for cache in (OWNER_CACHE, CUSTOMER_CACHE, APARTMENT_CACHE, APARTMENT_OWNER_CACHE, RESULT_CACHE):
+        cache.clear()
+    _RESERVATION_YEARS.clear()
+
+
+# executes a single INSERT, mapping constraint violations to ReturnValue.
+# with a given conn the INSERT runs in a savepoint of its transaction, otherwise on a new connection
+def _insert(query: sql.Composed, conn: Connector.DBConnector = None) -> ReturnValue:
+    own_conn = conn is None
+    try:
+        if own_conn:
+            conn = Connector.DBConnector()
+        conn.run_transaction(lambda conn: conn.execute(query))
+    except Exception as e:
+        return _write_error(e)
+    finally:
+        if own_conn and conn: conn.close()
+    return ReturnValue.OK
 
 
-def profit_per_month(year: int) -> List[Tuple[int, float]]:
-    # TODO: implement
-    pass
+# inserts items in chunks of BULK_CHUNK_SIZE, one INSERT ... ON CONFLICT DO NOTHING RETURNING id per chunk, where
+# to_row gives the VALUES tuple of an item (id first). rows that were not returned conflicted with an existing row
+# (ALREADY_EXISTS). a chunk containing an illegal row fails as a whole and is retried in a single transaction with
+# one savepoint per item (using to_query), so the result is the same as adding the items one by one in order.
+# the ids of every chunk are invalidated in cache (and table bumped in RESULT_CACHE) once it is written, and table is
+# analyzed after a large load
+def _bulk_insert(table: str, query: str, items: Iterable, to_row: Callable[[object], tuple],
+                 to_query: Callable[[object], sql.Composed], cache: LRUCache) -> List[ReturnValue]:
+    results = []
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, BULK_CHUNK_SIZE))
+        if not chunk:
+            if results.count(ReturnValue.OK) >= ANALYZE_THRESHOLD:
+                analyze_tables(table)
+            return results
+        start = len(results)
+        rows = [to_row(item) for item in chunk]
+        conn = None
+        try:
+            conn = Connector.DBConnector()
+            try:
+                _, inserted = conn.run_transaction(
+                    lambda conn: conn.execute_values(query, rows, page_size=len(rows), fetch=True))
+            except (DatabaseException.NOT_NULL_VIOLATION, DatabaseException.CHECK_VIOLATION):
+                with conn.transaction():
+                    results.extend(_insert(to_query(item), conn) for item in chunk)
+                continue
+            inserted = set() if inserted.isEmpty() else set(inserted['id'])
+            for row in rows:
+                if row[0] in inserted:
+                    inserted.remove(row[0])
+                    results.append(ReturnValue.OK)
+                else:
+                    results.append(ReturnValue.ALREADY_EXISTS)
+        except Exception as e:
+            print(e)
+            del results[start:]
+            results.extend(ReturnValue.ERROR for _ in chunk)
+        finally:
+            if conn: conn.close()
+            # only the rows of a committed chunk were written
+            written = [row[0] for row, result in zip(rows, results[start:]) if result == ReturnValue.OK]
+            if written:
+                cache.invalidate(*written)
+                RESULT_CACHE.bump(table)
 
 
-def get_apartment_recommendation(customer_id: int) -> List[Tuple[Apartment, float]]:
-    # TODO: implement
-    pass
+# Solution.aio is the asyncio twin of this module (SolutionAio), imported on first use since it imports this module
+def __getattr__(name: str):
+    if name == 'aio':
+        import SolutionAio
+        return SolutionAio
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
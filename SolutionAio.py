@@ -0,0 +1,302 @@
+from typing import Callable, Iterable, List, Optional, Tuple
+from psycopg2 import sql
+from datetime import date
+
+import Solution
+from Solution import (OWNER_CACHE, CUSTOMER_CACHE, APARTMENT_CACHE, APARTMENT_OWNER_CACHE, RESULT_CACHE, RESULT_TABLES,
+                      STREAMED_QUERIES, _written, _write_error, _valid_ids)
+from Utility.AsyncDBConnector import AsyncDBConnector
+from Utility.ReturnValue import ReturnValue
+from Utility.Cache import LRUCache
+
+from Business.Owner import Owner
+from Business.Customer import Customer
+from Business.Apartment import Apartment
+
+'''
+    asyncio twin of the Solution API, also reachable as Solution.aio. every function here is a coroutine with the
+    same results and ReturnValue codes as its Solution counterpart, and shares its statements, validation, caches and
+    the conversion of its rows (the Solution helpers taking rows or results), only the I/O is its own.
+    creating, clearing and dropping the tables and the bulk loads (add_owners, add_customers, add_apartments) are
+    only available in Solution. psycopg2 has no pipeline mode, so each pooled connection has one statement in flight
+    at a time and concurrent lookups are spread over the connections of the pool.
+    AsyncDBConnector only connects to the primary, so every read here already sees the latest commits and the
+    functions taking read_your_writes in Solution do not take it here.
+'''
+
+
+# ---------------------------------- CRUD API: ----------------------------------
+
+async def add_owner(owner: Owner) -> ReturnValue:
+    return _written('add_owner', await _insert(Solution._owner_insert_query(owner)), owner.get_owner_id())
+
+
+async def get_owner(owner_id: int) -> Owner:
+    return await _get_one('get_owner', owner_id, Owner.from_row, Owner.bad_owner(), OWNER_CACHE)
+
+
+async def get_owners(owner_ids: Iterable[int]) -> List[Owner]:
+    return await _get_many('get_owners', owner_ids, Owner.from_row, Owner.bad_owner(), OWNER_CACHE)
+
+
+async def delete_owner(owner_id: int) -> ReturnValue:
+    if not _valid_ids(owner_id):
+        return ReturnValue.BAD_PARAMS
+    try:
+        async with AsyncDBConnector() as conn:
+            _, owned = await conn.execute_prepared('delete_owner', (owner_id,))
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    return Solution._owner_deleted(owner_id, owned)
+
+
+async def add_apartment(apartment: Apartment) -> ReturnValue:
+    return _written('add_apartment', await _insert(Solution._apartment_insert_query(apartment)), apartment.get_id())
+
+
+async def get_apartment(apartment_id: int) -> Apartment:
+    return await _get_one('get_apartment', apartment_id, Apartment.from_row, Apartment.bad_apartment(),
+                          APARTMENT_CACHE)
+
+
+async def get_apartments(apartment_ids: Iterable[int]) -> List[Apartment]:
+    return await _get_many('get_apartments', apartment_ids, Apartment.from_row, Apartment.bad_apartment(),
+                           APARTMENT_CACHE)
+
+
+async def delete_apartment(apartment_id: int) -> ReturnValue:
+    return _written('delete_apartment', await _delete('delete_apartment', (apartment_id,)), apartment_id)
+
+
+async def add_customer(customer: Customer) -> ReturnValue:
+    return _written('add_customer', await _insert(Solution._customer_insert_query(customer)),
+                    customer.get_customer_id())
+
+
+async def get_customer(customer_id: int) -> Customer:
+    return await _get_one('get_customer', customer_id, Customer.from_row, Customer.bad_customer(), CUSTOMER_CACHE)
+
+
+async def get_customers(customer_ids: Iterable[int]) -> List[Customer]:
+    return await _get_many('get_customers', customer_ids, Customer.from_row, Customer.bad_customer(),
+                           CUSTOMER_CACHE)
+
+
+async def delete_customer(customer_id: int) -> ReturnValue:
+    return _written('delete_customer', await _delete('delete_customer', (customer_id,)), customer_id)
+
+
+# see Solution.customer_made_reservation
+async def customer_made_reservation(customer_id: int, apartment_id: int, start_date: date, end_date: date,
+                                    total_price: float) -> ReturnValue:
+    if not Solution._valid_reservation(customer_id, apartment_id, start_date, end_date, total_price):
+        return ReturnValue.BAD_PARAMS
+    params = (customer_id, apartment_id, start_date, end_date, total_price)
+    year = start_date.year
+    known = year in Solution._RESERVATION_YEARS
+    try:
+        if await _reservation_partition(year, customer_id, apartment_id) is None:
+            return ReturnValue.NOT_EXISTS
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    result = await _write('customer_made_reservation', params, ReturnValue.ERROR,
+                          if_conflict=ReturnValue.ALREADY_EXISTS)
+    try:
+        if result == ReturnValue.BAD_PARAMS and known and \
+                await _reservation_partition(year, customer_id, apartment_id, recheck=True):
+            result = await _write('customer_made_reservation', params, ReturnValue.ERROR,
+                                  if_conflict=ReturnValue.ALREADY_EXISTS)
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    return _written('customer_made_reservation', Solution._reservation_made(result))
+
+
+async def customer_cancelled_reservation(customer_id: int, apartment_id: int, start_date: date) -> ReturnValue:
+    if not _valid_ids(customer_id, apartment_id):
+        return ReturnValue.BAD_PARAMS
+    return _written('customer_cancelled_reservation',
+                    await _write('customer_cancelled_reservation', (customer_id, apartment_id, start_date),
+                                 ReturnValue.NOT_EXISTS))
+
+
+async def customer_reviewed_apartment(customer_id: int, apartment_id: int, review_date: date, rating: int,
+                                      review_text: str) -> ReturnValue:
+    if not Solution._valid_review(customer_id, apartment_id, review_date, rating, review_text):
+        return ReturnValue.BAD_PARAMS
+    result = await _write('customer_reviewed_apartment', (customer_id, apartment_id, review_date, rating, review_text),
+                          ReturnValue.NOT_EXISTS)
+    return _written('customer_reviewed_apartment', result)
+
+
+async def customer_updated_review(customer_id: int, apartmetn_id: int, update_date: date, new_rating: int,
+                                  new_text: str) -> ReturnValue:
+    if not Solution._valid_review(customer_id, apartmetn_id, update_date, new_rating, new_text):
+        return ReturnValue.BAD_PARAMS
+    result = await _write('customer_updated_review', (customer_id, apartmetn_id, update_date, new_rating, new_text),
+                          ReturnValue.NOT_EXISTS)
+    return _written('customer_updated_review', result)
+
+
+async def owner_owns_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
+    return _written('owner_owns_apartment',
+                    await _write('owner_owns_apartment', (owner_id, apartment_id), ReturnValue.ERROR), apartment_id)
+
+
+async def owner_drops_apartment(owner_id: int, apartment_id: int) -> ReturnValue:
+    return _written('owner_drops_apartment', await _delete('owner_drops_apartment', (owner_id, apartment_id)),
+                    apartment_id)
+
+
+async def get_apartment_owner(apartment_id: int) -> Owner:
+    return await _get_one('get_apartment_owner', apartment_id, Owner.from_row, Owner.bad_owner(),
+                          APARTMENT_OWNER_CACHE)
+
+
+async def get_apartment_owners(apartment_ids: Iterable[int]) -> List[Owner]:
+    return await _get_many('get_apartment_owners', apartment_ids, Owner.from_row, Owner.bad_owner(),
+                           APARTMENT_OWNER_CACHE)
+
+
+async def get_owner_apartments(owner_id: int) -> List[Apartment]:
+    query = sql.SQL(STREAMED_QUERIES['get_owner_apartments']).format(owner_id=sql.Literal(owner_id))
+    try:
+        async with AsyncDBConnector() as conn:
+            _, result = await conn.execute(query)
+        return Apartment.from_resultset(result)
+    except Exception as e:
+        print(e)
+        return []
+
+
+# ---------------------------------- BASIC API: ----------------------------------
+
+async def get_apartment_rating(apartment_id: int) -> float:
+    return await _get_result('get_apartment_rating', (apartment_id,))
+
+
+async def get_owner_rating(owner_id: int) -> float:
+    return await _get_result('get_owner_rating', (owner_id,))
+
+
+async def get_top_customer() -> Customer:
+    return await _get_result('get_top_customer')
+
+
+async def reservations_per_owner() -> List[Tuple[str, int]]:
+    return await _get_result('reservations_per_owner')
+
+
+# ---------------------------------- ADVANCED API: ----------------------------------
+
+async def get_all_location_owners() -> List[Owner]:
+    return await _get_result('get_all_location_owners')
+
+
+async def best_value_for_money() -> Apartment:
+    return await _get_result('best_value_for_money')
+
+
+async def profit_per_month(year: int) -> List[Tuple[int, float]]:
+    return await _get_result('profit_per_month', (year,))
+
+
+async def get_apartment_recommendation(customer_id: int) -> List[Tuple[Apartment, float]]:
+    return await _get_result('get_apartment_recommendation', (customer_id,))
+
+
+# ---------------------------------- HELPERS: ----------------------------------
+
+# see Solution._get_one
+async def _get_one(statement: str, id: int, from_row: Callable, bad, cache: LRUCache = None):
+    async def load():
+        async with AsyncDBConnector() as conn:
+            _, result = await conn.execute_prepared(statement, () if id is None else (id,))
+        return Solution._frozen_first(result, from_row, bad)
+
+    try:
+        return (await (load() if cache is None else cache.get_or_load_async(id, load))).thaw()
+    except Exception as e:
+        print(e)
+        return bad
+
+
+# see Solution._get_many
+async def _get_many(statement: str, ids: Iterable[int], from_row: Callable, bad, cache: LRUCache) -> list:
+    async def load(missing: list) -> dict:
+        async with AsyncDBConnector() as conn:
+            _, result = await conn.execute_prepared(statement, (missing,))
+        return Solution._frozen_by_key(result, missing, from_row, frozen_bad)
+
+    ids = list(ids)
+    frozen_bad = bad.freeze()
+    try:
+        return [value.thaw() for value in await cache.get_or_load_many_async(ids, load)]
+    except Exception as e:
+        print(e)
+        return [bad.thaw() for _ in ids]
+
+
+# see Solution._get_result, always read on the primary. the rows of STREAMED_QUERIES are fetched at once
+async def _get_result(function: str, args: tuple = ()):
+    from_rows, copy, default = Solution._RESULTS[function]
+
+    async def load():
+        async with AsyncDBConnector() as conn:
+            if function in STREAMED_QUERIES:
+                _, result = await conn.execute(sql.SQL(STREAMED_QUERIES[function]))
+            else:
+                _, result = await conn.execute_prepared(function, args)
+        return from_rows(result)
+
+    try:
+        return copy(await RESULT_CACHE.get_or_load_async(function, args, RESULT_TABLES[function], load))
+    except Exception as e:
+        print(e)
+        return copy(default)
+
+
+# see Solution._write
+async def _write(statement: str, params: tuple, if_nothing_done: ReturnValue,
+                 if_conflict: ReturnValue = ReturnValue.ALREADY_EXISTS) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as conn:
+            rows_effected, _ = await conn.execute_prepared(statement, params)
+    except Exception as e:
+        return _write_error(e, if_conflict)
+    return ReturnValue.OK if rows_effected > 0 else if_nothing_done
+
+
+# see Solution._delete
+async def _delete(statement: str, ids: tuple) -> ReturnValue:
+    if not _valid_ids(*ids):
+        return ReturnValue.BAD_PARAMS
+    try:
+        async with AsyncDBConnector() as conn:
+            rows_effected, _ = await conn.execute_prepared(statement, ids)
+    except Exception as e:
+        print(e)
+        return ReturnValue.ERROR
+    return ReturnValue.OK if rows_effected > 0 else ReturnValue.NOT_EXISTS
+
+
+# see Solution._reservation_partition
+async def _reservation_partition(year: int, customer_id: int, apartment_id: int,
+                                 recheck: bool = False) -> Optional[bool]:
+    if year in Solution._RESERVATION_YEARS and not recheck:
+        return False
+    async with AsyncDBConnector() as conn:
+        _, result = await conn.execute(Solution._reservation_partition_query(year, customer_id, apartment_id))
+    return Solution._partition_created(year, result)
+
+
+# see Solution._insert
+async def _insert(query: sql.Composed) -> ReturnValue:
+    try:
+        async with AsyncDBConnector() as conn:
+            await conn.execute(query)
+    except Exception as e:
+        return _write_error(e)
+    return ReturnValue.OK
@@ -1,12 +1,84 @@
+"""
+How the tests are isolated from each other is chosen with the TEST_ISOLATION environment variable:
+
+    recreate  (default) the tables are created before each test and dropped after it
+    truncate  the tables are created once, and emptied after each test
+    rollback  the tables are created once, and each test runs in a transaction that is rolled back after it (see
+              DBConnector.pin). a test class whose test uses several connections at once, from threads or asyncio,
+              sets rollback = False and is emptied after each test instead
+
+With TEST_WORKER (or pytest-xdist's PYTEST_XDIST_WORKER) set, the tables are created in a schema of their own,
+test_<worker>, so that several test processes can run against the same database.
+"""
+import atexit
+import os
 import unittest
+
 import Solution as Solution
+import Utility.DBConnector as Connector
+from psycopg2 import sql
+
+ISOLATION = os.environ.get('TEST_ISOLATION', 'recreate')
+WORKER = os.environ.get('TEST_WORKER', os.environ.get('PYTEST_XDIST_WORKER'))
+
+_started = False
+
+
+def _start_session() -> None:
+    global _started
+    if _started:
+        return
+    _started = True
+    if ISOLATION not in ('recreate', 'truncate', 'rollback'):
+        raise ValueError('TEST_ISOLATION must be recreate, truncate or rollback, not %r' % ISOLATION)
+
+    if WORKER:
+        schema = sql.Identifier('test_%s' % WORKER)
+        with Connector.DBConnector() as conn:
+            try:
+                # before the search path changes, so that it is not created in the schema of a worker
+                conn.execute("CREATE EXTENSION IF NOT EXISTS btree_gist SCHEMA public")
+            except Exception:
+                pass  # another worker created it at the same time
+            conn.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(schema))
+        Connector.DBConnector.override_params(options='-c search_path=test_%s,public' % WORKER)
+
+        def drop_schema():
+            Connector.DBConnector.override_params()
+            with Connector.DBConnector() as conn:
+                conn.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(schema))
+            Connector.DBConnector.close_pool()
+        atexit.register(drop_schema)
+
+    if ISOLATION != 'recreate':
+        # tables left behind by an interrupted run
+        Solution.drop_tables()
+        Solution.create_tables()
+
+        def drop_tables():
+            Connector.DBConnector.unpin()
+            Solution.drop_tables()
+        # registered last, so run before the schema is dropped
+        atexit.register(drop_tables)
 
 
 class AbstractTest(unittest.TestCase):
+    # can the test run in a transaction that is rolled back, see ISOLATION?
+    rollback = True
+
     # before each test, setUp is executed
     def setUp(self) -> None:
-        Solution.create_tables()
+        _start_session()
+        if ISOLATION == 'recreate':
+            Solution.create_tables()
+        elif ISOLATION == 'rollback' and self.rollback:
+            Connector.DBConnector.pin()
+            self.addCleanup(Solution._clear_caches)
+            self.addCleanup(Connector.DBConnector.unpin)
 
     # after each test, tearDown is executed
     def tearDown(self) -> None:
-        Solution.drop_tables()
+        if ISOLATION == 'recreate':
+            Solution.drop_tables()
+        elif ISOLATION == 'truncate' or not self.rollback:
+            Solution.clear_tables()
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+from datetime import date
+
+from psycopg2 import errors
+
+import Solution as Solution
+from Utility.AsyncDBConnector import AsyncDBConnector
+from Utility.DBConnector import DBConnector
+from Utility.Exceptions import DatabaseException
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Owner import Owner
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    # the event loop's connections come from a pool of their own
+    rollback = False
+
+    def test_crud(self) -> None:
+        async def run():
+            aio = Solution.aio
+            self.assertEqual(ReturnValue.OK, await aio.add_owner(Owner(1, 'o1')))
+            self.assertEqual(ReturnValue.ALREADY_EXISTS, await aio.add_owner(Owner(1, 'o1')))
+            self.assertEqual(ReturnValue.BAD_PARAMS, await aio.add_owner(Owner(-1, 'o1')))
+            self.assertEqual(ReturnValue.OK, await aio.add_apartment(Apartment(1, 'a1', 'Haifa', 'Israel', 50)))
+            self.assertEqual(ReturnValue.OK, await aio.add_customer(Customer(1, 'c1')))
+            self.assertEqual(ReturnValue.OK, await aio.owner_owns_apartment(1, 1))
+            self.assertEqual(Owner(1, 'o1'), await aio.get_apartment_owner(1))
+            self.assertEqual([Apartment(1, 'a1', 'Haifa', 'Israel', 50)], await aio.get_owner_apartments(1))
+            self.assertEqual(ReturnValue.OK,
+                             await aio.customer_made_reservation(1, 1, date(2023, 1, 5), date(2023, 1, 10), 500))
+            self.assertEqual(ReturnValue.BAD_PARAMS,
+                             await aio.customer_made_reservation(1, 1, date(2023, 1, 9), date(2023, 1, 12), 300))
+            self.assertEqual(ReturnValue.OK,
+                             await aio.customer_reviewed_apartment(1, 1, date(2023, 2, 1), 8, 'nice'))
+            self.assertEqual(8, await aio.get_apartment_rating(1))
+            self.assertEqual(8, await aio.get_owner_rating(1))
+            self.assertEqual([('o1', 1)], await aio.reservations_per_owner())
+            self.assertEqual(ReturnValue.BAD_PARAMS, await aio.delete_owner(None))
+            self.assertEqual(ReturnValue.OK, await aio.delete_owner(1))
+            self.assertEqual(Owner.bad_owner(), await aio.get_owner(1))
+
+        asyncio.run(run())
+
+    def test_concurrent_reads(self) -> None:
+        Solution.add_customers([Customer(i, 'c%d' % i) for i in range(1, 51)])
+
+        async def run():
+            return await asyncio.gather(*(Solution.aio.get_customer(i) for i in range(1, 51)))
+
+        self.assertEqual([Customer(i, 'c%d' % i) for i in range(1, 51)], asyncio.run(run()))
+
+
+    def test_execute_many(self) -> None:
+        async def run():
+            async with AsyncDBConnector() as conn:
+                await conn.execute("CREATE TEMP TABLE batch(x INTEGER UNIQUE)")
+                results = await conn.execute_many(["INSERT INTO batch VALUES(1), (2)",
+                                                   "SELECT x FROM batch ORDER BY x"])
+                self.assertEqual([2, 2], [rows for rows, _ in results], 'the rows of every query, in order')
+                self.assertEqual([1, 2], results[1][1]['x'])
+                with self.assertRaises(DatabaseException.UNIQUE_VIOLATION):
+                    await conn.execute_many(["INSERT INTO batch VALUES(3)", "INSERT INTO batch VALUES(1)"])
+                async with conn.transaction():
+                    (deleted, _), (_, result) = await conn.execute_many(["DELETE FROM batch WHERE x = 2",
+                                                                         "SELECT x FROM batch ORDER BY x"])
+                    self.assertEqual((1, [1]), (deleted, result['x']))
+                _, result = await conn.execute("SELECT x FROM batch ORDER BY x")
+                self.assertEqual([1], result['x'], 'the failed batch took no effect, the block was committed')
+                await conn.execute("DROP TABLE batch")
+
+        asyncio.run(run())
+
+    def test_retry(self) -> None:
+        conflict = "DO $$ BEGIN IF nextval('async_attempts') < %d THEN " \
+                   "RAISE EXCEPTION 'conflict' USING ERRCODE = 'serialization_failure'; END IF; END $$"
+
+        def retries() -> (int, int):
+            counts = DBConnector.retries().get('serialization_failure', {'retries': 0, 'gave_up': 0})
+            return counts['retries'], counts['gave_up']
+
+        async def run():
+            before_retries, before_gave_up = retries()
+            async with AsyncDBConnector() as conn:
+                await conn.execute("CREATE TEMP SEQUENCE async_attempts")
+                await conn.execute(conflict % 3)
+                _, result = await conn.execute("SELECT currval('async_attempts') AS attempts")
+                self.assertEqual([3], result['attempts'], 'run until it succeeded')
+                self.assertEqual((before_retries + 2, before_gave_up), retries())
+
+                with self.assertRaises(errors.SerializationFailure):
+                    async with conn.transaction():
+                        await conn.execute(conflict % 100)
+                self.assertEqual((before_retries + 2, before_gave_up), retries(),
+                                 'a statement in a transaction() is not run again on its own')
+
+                await conn.execute("ALTER SEQUENCE async_attempts RESTART")
+                results = await conn.execute_many(["SELECT 1 AS one", conflict % 2])
+                self.assertEqual([1], results[0][1]['one'])
+                self.assertEqual((before_retries + 3, before_gave_up), retries(), 'the batch ran again')
+                await conn.execute("DROP SEQUENCE async_attempts")
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,68 @@
+import unittest
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Owner import Owner
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    def test_add_owners(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_owner(Owner(1, 'o1')))
+        results = Solution.add_owners([Owner(2, 'o2'), Owner(1, 'again'), Owner(3, 'o3'), Owner(3, 'twice')])
+        self.assertEqual([ReturnValue.OK, ReturnValue.ALREADY_EXISTS, ReturnValue.OK, ReturnValue.ALREADY_EXISTS],
+                         results)
+
+    def test_add_customers_bad_params(self) -> None:
+        results = Solution.add_customers([Customer(1, 'c1'), Customer(2, None), Customer(-3, 'c3'),
+                                          Customer(1, 'c1 again')])
+        self.assertEqual([ReturnValue.OK, ReturnValue.BAD_PARAMS, ReturnValue.BAD_PARAMS,
+                          ReturnValue.ALREADY_EXISTS], results)
+
+    def test_add_apartments(self) -> None:
+        apartments = (Apartment(i, 'street %d' % i, 'Haifa', 'Israel', 50 + i) for i in range(1, 2501))
+        self.assertEqual([ReturnValue.OK] * 2500, Solution.add_apartments(apartments), 'spans several chunks')
+        results = Solution.add_apartments([Apartment(3000, 'street 1', 'Haifa', 'Israel', 10),
+                                           Apartment(3001, 'street 1', 'Tel Aviv', 'Israel', 0),
+                                           Apartment(3002, 'street 1', 'Tel Aviv', 'Israel', 10)])
+        self.assertEqual([ReturnValue.ALREADY_EXISTS, ReturnValue.BAD_PARAMS, ReturnValue.OK], results)
+
+    def test_batch_lookups(self) -> None:
+        Solution.add_owners([Owner(1, 'o1'), Owner(2, 'o2')])
+        Solution.add_customers([Customer(1, 'c1')])
+        Solution.add_apartments([Apartment(i, 'a%d' % i, 'Haifa', 'Israel', 50) for i in range(1, 4)])
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(2, 1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 3))
+        # prepares the statements on the pooled connection, with different ids so that the second is not cached
+        Solution.get_owners([9])
+        Solution.get_owner(10)
+        Solution._clear_caches()
+
+        before = Connector.DBConnector.round_trips()
+        Solution.get_owner(8)
+        single = Connector.DBConnector.round_trips() - before
+        before = Connector.DBConnector.round_trips()
+        self.assertEqual([Owner(2, 'o2'), Owner.bad_owner(), Owner(1, 'o1'), Owner(2, 'o2')],
+                         Solution.get_owners([2, 5, 1, 2]), 'in input order, bad for missing ids')
+        self.assertEqual(single, Connector.DBConnector.round_trips() - before, 'a single statement, as for one owner')
+        self.assertEqual([Customer.bad_customer(), Customer(1, 'c1')], Solution.get_customers([-1, 1]))
+        self.assertEqual([Apartment(3, 'a3', 'Haifa', 'Israel', 50), Apartment(1, 'a1', 'Haifa', 'Israel', 50)],
+                         Solution.get_apartments([3, 1]))
+        self.assertEqual([Owner(2, 'o2'), Owner.bad_owner(), Owner(1, 'o1')], Solution.get_apartment_owners([1, 2, 3]))
+        self.assertEqual([], Solution.get_owners([]))
+
+        before = Connector.DBConnector.round_trips()
+        self.assertEqual([Owner(1, 'o1'), Owner.bad_owner()], Solution.get_owners([1, 5]))
+        self.assertEqual(0, Connector.DBConnector.round_trips() - before, 'answered from cache')
+        self.assertEqual(ReturnValue.OK, Solution.owner_drops_apartment(2, 1))
+        self.assertEqual(ReturnValue.OK, Solution.add_owner(Owner(5, 'o5')))
+        self.assertEqual([Owner.bad_owner(), Owner(5, 'o5')],
+                         [Solution.get_apartment_owners([1])[0], Solution.get_owners([5])[0]], 'writes invalidate')
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,34 @@
+import unittest
+
+from Business.Apartment import Apartment, FrozenApartment
+from Business.Owner import Owner
+from Business.Customer import Customer
+
+
+class Test(unittest.TestCase):
+    def test_hashable(self) -> None:
+        owners = {Owner(1, 'o1').freeze(), Owner(1, 'o1').freeze(), Owner(2, 'o2').freeze()}
+        self.assertEqual(2, len(owners))
+        self.assertIn(Owner(2, 'o2').freeze(), owners)
+        self.assertEqual({Customer(1, 'c1').freeze(): 'first'}[Customer(1, 'c1').freeze()], 'first')
+        self.assertEqual(hash(Apartment(1, 'a', 'b', 'c', 10).freeze()), hash(Apartment(1, 'a', 'b', 'c', 20).freeze()),
+                         'size is not part of equality')
+        with self.assertRaises(TypeError, msg='a mutable object could change while in a set'):
+            hash(Owner(1, 'o1'))
+
+    def test_frozen(self) -> None:
+        apartment = Apartment(1, 'a', 'b', 'c', 10).freeze()
+        self.assertIsInstance(apartment, FrozenApartment)
+        self.assertEqual(Apartment(1, 'a', 'b', 'c', 10), apartment)
+        self.assertRaises(AttributeError, apartment.set_size, 20)
+        self.assertRaises(AttributeError, setattr, Owner(1, 'o1'), 'extra', 1)
+
+    def test_from_row(self) -> None:
+        rows = [{'id': 1, 'name': 'o1'}, {'id': 2, 'name': 'o2'}]
+        self.assertEqual([Owner(1, 'o1'), Owner(2, 'o2')], Owner.from_resultset(rows))
+        self.assertEqual(Customer.bad_customer(), Customer.from_row({'id': None, 'name': None}))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,175 @@
+import unittest
+from datetime import date
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.Cache import LRUCache, ResultCache
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+from Business.Owner import Owner
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_lru_eviction(self) -> None:
+        cache = LRUCache(maxsize=2)
+        cache.put(1, 'a')
+        cache.put(2, 'b')
+        self.assertEqual('a', cache.get(1))
+        cache.put(3, 'c')
+        self.assertIsNone(cache.get(2), 'least recently used entry is evicted')
+        self.assertEqual({'size': 2, 'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'evictions': 1, 'expirations': 0},
+                         cache.stats())
+
+    def test_ttl(self) -> None:
+        cache = LRUCache(ttl=0)
+        cache.put(1, 'a')
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(1, cache.stats()['expirations'])
+
+    def test_invalidation_during_load(self) -> None:
+        cache = LRUCache()
+
+        def load():
+            cache.invalidate(1)
+            return 'stale'
+
+        self.assertEqual('stale', cache.get_or_load(1, load))
+        self.assertIsNone(cache.get(1), 'a value loaded across an invalidation is not stored')
+
+    def test_get_or_load_many(self) -> None:
+        cache = LRUCache()
+        cache.put(2, 'b')
+        loads = []
+
+        def load_many(keys):
+            loads.append(keys)
+            return {key: str(key) for key in keys}
+
+        self.assertEqual(['1', 'b', '3', '1'], cache.get_or_load_many([1, 2, 3, 1], load_many))
+        self.assertEqual([[1, 3]], loads, 'the misses are loaded once, in order')
+        self.assertEqual(['1', 'b'], cache.get_or_load_many([1, 2], load_many))
+        self.assertEqual(1, len(loads), 'the loaded values were stored')
+
+        def load_invalidated(keys):
+            cache.invalidate(4)
+            return {key: 'stale' for key in keys}
+
+        self.assertEqual(['stale', 'stale'], cache.get_or_load_many([4, 5], load_invalidated))
+        self.assertIsNone(cache.get(5), 'values loaded across an invalidation are not stored')
+
+
+class ResultCacheTest(unittest.TestCase):
+    def test_versions(self) -> None:
+        cache = ResultCache()
+        loads = []
+
+        def load():
+            loads.append(len(loads))
+            return len(loads)
+
+        self.assertEqual(1, cache.get_or_load('f', (1,), ('Review', 'Owns'), load))
+        self.assertEqual(1, cache.get_or_load('f', (1,), ('Review', 'Owns'), load))
+        self.assertEqual(2, cache.get_or_load('f', (2,), ('Review', 'Owns'), load), 'keyed by the arguments')
+        cache.bump('Reservation')
+        self.assertEqual(1, cache.get_or_load('f', (1,), ('Review', 'Owns'), load), 'another table changed')
+        cache.bump('owns')
+        self.assertEqual(3, cache.get_or_load('f', (1,), ('Review', 'Owns'), load))
+        self.assertEqual(4, cache.get_or_load('f', (1,), ('Review', 'Owns'), load, refresh=True))
+        cache.clear()
+        self.assertEqual(5, cache.get_or_load('f', (1,), ('Review', 'Owns'), load))
+        self.assertEqual({'f': {'hits': 2, 'misses': 5, 'hit_rate': 2 / 7}}, cache.stats())
+
+    def test_write_during_load(self) -> None:
+        cache = ResultCache()
+
+        def load():
+            cache.bump('Review')
+            return 'stale'
+
+        self.assertEqual('stale', cache.get_or_load('f', (), ('Review',), load))
+        self.assertEqual('fresh', cache.get_or_load('f', (), ('Review',), lambda: 'fresh'),
+                         'a result loaded across a write is not served')
+
+    def test_replicas(self) -> None:
+        cache = ResultCache()
+        self.assertIsNone(cache.unreplicated(('Review', 'Owns')), 'nothing was written')
+        cache.bump('Review')
+        written = cache.unreplicated(('Review', 'Owns'))
+        self.assertEqual('lagging', cache.get_or_load('f', (), ('Review', 'Owns'),
+                                                      lambda: ResultCache.Uncached('lagging')))
+        self.assertEqual('caught up', cache.get_or_load('f', (), ('Review', 'Owns'), lambda: 'caught up'),
+                         'an uncached result is not stored')
+        cache.replicated(written)
+        self.assertIsNone(cache.unreplicated(('Review', 'Owns')))
+        cache.bump('Owns')
+        self.assertEqual((0, {'owns': 1}), cache.unreplicated(('Review', 'Owns')))
+        cache.clear()
+        self.assertEqual((1, {'review': 1, 'owns': 1}), cache.unreplicated(('Review', 'Owns')),
+                         'a clear may stand for any write')
+
+
+class Test(AbstractTest):
+    def test_owner_transfer(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_owner(Owner(1, 'o1')))
+        self.assertEqual(ReturnValue.OK, Solution.add_owner(Owner(2, 'o2')))
+        self.assertEqual(ReturnValue.OK, Solution.add_apartment(Apartment(1, 'a', 'Haifa', 'Israel', 50)))
+        self.assertEqual(Owner.bad_owner(), Solution.get_apartment_owner(1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 1))
+        self.assertEqual(Owner(1, 'o1'), Solution.get_apartment_owner(1))
+        self.assertEqual(Owner(1, 'o1'), Solution.get_apartment_owner(1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_drops_apartment(1, 1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(2, 1))
+        self.assertEqual(Owner(2, 'o2'), Solution.get_apartment_owner(1), 'no stale owner after a transfer')
+        self.assertEqual(ReturnValue.OK, Solution.delete_owner(2))
+        self.assertEqual(Owner.bad_owner(), Solution.get_owner(2))
+        self.assertEqual(Owner.bad_owner(), Solution.get_apartment_owner(1), 'ownership is gone with the owner')
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.delete_owner(2))
+
+    def test_result_cache(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'c1')))
+        self.assertEqual(ReturnValue.OK, Solution.add_apartment(Apartment(1, 'a', 'Haifa', 'Israel', 50)))
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2023, 1, 1), date(2023, 1, 3), 100))
+        calls = Solution.RESULT_CACHE.stats().get('get_top_customer', {'hits': 0, 'misses': 0})
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer())
+        self.assertAlmostEqual(15, dict(Solution.profit_per_month(2023))[1])
+
+        before = Connector.DBConnector.round_trips()
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer())
+        self.assertAlmostEqual(15, dict(Solution.profit_per_month(2023))[1])
+        self.assertEqual(0, Connector.DBConnector.round_trips() - before, 'answered from cache')
+        Solution.profit_per_month(2023).clear()
+        self.assertEqual(12, len(Solution.profit_per_month(2023)), 'callers get a copy of the cached list')
+
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(2, 'c2')))
+        for start in (date(2023, 2, 1), date(2023, 3, 1)):
+            self.assertEqual(ReturnValue.OK, Solution.customer_made_reservation(2, 1, start, start.replace(day=2), 10))
+        self.assertEqual(Customer(2, 'c2'), Solution.get_top_customer(), 'a reservation changes the answer')
+        self.assertAlmostEqual(1.5, dict(Solution.profit_per_month(2023))[3])
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(2))
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer(), 'so does a cascaded delete')
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, Solution.add_customer(Customer(1, 'c1')))
+        self.assertEqual(ReturnValue.NOT_EXISTS, Solution.delete_customer(2))
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer(), 'a failed write changes nothing')
+        stats = Solution.RESULT_CACHE.stats()['get_top_customer']
+        self.assertEqual((2, 3), (stats['hits'] - calls['hits'], stats['misses'] - calls['misses']))
+
+    def test_cached_copies(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_owner(Owner(1, 'o1')))
+        owner = Solution.get_owner(1)
+        owner.set_owner_name('changed')
+        self.assertEqual(Owner(1, 'o1'), Solution.get_owner(1), 'the cached owner is not shared with callers')
+        owners = Solution.get_owners([1, 2])
+        owners[0].set_owner_name('changed')
+        owners[1].set_owner_id(2)
+        self.assertEqual([Owner(1, 'o1'), Owner.bad_owner()], Solution.get_owners([1, 2]))
+        self.assertEqual(ReturnValue.BAD_PARAMS, Solution.delete_owner(None))
+        self.assertEqual(ReturnValue.BAD_PARAMS, Solution.delete_customer(None))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
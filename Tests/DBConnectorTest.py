@@ -0,0 +1,264 @@
+import threading
+import time
+import unittest
+from datetime import date
+
+from psycopg2 import errors
+
+import Utility.DBConnector as Connector
+from Utility.DBConnector import ConnectionPool
+from Utility.Exceptions import DatabaseException
+
+
+class Test(unittest.TestCase):
+    def test_connection_reused(self) -> None:
+        with Connector.DBConnector() as conn:
+            first = conn.connection
+        with Connector.DBConnector() as conn:
+            self.assertIs(first, conn.connection, 'connection returned to the pool is reused')
+
+    def test_close_twice(self) -> None:
+        conn = Connector.DBConnector()
+        size = Connector.DBConnector.pool().size()
+        conn.close()
+        conn.close()
+        self.assertEqual(size, Connector.DBConnector.pool().size(), 'closing twice returns the connection once')
+
+    def test_uncommitted_work_rolled_back(self) -> None:
+        conn = Connector.DBConnector()
+        conn.cursor.execute("CREATE TEMP TABLE pool_rollback(x INTEGER)")
+        conn.close()
+        with Connector.DBConnector() as conn:
+            _, result = conn.execute("SELECT to_regclass('pg_temp.pool_rollback') IS NULL AS missing")
+            self.assertTrue(result[0]['missing'], 'uncommitted table is gone')
+
+    def test_pool_exhausted(self) -> None:
+        pool = ConnectionPool(Connector.DBConnector.pool().params, minconn=0, maxconn=2)
+        try:
+            first, second = pool.getconn(), pool.getconn()
+            self.assertRaises(DatabaseException.ConnectionInvalid, pool.getconn, 0.1)
+            pool.putconn(first)
+            self.assertIs(first, pool.getconn(0.1), 'returned connection is handed out again')
+            pool.putconn(first)
+            pool.putconn(second)
+        finally:
+            pool.closeall()
+
+    def test_pool_threads(self) -> None:
+        pool = ConnectionPool(Connector.DBConnector.pool().params, minconn=1, maxconn=3)
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(20):
+                    with pool.connection(timeout=5) as connection:
+                        with connection.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([], errors)
+            self.assertLessEqual(pool.size(), 3, 'pool never grows past maxconn')
+        finally:
+            pool.closeall()
+
+    def test_transaction(self) -> None:
+        with Connector.DBConnector() as conn:
+            conn.execute("CREATE TEMP TABLE tx(x INTEGER UNIQUE)")
+            with conn.transaction():
+                conn.execute("INSERT INTO tx VALUES(1)")
+                with self.assertRaises(DatabaseException.UNIQUE_VIOLATION):
+                    with conn.transaction():
+                        conn.execute("INSERT INTO tx VALUES(2)")
+                        conn.execute("INSERT INTO tx VALUES(1)")
+                conn.execute("INSERT INTO tx VALUES(3)")
+            _, result = conn.execute("SELECT x FROM tx ORDER BY x")
+            self.assertEqual([1, 3], result['x'], 'only the failed savepoint is rolled back')
+
+            with self.assertRaises(ZeroDivisionError):
+                with conn.transaction():
+                    conn.execute("INSERT INTO tx VALUES(4)")
+                    1 / 0
+            _, result = conn.execute("SELECT x FROM tx ORDER BY x")
+            self.assertEqual([1, 3], result['x'], 'the whole transaction is rolled back')
+
+    def test_execute_stream(self) -> None:
+        with Connector.DBConnector() as conn:
+            with conn.execute_stream("SELECT x, x * 2 AS Doubled FROM generate_series(1, 5000) AS x",
+                                     itersize=100) as rows:
+                total = 0
+                for row in rows:
+                    total += row['doubled'] - row['x']
+            self.assertEqual(5000, rows.rows_fetched)
+            self.assertEqual(['x', 'doubled'], rows.cols_header)
+            self.assertEqual(sum(range(1, 5001)), total)
+            _, result = conn.execute("SELECT 1 AS one")
+            self.assertEqual([1], result['one'], 'connection is usable after streaming')
+
+    def test_result_columns(self) -> None:
+        with Connector.DBConnector() as conn:
+            _, result = conn.execute("SELECT x AS Value FROM generate_series(1, 3) AS x")
+            self.assertEqual([1, 2, 3], result['value'])
+            self.assertEqual([1, 2, 3], result['VALUE'], 'case insensitive')
+            _, result = conn.execute("SELECT x AS value FROM generate_series(1, 3) AS x WHERE x > 3")
+            self.assertEqual([], result['value'], 'no rows')
+
+    def test_execute_prepared(self) -> None:
+        Connector.DBConnector.define_statement('test_add', "SELECT $1::INTEGER + $2::INTEGER AS total")
+        with Connector.DBConnector() as conn:
+            _, result = conn.execute_prepared('test_add', (1, 2))
+            self.assertEqual([3], result['total'])
+            prepared = dict(conn.connection.prepared)
+            _, result = conn.execute_prepared('test_add', (3, 4))
+            self.assertEqual([7], result['total'])
+            self.assertEqual(prepared, conn.connection.prepared, 'prepared once per connection')
+
+            conn.execute("DEALLOCATE ALL")
+            _, result = conn.execute_prepared('test_add', (5, 6))
+            self.assertEqual([11], result['total'], 'prepared again after the session forgot it')
+
+    def test_prepared_eviction(self) -> None:
+        size = Connector.DBConnector.prepared_cache_size
+        Connector.DBConnector.prepared_cache_size = 2
+        try:
+            for i in range(3):
+                Connector.DBConnector.define_statement('test_eviction_%d' % i, "SELECT %d AS i" % i)
+            with Connector.DBConnector() as conn:
+                for i in range(3):
+                    _, result = conn.execute_prepared('test_eviction_%d' % i)
+                    self.assertEqual([i], result['i'])
+                self.assertEqual(2, len(conn.connection.prepared))
+                _, result = conn.execute("SELECT count(*) AS n FROM pg_prepared_statements")
+                self.assertEqual([2], result['n'], 'evicted statement was deallocated')
+        finally:
+            Connector.DBConnector.prepared_cache_size = size
+
+    def test_round_trips(self) -> None:
+        before = Connector.DBConnector.round_trips()
+        with Connector.DBConnector() as conn:
+            conn.execute("SELECT 1")
+        self.assertEqual(3, Connector.DBConnector.round_trips() - before, 'BEGIN, SELECT and COMMIT')
+        before = Connector.DBConnector.round_trips()
+        with Connector.DBConnector() as conn:
+            with conn.transaction():
+                conn.execute("SELECT 1")
+                conn.execute("SELECT 2")
+        self.assertEqual(4, Connector.DBConnector.round_trips() - before, 'one BEGIN and COMMIT for the block')
+
+    def test_execute_many(self) -> None:
+        with Connector.DBConnector() as conn:
+            conn.execute("CREATE TEMP TABLE batch(x INTEGER UNIQUE, d DATE)")
+            before = conn.connection.round_trips
+            results = conn.execute_many(["INSERT INTO batch VALUES(1, '2023-01-01')",
+                                         "INSERT INTO batch VALUES(2, NULL), (3, NULL)",
+                                         "SELECT x FROM batch ORDER BY x", "SELECT d FROM batch WHERE x = 1"])
+            self.assertEqual(6, conn.connection.round_trips - before, 'BEGIN, every query and COMMIT')
+            self.assertEqual([1, 2, 3, 1], [rows for rows, _ in results], 'the rows of every query, in order')
+            self.assertTrue(results[0][1].isEmpty() and results[1][1].isEmpty())
+            self.assertEqual([1, 2, 3], results[2][1]['x'])
+            self.assertEqual([date(2023, 1, 1)], results[3][1]['d'], 'converted like by execute')
+
+            with self.assertRaises(DatabaseException.UNIQUE_VIOLATION):
+                conn.execute_many(["INSERT INTO batch VALUES(4)", "INSERT INTO batch VALUES(1)",
+                                   "INSERT INTO batch VALUES(5)"])
+            _, result = conn.execute("SELECT x FROM batch ORDER BY x")
+            self.assertEqual([1, 2, 3], result['x'], 'none of the failed batch took effect')
+
+            with conn.transaction():
+                (deleted, _), (_, count) = conn.execute_many(["DELETE FROM batch WHERE x = 3",
+                                                              "SELECT COUNT(*) AS n FROM batch"])
+                self.assertEqual((1, 2), (deleted, count[0]['n']), 'in a savepoint of the block')
+                (updated, _), (_, result) = conn.execute_many(["UPDATE batch SET x = x + 10",
+                                                               "SELECT x FROM batch ORDER BY x"])
+                self.assertEqual((2, [11, 12]), (updated, result['x']), 'in the transaction of the block')
+            _, result = conn.execute("SELECT x FROM batch ORDER BY x")
+            self.assertEqual([11, 12], result['x'], 'committed with the block')
+
+            before = conn.connection.round_trips
+            self.assertEqual([], conn.execute_many([]))
+            self.assertEqual(0, conn.connection.round_trips - before, 'nothing to send')
+
+    def retries(self, error_class: str) -> (int, int):
+        counts = Connector.DBConnector.retries().get(error_class, {'retries': 0, 'gave_up': 0})
+        return counts['retries'], counts['gave_up']
+
+    def test_retry_statement(self) -> None:
+        conflict = "DO $$ BEGIN IF nextval('statement_attempts') < %d THEN " \
+                   "RAISE EXCEPTION 'conflict' USING ERRCODE = 'serialization_failure'; END IF; END $$"
+        retries, gave_up = self.retries('serialization_failure')
+        with Connector.DBConnector() as conn:
+            conn.execute("CREATE TEMP SEQUENCE statement_attempts")
+            conn.execute(conflict % 3)
+            _, result = conn.execute("SELECT currval('statement_attempts') AS attempts")
+            self.assertEqual([3], result['attempts'], 'run until it succeeded')
+            self.assertEqual((retries + 2, gave_up), self.retries('serialization_failure'))
+
+            attempts = Connector.DBConnector.retry_attempts
+            Connector.DBConnector.retry_attempts = 2
+            try:
+                with self.assertRaises(errors.SerializationFailure):
+                    conn.execute(conflict % 100)
+            finally:
+                Connector.DBConnector.retry_attempts = attempts
+            self.assertEqual((retries + 3, gave_up + 1), self.retries('serialization_failure'))
+
+            with self.assertRaises(errors.SerializationFailure):
+                with conn.transaction():
+                    conn.execute(conflict % 100)
+            self.assertEqual((retries + 3, gave_up + 1), self.retries('serialization_failure'),
+                             'a statement in a transaction() is not run again on its own')
+            conn.execute("DROP SEQUENCE statement_attempts")
+
+    def test_run_transaction(self) -> None:
+        with Connector.DBConnector() as conn:
+            conn.execute("CREATE TEMP TABLE retried(x INTEGER)")
+            conn.execute("CREATE TEMP SEQUENCE transaction_attempts")
+
+            def body(conn):
+                conn.execute("INSERT INTO retried VALUES(1)")
+                conn.execute("DO $$ BEGIN IF nextval('transaction_attempts') < 2 THEN "
+                             "RAISE EXCEPTION 'deadlock' USING ERRCODE = 'deadlock_detected'; END IF; END $$")
+                return 'done'
+
+            self.assertEqual('done', conn.run_transaction(body))
+            _, result = conn.execute("SELECT x FROM retried")
+            self.assertEqual([1], result['x'], 'the first attempt was rolled back')
+            conn.execute("DROP TABLE retried")
+            conn.execute("DROP SEQUENCE transaction_attempts")
+
+    def test_reconnect(self) -> None:
+        retries, _ = self.retries('connection_lost')
+        with Connector.DBConnector() as victim, Connector.DBConnector() as killer:
+            _, result = victim.execute("SELECT pg_backend_pid() AS pid")
+            pid = result[0]['pid']
+            killer.execute("SELECT pg_terminate_backend(%d)" % pid)
+            for _ in range(100):
+                _, result = killer.execute("SELECT COUNT(*) AS n FROM pg_stat_activity WHERE pid = %d" % pid)
+                if result[0]['n'] == 0:
+                    break
+                time.sleep(0.01)
+            _, result = victim.execute("SELECT 1 AS one")
+            self.assertEqual([1], result['one'], 'read again on a new connection')
+            self.assertEqual(retries + 1, self.retries('connection_lost')[0])
+
+            calls = []
+
+            def body(conn):
+                calls.append(conn.connection)
+                if len(calls) == 1:
+                    conn.execute("SELECT pg_terminate_backend(pg_backend_pid())")
+                return len(calls)
+
+            self.assertEqual(2, victim.run_transaction(body), 'the transaction lost its connection before committing')
+            self.assertIsNot(calls[0], calls[1])
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,67 @@
+import unittest
+from psycopg2 import sql
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Tests.AbstractTest import AbstractTest
+
+
+class Test(AbstractTest):
+    # the plan of a query, with sequential scans disabled so that the planner picks an index even on tiny tables
+    @staticmethod
+    def plan(conn: Connector.DBConnector, query) -> str:
+        with conn.transaction():
+            conn.execute("SET LOCAL enable_seqscan = off")
+            _, result = conn.execute(sql.SQL("EXPLAIN ") + query)
+        return '\n'.join(result['QUERY PLAN'])
+
+    # the plan of a statement of Solution.PREPARED_STATEMENTS executed with the given parameters
+    def prepared_plan(self, statement: str, params: tuple) -> str:
+        with Connector.DBConnector() as conn:
+            conn.execute(sql.SQL("PREPARE explained AS ") + sql.SQL(Solution.PREPARED_STATEMENTS[statement]))
+            try:
+                execute = sql.SQL("EXECUTE explained")
+                if params:
+                    execute += sql.SQL("({})").format(sql.SQL(', ').join(map(sql.Literal, params)))
+                return self.plan(conn, execute)
+            finally:
+                conn.execute("DEALLOCATE explained")
+
+    def test_indexes_exist(self) -> None:
+        with Connector.DBConnector() as conn:
+            _, result = conn.execute("SELECT indexname FROM pg_indexes")
+        for index in Solution.INDEXES:
+            self.assertIn(index, result['indexname'])
+
+    def test_owner_apartments(self) -> None:
+        query = sql.SQL(Solution.STREAMED_QUERIES['get_owner_apartments']).format(owner_id=sql.Literal(1))
+        with Connector.DBConnector() as conn:
+            self.assertIn('owns_owner_id', self.plan(conn, query))
+
+    # the indexes of Reservation are used through those of its partitions, named after the partition
+    def test_top_customer(self) -> None:
+        self.assertIn('customer_reservation_rank', self.prepared_plan('get_top_customer', ()))
+        self.assertIn('_customer_id_idx', self.prepared_plan('get_top_customer_direct', ()))
+
+    def test_profit_per_month(self) -> None:
+        Solution.add_reservation_partitions(2022, 2024)
+        plan = self.prepared_plan('profit_per_month_direct', (2023,))
+        self.assertIn('reservation_2023', plan)
+        self.assertNotIn('reservation_2024', plan, 'the later years are pruned')
+        query = sql.SQL("SELECT SUM(total_price) FROM Reservation WHERE start_date >= '2023-01-01' "
+                        "AND start_date < '2024-01-01' AND end_date >= '2023-06-01' AND end_date < '2023-07-01'")
+        with Connector.DBConnector() as conn:
+            plan = self.plan(conn, query)
+        self.assertIn('Scan on reservation_2023', plan)
+        self.assertNotIn('reservation_2022', plan, 'a range of start dates is read from its partitions only')
+
+    def test_cancel_reservation(self) -> None:
+        Solution.add_reservation_partitions(2022, 2024)
+        plan = self.prepared_plan('customer_cancelled_reservation', (1, 1, '2023-01-01'))
+        self.assertIn('reservation_2023_pkey', plan)
+        self.assertNotIn('reservation_2022', plan, 'only the partition of the start date is read')
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
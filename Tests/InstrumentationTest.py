@@ -0,0 +1,73 @@
+import unittest
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.Instrumentation import Instrumentation, StatementEvent, StatsRegistry, fingerprint
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Owner import Owner
+from Business.Apartment import Apartment
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_literals(self) -> None:
+        self.assertEqual("SELECT * FROM Owner WHERE id = ? AND name = ?",
+                         fingerprint("SELECT *  FROM Owner\n WHERE id = 12 AND name = 'it''s'"))
+        self.assertEqual("INSERT INTO T VALUES(?, ...)", fingerprint("INSERT INTO T VALUES(1, 2.5, 'x')"))
+        self.assertEqual('EXECUTE "prepared_3"', fingerprint('EXECUTE "prepared_3"'), 'identifiers are kept')
+        self.assertEqual("SELECT $1", fingerprint("SELECT $1"))
+
+    def test_registry(self) -> None:
+        registry = StatsRegistry(max_plans=1)
+        registry(StatementEvent('q', 'q', 0.002, 3, 'get_owner', None))
+        registry(StatementEvent('q', 'q', 0.004, 1, None, 'plan 1'))
+        registry(StatementEvent('q', 'q', 10.0, 0, 'get_owner', 'plan 2'))
+        stats = registry.dump()['q']
+        self.assertEqual(3, stats['count'])
+        self.assertEqual(4, stats['rows'])
+        self.assertAlmostEqual(10000, stats['max_ms'])
+        self.assertEqual({'<=2.5ms': 1, '<=5ms': 1, '>5000ms': 1}, stats['histogram'])
+        self.assertEqual({'get_owner': 2}, stats['callers'])
+        self.assertEqual(['plan 2'], [plan['plan'] for plan in stats['plans']], 'only the latest plans are kept')
+        registry.reset()
+        self.assertEqual({}, registry.dump())
+
+
+class Test(AbstractTest):
+    def tearDown(self) -> None:
+        Connector.DBConnector.instrument(None)
+        super().tearDown()
+
+    def test_statements_recorded(self) -> None:
+        events = []
+        instrumentation = Instrumentation(hooks=[events.append], slow_ms=0, explain_sample_rate=1.0)
+        Connector.DBConnector.instrument(instrumentation)
+        self.assertEqual(ReturnValue.OK, Solution.add_owner(Owner(1, 'o1')))
+        self.assertEqual(ReturnValue.OK, Solution.add_apartment(Apartment(1, 'a1', 'Haifa', 'Israel', 50)))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 1))
+        Solution._clear_caches()
+        self.assertEqual(Owner(1, 'o1'), Solution.get_owner(1))
+        Connector.DBConnector.instrument(None)
+        Solution._clear_caches()
+        Solution.get_owner(1)
+
+        get_owner = [event for event in events if event.fingerprint == 'get_owner']
+        self.assertEqual(1, len(get_owner), 'nothing is recorded once instrumentation is removed')
+        self.assertEqual('get_owner', get_owner[0].caller)
+        self.assertEqual(1, get_owner[0].rows)
+        self.assertIn('Buffers', get_owner[0].plan)
+        insert = [event for event in events if event.fingerprint.startswith('INSERT INTO Owner')]
+        self.assertEqual('add_owner', insert[0].caller)
+        self.assertIn('Insert on owner', insert[0].plan)
+        self.assertNotIn('actual', insert[0].plan, 'a write is not executed again')
+        owns = [event for event in events if event.fingerprint == 'owner_owns_apartment']
+        self.assertEqual('owner_owns_apartment', owns[0].caller)
+        self.assertNotIn('actual', owns[0].plan, 'neither is a prepared write')
+        self.assertEqual({'add_owner': 1}, instrumentation.registry.dump()[insert[0].fingerprint]['callers'])
+        self.assertEqual(Owner(1, 'o1'), Solution.get_owner(1), 'explaining the writes did not change anything')
+        self.assertEqual(Owner(1, 'o1'), Solution.get_apartment_owner(1))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,71 @@
+import unittest
+from datetime import date
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+from Business.Owner import Owner
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.add_owners([Owner(i, 'o%d' % i) for i in range(1, 4)])
+        Solution.add_customers([Customer(i, 'c%d' % i) for i in range(1, 4)])
+        Solution.add_apartments([Apartment(i, 'a%d' % i, 'Haifa', 'Israel', 50) for i in range(1, 4)])
+
+    def reserve(self, customer_id: int, apartment_id: int, day: int) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.customer_made_reservation(
+            customer_id, apartment_id, date(2023, 1, day), date(2023, 1, day + 1), 100))
+
+    def test_top_customer(self) -> None:
+        self.assertEqual(Customer.bad_customer(), Solution.get_top_customer())
+        self.reserve(3, 1, 1)
+        self.reserve(2, 2, 1)
+        self.assertEqual(Customer(2, 'c2'), Solution.get_top_customer(), 'ties are broken by id')
+        self.reserve(3, 2, 2)
+        self.assertEqual(Customer(3, 'c3'), Solution.get_top_customer())
+        self.assertEqual(ReturnValue.OK, Solution.customer_cancelled_reservation(3, 1, date(2023, 1, 1)))
+        self.assertEqual(Customer(2, 'c2'), Solution.get_top_customer())
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(2))
+        self.assertEqual(Customer.bad_customer(), Solution.get_top_customer(), 'cascaded deletes are counted')
+        self.assertEqual(0, Solution.rebuild_reservation_counts())
+
+    def test_reservations_per_owner(self) -> None:
+        for day in range(1, 4):
+            self.reserve(1, 1, day)
+        self.reserve(2, 2, 1)
+        self.assertEqual([('o1', 0), ('o2', 0), ('o3', 0)], sorted(Solution.reservations_per_owner()))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 2))
+        self.assertEqual([('o1', 4), ('o2', 0), ('o3', 0)], sorted(Solution.reservations_per_owner()))
+        self.assertEqual(ReturnValue.OK, Solution.owner_drops_apartment(1, 1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(2, 1))
+        self.assertEqual([('o1', 1), ('o2', 3), ('o3', 0)], sorted(Solution.reservations_per_owner()),
+                         'the reservations move with the apartment')
+        self.reserve(3, 1, 10)
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(1))
+        self.assertEqual([('o1', 1), ('o2', 1), ('o3', 0)], sorted(Solution.reservations_per_owner()))
+        self.assertEqual(ReturnValue.OK, Solution.delete_owner(1))
+        self.assertEqual([('o2', 1), ('o3', 0)], sorted(Solution.reservations_per_owner()))
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(1))
+        self.assertEqual([('o2', 0), ('o3', 0)], sorted(Solution.reservations_per_owner()))
+        self.assertEqual(0, Solution.rebuild_reservation_counts())
+
+    def test_rebuild(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 1))
+        self.reserve(1, 1, 1)
+        with Connector.DBConnector() as conn:
+            conn.execute("DELETE FROM CustomerReservationCount")
+            conn.execute("UPDATE OwnerReservationCount SET reservations = 7")
+        self.assertEqual(2, Solution.rebuild_reservation_counts())
+        self.assertEqual(0, Solution.rebuild_reservation_counts())
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
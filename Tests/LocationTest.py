@@ -0,0 +1,57 @@
+import unittest
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Owner import Owner
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.add_owners([Owner(i, 'o%d' % i) for i in range(1, 4)])
+        Solution.add_apartments([Apartment(1, 'a1', 'Haifa', 'Israel', 50),
+                                 Apartment(2, 'a2', 'Haifa', 'Israel', 50),
+                                 Apartment(3, 'a3', 'Tel Aviv', 'Israel', 50),
+                                 Apartment(4, 'a4', 'Paris', 'France', 50),
+                                 Apartment(5, 'a5', 'Paris', 'Texas', 50)])
+
+    def owners(self):
+        return [owner.get_owner_id() for owner in Solution.get_all_location_owners()]
+
+    def test_all_location_owners(self) -> None:
+        self.assertEqual([], self.owners())
+        for apartment_id in (1, 3, 4, 5):
+            self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, apartment_id))
+        self.assertEqual([1], self.owners())
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(2, 2))
+        self.assertEqual([1], self.owners(), 'a second apartment in Haifa is no new location')
+        self.assertEqual(ReturnValue.OK, Solution.add_apartment(Apartment(6, 'a6', 'Eilat', 'Israel', 50)))
+        self.assertEqual([], self.owners(), 'nobody owns an apartment in Eilat')
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 6))
+        self.assertEqual([1], self.owners())
+        self.assertEqual(ReturnValue.OK, Solution.owner_drops_apartment(1, 5))
+        self.assertEqual([], self.owners(), 'Paris, Texas is a location of its own')
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(5))
+        self.assertEqual([1], self.owners(), 'the location is gone with its only apartment')
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(1))
+        self.assertEqual([], self.owners(), 'Haifa is left with the apartment of owner 2')
+        self.assertEqual(ReturnValue.OK, Solution.delete_owner(2))
+        self.assertEqual([], self.owners(), 'the apartment in Haifa is still there without an owner')
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(2))
+        self.assertEqual([1], self.owners())
+        self.assertEqual(0, Solution.rebuild_location_totals())
+
+    def test_rebuild(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(3, 1))
+        with Connector.DBConnector() as conn:
+            conn.execute("DELETE FROM OwnerLocationCount")
+        self.assertEqual(1, Solution.rebuild_location_totals())
+        self.assertEqual(0, Solution.rebuild_location_totals())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
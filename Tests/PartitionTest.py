@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.add_customers([Customer(i, 'c%d' % i) for i in range(1, 4)])
+        Solution.add_apartments([Apartment(i, 'a%d' % i, 'Haifa', 'Israel', 50) for i in range(1, 4)])
+
+    @staticmethod
+    def partitions() -> list:
+        with Connector.DBConnector() as conn:
+            _, result = conn.execute("""
+                SELECT C.relname FROM pg_inherits I JOIN pg_class C ON C.oid = I.inhrelid
+                WHERE I.inhparent = 'reservation'::regclass ORDER BY 1
+            """)
+        return [] if result.isEmpty() else result['relname']
+
+    def test_partition_per_year(self) -> None:
+        this_year = date.today().year
+        self.assertLessEqual({'reservation_%d' % this_year, 'reservation_%d' % (this_year + 1)}, set(self.partitions()))
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2010, 5, 1), date(2010, 5, 3), 100))
+        self.assertIn('reservation_2010', self.partitions(), 'created by the first reservation of the year')
+        self.assertEqual(1, Solution.add_reservation_partitions(2010, 2011))
+        self.assertEqual(0, Solution.add_reservation_partitions(2010, 2011))
+
+    def test_partition_dropped_elsewhere(self) -> None:
+        self.assertEqual(1, Solution.add_reservation_partitions(2012, 2012))
+        with Connector.DBConnector() as conn:
+            conn.execute("DROP TABLE reservation_2012")  # as if archived by another process
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2012, 5, 1), date(2012, 5, 3), 100))
+        self.assertIn('reservation_2012', self.partitions(), 'created again')
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(2, 1, date(2012, 5, 2), date(2012, 5, 4), 100))
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(2, 2, date(2012, 5, 4), date(2012, 5, 2), 100))
+
+    def test_no_partition_for_invalid_reservations(self) -> None:
+        self.assertEqual(ReturnValue.NOT_EXISTS,
+                         Solution.customer_made_reservation(9, 1, date(1990, 5, 1), date(1990, 5, 3), 100))
+        self.assertEqual(ReturnValue.NOT_EXISTS,
+                         Solution.customer_made_reservation(1, 9, date(1990, 5, 1), date(1990, 5, 3), 100))
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(None, 1, date(1991, 5, 1), date(1991, 5, 3), 100))
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(1, 1, date(1992, 5, 3), date(1992, 5, 1), 100))
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(1, 1, date(1993, 5, 1), date(1993, 5, 3), 0))
+        self.assertFalse({'reservation_1990', 'reservation_1991', 'reservation_1992', 'reservation_1993'}
+                         & set(self.partitions()))
+
+    def test_overlap_across_years(self) -> None:
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2023, 12, 30), date(2024, 1, 3), 400))
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(2, 1, date(2024, 1, 2), date(2024, 1, 4), 200),
+                         'the nights overlap, though the reservations are in different partitions')
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(2, 1, date(2024, 1, 3), date(2024, 1, 4), 100))
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(2, 2, date(2024, 1, 2), date(2024, 1, 4), 200))
+
+    def test_archive_and_restore(self) -> None:
+        for customer_id, year in ((1, 2021), (1, 2022), (2, 2022), (3, 2023)):
+            self.assertEqual(ReturnValue.OK, Solution.customer_made_reservation(
+                customer_id, customer_id, date(year, 3, 1), date(year, 3, 3), 100))
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer())
+
+        with tempfile.TemporaryDirectory() as directory:
+            # and the (empty) partitions of older years other tests may have left
+            paths = Solution.archive_reservations(2023, directory)
+            self.assertEqual([os.path.join(directory, 'reservation_%d.csv.gz' % year) for year in (2021, 2022)],
+                             paths[-2:])
+            self.assertNotIn('reservation_2021', self.partitions())
+            self.assertEqual(Customer(3, 'c3'), Solution.get_top_customer(), 'the archived reservations are gone')
+            self.assertAlmostEqual(0, dict(Solution.profit_per_month(2022))[3])
+            self.assertEqual(0, Solution.rebuild_reservation_counts(), 'the counters were updated')
+            self.assertEqual(0, Solution.rebuild_profit_rollup(), 'the monthly revenues were updated')
+
+            self.assertEqual(2, Solution.restore_reservations(paths[-1]))
+            self.assertAlmostEqual(30, dict(Solution.profit_per_month(2022))[3])
+            self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer())
+            self.assertEqual(0, Solution.rebuild_reservation_counts())
+            version = Solution.RESULT_CACHE.version('Reservation')
+            self.assertEqual(-1, Solution.restore_reservations(paths[-1]), 'the reservations are back already')
+            self.assertEqual(version, Solution.RESULT_CACHE.version('Reservation'), 'nothing was written')
+
+
+    def test_archive_fails(self) -> None:
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2019, 3, 1), date(2019, 3, 3), 100))
+        with tempfile.TemporaryDirectory() as directory:
+            # the archive cannot be renamed over a directory
+            os.mkdir(os.path.join(directory, 'reservation_2019.csv.gz'))
+            self.assertNotIn(os.path.join(directory, 'reservation_2019.csv.gz'),
+                             Solution.archive_reservations(2020, directory))
+            self.assertIn('reservation_2019', self.partitions(), 'not dropped without its archive')
+            self.assertEqual(['reservation_2019.csv.gz'],
+                             [name for name in os.listdir(directory) if name.startswith('reservation_2019')])
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer())
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
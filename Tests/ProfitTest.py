@@ -0,0 +1,81 @@
+import random
+import unittest
+from datetime import date, timedelta
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.add_customers([Customer(i, 'c%d' % i) for i in range(1, 11)])
+        Solution.add_apartments([Apartment(i, 'a%d' % i, 'Haifa', 'Israel', 50) for i in range(1, 11)])
+
+    def assertMatchesReservations(self, years) -> None:
+        with Connector.DBConnector() as conn:
+            for year in years:
+                _, direct = conn.execute_prepared('profit_per_month_direct', (year,))
+                expected = list(zip(direct['month'], direct['profit']))
+                actual = Solution.profit_per_month(year)
+                self.assertEqual([month for month, _ in expected], [month for month, _ in actual])
+                for (_, expected_profit), (_, actual_profit) in zip(expected, actual):
+                    self.assertAlmostEqual(expected_profit, actual_profit, 6)
+
+    def test_example(self) -> None:
+        self.assertEqual([(month, 0) for month in range(1, 13)], Solution.profit_per_month(2023))
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2023, 1, 30), date(2023, 2, 2), 1000))
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(2, 1, date(2023, 12, 30), date(2024, 1, 2), 200))
+        self.assertAlmostEqual(150, dict(Solution.profit_per_month(2023))[2], msg='attributed to the end date')
+        self.assertAlmostEqual(0, dict(Solution.profit_per_month(2023))[12])
+        self.assertAlmostEqual(30, dict(Solution.profit_per_month(2024))[1])
+        self.assertEqual(ReturnValue.OK, Solution.customer_cancelled_reservation(1, 1, date(2023, 1, 30)))
+        self.assertAlmostEqual(0, dict(Solution.profit_per_month(2023))[2])
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(1))
+        self.assertAlmostEqual(0, dict(Solution.profit_per_month(2024))[1], msg='cascaded deletes are counted')
+        self.assertEqual(0, Solution.rebuild_profit_rollup())
+
+    # random reservations, cancellations and deletions keep the rollup equal to the aggregate of the reservations
+    def test_random_changes(self) -> None:
+        rng = random.Random(2024)
+        made = []
+        for step in range(300):
+            action = rng.random()
+            if action < 0.7 or not made:
+                start = date(2022, 1, 1) + timedelta(days=rng.randrange(3 * 365))
+                reservation = (rng.randint(1, 10), rng.randint(1, 10), start)
+                if Solution.customer_made_reservation(*reservation, start + timedelta(days=rng.randint(1, 20)),
+                                                      rng.choice([99.99, 150, 1234.5, 0.01])) == ReturnValue.OK:
+                    made.append(reservation)
+            elif action < 0.95:
+                self.assertEqual(ReturnValue.OK,
+                                 Solution.customer_cancelled_reservation(*made.pop(rng.randrange(len(made)))))
+            else:
+                customer_id = rng.randint(1, 10)
+                Solution.delete_customer(customer_id)
+                Solution.add_customer(Customer(customer_id, 'c%d' % customer_id))
+                made = [reservation for reservation in made if reservation[0] != customer_id]
+            if step % 50 == 0:
+                self.assertMatchesReservations(range(2022, 2026))
+        self.assertMatchesReservations(range(2022, 2026))
+        self.assertEqual(0, Solution.rebuild_profit_rollup())
+
+    def test_rebuild(self) -> None:
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2023, 1, 1), date(2023, 1, 5), 100))
+        with Connector.DBConnector() as conn:
+            conn.execute("DELETE FROM MonthlyRevenueTotal")
+        self.assertEqual(1, Solution.rebuild_profit_rollup())
+        self.assertAlmostEqual(15, dict(Solution.profit_per_month(2023))[1])
+        self.assertEqual(0, Solution.rebuild_profit_rollup())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
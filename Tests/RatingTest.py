@@ -0,0 +1,65 @@
+import unittest
+from datetime import date
+
+import Solution as Solution
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Owner import Owner
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.add_owners([Owner(1, 'o1'), Owner(2, 'o2')])
+        Solution.add_customers([Customer(1, 'c1'), Customer(2, 'c2')])
+        Solution.add_apartments([Apartment(1, 'a1', 'Haifa', 'Israel', 50), Apartment(2, 'a2', 'Haifa', 'Israel', 60)])
+        for customer_id in (1, 2):
+            for apartment_id in (1, 2):
+                self.assertEqual(ReturnValue.OK, Solution.customer_made_reservation(
+                    customer_id, apartment_id, date(2023, customer_id, 1), date(2023, customer_id, 5), 100))
+
+    def review(self, customer_id: int, apartment_id: int, rating: int) -> ReturnValue:
+        return Solution.customer_reviewed_apartment(customer_id, apartment_id, date(2023, 6, 1), rating, 'text')
+
+    def test_apartment_rating(self) -> None:
+        self.assertEqual(0, Solution.get_apartment_rating(1))
+        self.assertEqual(ReturnValue.OK, self.review(1, 1, 4))
+        self.assertEqual(ReturnValue.OK, self.review(2, 1, 9))
+        self.assertEqual(ReturnValue.ALREADY_EXISTS, self.review(2, 1, 9))
+        self.assertEqual(ReturnValue.BAD_PARAMS, self.review(1, 2, 11))
+        self.assertEqual(ReturnValue.BAD_PARAMS, self.review(None, 2, 5))
+        self.assertEqual(ReturnValue.BAD_PARAMS, Solution.customer_updated_review(1, None, date(2023, 7, 1), 2, 'x'))
+        self.assertAlmostEqual(6.5, Solution.get_apartment_rating(1))
+        self.assertEqual(ReturnValue.OK, Solution.customer_updated_review(2, 1, date(2023, 7, 1), 2, 'worse'))
+        self.assertAlmostEqual(3, Solution.get_apartment_rating(1))
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(1))
+        self.assertAlmostEqual(2, Solution.get_apartment_rating(1), 'reviews of a deleted customer are gone')
+        self.assertEqual(ReturnValue.BAD_PARAMS, Solution.customer_cancelled_reservation(None, 1, date(2023, 2, 1)))
+        self.assertEqual(0, Solution.rebuild_rating_aggregates())
+
+    def test_owner_rating(self) -> None:
+        self.assertEqual(ReturnValue.OK, self.review(1, 1, 4))
+        self.assertEqual(ReturnValue.OK, self.review(2, 1, 8))
+        self.assertEqual(ReturnValue.OK, self.review(1, 2, 3))
+        self.assertEqual(0, Solution.get_owner_rating(1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 1))
+        self.assertAlmostEqual(6, Solution.get_owner_rating(1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(1, 2))
+        self.assertAlmostEqual(4.5, Solution.get_owner_rating(1))
+        self.assertEqual(ReturnValue.OK, self.review(2, 2, 9))
+        self.assertAlmostEqual(6, Solution.get_owner_rating(1))
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(1))
+        self.assertAlmostEqual(6, Solution.get_owner_rating(1))
+        self.assertEqual(ReturnValue.OK, Solution.owner_drops_apartment(1, 2))
+        self.assertEqual(ReturnValue.OK, Solution.owner_owns_apartment(2, 2))
+        self.assertEqual(0, Solution.get_owner_rating(1))
+        self.assertAlmostEqual(6, Solution.get_owner_rating(2))
+        self.assertEqual(0, Solution.rebuild_rating_aggregates())
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
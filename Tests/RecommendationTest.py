@@ -0,0 +1,77 @@
+import unittest
+from datetime import date
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.add_customers([Customer(i, 'c%d' % i) for i in range(1, 5)])
+        Solution.add_apartments([Apartment(i, 'a%d' % i, 'Haifa', 'Israel', 50) for i in range(1, 5)])
+        for customer_id in range(1, 5):
+            for apartment_id in range(1, 5):
+                self.assertEqual(ReturnValue.OK, Solution.customer_made_reservation(
+                    customer_id, apartment_id, date(2023, customer_id, 1), date(2023, customer_id, 5), 100))
+
+    def review(self, customer_id: int, apartment_id: int, rating: int) -> ReturnValue:
+        return Solution.customer_reviewed_apartment(customer_id, apartment_id, date(2023, 6, 1), rating, 'text')
+
+    def recommend(self, customer_id: int):
+        recommendations = Solution.get_apartment_recommendation(customer_id)
+        conn = Connector.DBConnector()
+        try:
+            _, direct = conn.execute_prepared('get_apartment_recommendation_direct', (customer_id,))
+        finally:
+            conn.close()
+        self.assertEqual([(apartment.get_id(), round(rating, 9)) for apartment, rating in recommendations],
+                         [(row['id'], round(row['rating'], 9)) for row in direct], 'index and reviews agree')
+        return [(apartment.get_id(), rating) for apartment, rating in recommendations]
+
+    def test_recommendation(self) -> None:
+        self.assertEqual([], self.recommend(1), 'no reviews')
+        self.assertEqual(ReturnValue.OK, self.review(1, 1, 6))
+        self.assertEqual(ReturnValue.OK, self.review(2, 1, 3))
+        self.assertEqual(ReturnValue.OK, self.review(2, 2, 2))
+        self.assertEqual([(2, 4)], self.recommend(1))
+        self.assertEqual(ReturnValue.OK, self.review(3, 1, 6))
+        self.assertEqual(ReturnValue.OK, self.review(3, 2, 8))
+        self.assertEqual(ReturnValue.OK, self.review(3, 3, 9))
+        self.assertEqual([(2, 6), (3, 9)], self.recommend(1), 'approximations of the same apartment are averaged')
+        self.assertEqual(ReturnValue.OK, Solution.customer_updated_review(2, 1, date(2023, 7, 1), 6, 'better'))
+        self.assertEqual([(2, 5), (3, 9)], self.recommend(1))
+        self.assertEqual(ReturnValue.OK, Solution.delete_customer(3))
+        self.assertEqual([(2, 2)], self.recommend(1))
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(1))
+        self.assertEqual([], self.recommend(1), 'no apartment in common')
+        self.assertEqual([], self.recommend(99), 'no such customer')
+        self.assertEqual(0, Solution.rebuild_recommendation_index())
+
+    def test_outside_rating_scale(self) -> None:
+        self.assertEqual(ReturnValue.OK, self.review(1, 1, 6))
+        self.assertEqual(ReturnValue.OK, self.review(4, 1, 1))
+        self.assertEqual(ReturnValue.OK, self.review(4, 2, 5))
+        self.assertEqual([(2, 30)], self.recommend(1), 'not clamped to 10')
+        self.assertEqual(ReturnValue.OK, self.review(1, 3, 3))
+        self.assertEqual([(3, 0.5)], self.recommend(4), 'not clamped to 1')
+
+    def test_rebuild(self) -> None:
+        self.assertEqual(ReturnValue.OK, self.review(1, 1, 6))
+        self.assertEqual(ReturnValue.OK, self.review(2, 1, 3))
+        conn = Connector.DBConnector()
+        try:
+            conn.execute("DELETE FROM CustomerRatio WHERE customer_id = 1")
+        finally:
+            conn.close()
+        self.assertEqual(1, Solution.rebuild_recommendation_index())
+        self.assertEqual(0, Solution.rebuild_recommendation_index())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,82 @@
+import time
+import unittest
+from datetime import date
+
+import psycopg2
+
+import Solution as Solution
+import Utility.DBConnector as Connector
+from Utility.DBConnector import ReplicaRouter
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+
+
+class FakePool:
+    def __init__(self, name: str):
+        self.name = name
+        self.down = False
+        self.connects = 0
+
+    def getconn(self, timeout=None):
+        self.connects += 1
+        if self.down:
+            raise psycopg2.OperationalError('could not connect to ' + self.name)
+        return self.name
+
+
+class RouterTest(unittest.TestCase):
+    def test_round_robin(self) -> None:
+        router = ReplicaRouter([FakePool('a'), FakePool('b')])
+        self.assertEqual(['a', 'b', 'a', 'b'], [router.getconn()[1] for _ in range(4)])
+
+    def test_unavailable_replica_skipped(self) -> None:
+        a, b = FakePool('a'), FakePool('b')
+        router = ReplicaRouter([a, b], retry_interval=0.2)
+        a.down = True
+        self.assertEqual(['b', 'b', 'b'], [router.getconn()[1] for _ in range(3)])
+        self.assertEqual(1, a.connects, 'not tried again before retry_interval')
+        a.down = False
+        time.sleep(0.2)
+        self.assertEqual({'a', 'b'}, {router.getconn()[1] for _ in range(2)}, 'back once it can be reached')
+
+    def test_no_replica_available(self) -> None:
+        self.assertEqual((None, None), ReplicaRouter([]).getconn())
+        a = FakePool('a')
+        a.down = True
+        self.assertEqual((None, None), ReplicaRouter([a]).getconn(), 'the caller falls back to the primary')
+
+
+@unittest.skipUnless(Connector.DBConnector.replica_params(), 'no [replica...] section in database.ini')
+class Test(AbstractTest):
+    # the replicas only see committed work
+    rollback = False
+
+    def test_routing(self) -> None:
+        with Connector.DBConnector(read_only=True) as conn:
+            self.assertTrue(conn.on_replica())
+            _, result = conn.execute("SELECT pg_is_in_recovery() AS replica")
+            self.assertEqual([True], result['replica'])
+        with Connector.DBConnector() as conn:
+            self.assertFalse(conn.on_replica())
+            _, result = conn.execute("SELECT pg_is_in_recovery() AS replica")
+            self.assertEqual([False], result['replica'], 'writes go to the primary')
+
+    def test_read_your_writes(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.add_customer(Customer(1, 'c1')))
+        self.assertEqual(ReturnValue.OK, Solution.add_apartment(Apartment(1, 'a1', 'Haifa', 'Israel', 50)))
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2023, 1, 1), date(2023, 1, 3), 100))
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer(read_your_writes=True))
+        for _ in range(100):
+            Solution.RESULT_CACHE.clear()  # the answer of the primary was cached
+            if Solution.get_top_customer() == Customer(1, 'c1'):
+                break
+            time.sleep(0.05)
+        self.assertEqual(Customer(1, 'c1'), Solution.get_top_customer(), 'the replica catches up')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,60 @@
+import threading
+import unittest
+from datetime import date
+
+import Solution as Solution
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    # concurrent bookings run on connections of their own
+    rollback = False
+
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.add_customers([Customer(i, 'c%d' % i) for i in range(1, 9)])
+        Solution.add_apartment(Apartment(1, 'a1', 'Haifa', 'Israel', 50))
+
+    def test_overlap(self) -> None:
+        self.assertEqual(ReturnValue.OK, Solution.customer_made_reservation(1, 1, date(2023, 1, 5), date(2023, 1, 10), 500))
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(2, 1, date(2023, 1, 9), date(2023, 1, 12), 300))
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(2, 1, date(2023, 1, 5), date(2023, 1, 6), 100),
+                         'same start date')
+        self.assertEqual(ReturnValue.BAD_PARAMS,
+                         Solution.customer_made_reservation(99, 1, date(2023, 1, 1), date(2023, 1, 31), 100),
+                         'overlap comes before a missing customer')
+        self.assertEqual(ReturnValue.OK, Solution.customer_made_reservation(2, 1, date(2023, 1, 10), date(2023, 1, 12), 200),
+                         'check-out day is free')
+        self.assertEqual(ReturnValue.NOT_EXISTS,
+                         Solution.customer_made_reservation(99, 1, date(2023, 2, 1), date(2023, 2, 3), 100))
+        self.assertEqual(ReturnValue.OK, Solution.customer_cancelled_reservation(1, 1, date(2023, 1, 5)))
+        self.assertEqual(ReturnValue.OK, Solution.customer_made_reservation(2, 1, date(2023, 1, 8), date(2023, 1, 10), 200),
+                         'cancelled nights are free again')
+
+    def test_concurrent_bookings(self) -> None:
+        barrier = threading.Barrier(8)
+        results = {}
+
+        def book(customer_id: int):
+            barrier.wait()
+            results[customer_id] = Solution.customer_made_reservation(
+                customer_id, 1, date(2023, 3, 1), date(2023, 3, 1 + customer_id), 100 * customer_id)
+
+        threads = [threading.Thread(target=book, args=(customer_id,)) for customer_id in range(1, 9)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, list(results.values()).count(ReturnValue.OK), 'every booking starts on the same night')
+        self.assertEqual(7, list(results.values()).count(ReturnValue.BAD_PARAMS))
+
+
+# *** DO NOT RUN EACH TEST MANUALLY ***
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
@@ -0,0 +1,43 @@
+import unittest
+from datetime import date
+
+import Solution as Solution
+from Utility.ReturnValue import ReturnValue
+from Tests.AbstractTest import AbstractTest
+
+from Business.Apartment import Apartment
+from Business.Customer import Customer
+
+
+class Test(AbstractTest):
+    def setUp(self) -> None:
+        super().setUp()
+        Solution.add_customers([Customer(1, 'c1'), Customer(2, 'c2')])
+        Solution.add_apartments([Apartment(i, 'a%d' % i, 'Haifa', 'Israel', 50) for i in range(1, 4)])
+
+    def test_best_value_for_money(self) -> None:
+        self.assertEqual(Apartment.bad_apartment(), Solution.best_value_for_money(), 'nothing was reserved')
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 1, date(2023, 1, 1), date(2023, 1, 3), 200))
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(1, 2, date(2023, 1, 1), date(2023, 1, 2), 50))
+        self.assertEqual(ReturnValue.OK,
+                         Solution.customer_made_reservation(2, 2, date(2023, 2, 1), date(2023, 2, 5), 400))
+        self.assertEqual(Apartment(1, 'a1', 'Haifa', 'Israel', 50), Solution.best_value_for_money(),
+                         'no reviews, every rating is 0')
+        self.assertEqual(ReturnValue.OK, Solution.customer_reviewed_apartment(1, 1, date(2023, 6, 1), 10, 'great'))
+        self.assertEqual(ReturnValue.OK, Solution.customer_reviewed_apartment(1, 2, date(2023, 6, 1), 6, 'fine'))
+        self.assertEqual(Apartment(1, 'a1', 'Haifa', 'Israel', 50), Solution.best_value_for_money(),
+                         '10 for 100 a night is better than 6 for 75')
+        Solution.best_value_for_money().set_size(10)
+        self.assertEqual(Apartment(1, 'a1', 'Haifa', 'Israel', 50), Solution.best_value_for_money(),
+                         'the cached result is not shared with callers')
+        self.assertEqual(ReturnValue.OK, Solution.customer_updated_review(1, 2, date(2023, 6, 2), 9, 'good'))
+        self.assertEqual(Apartment(2, 'a2', 'Haifa', 'Israel', 50), Solution.best_value_for_money(),
+                         'the nightly prices 50 and 100 average to 75, whatever the length of the stays')
+        self.assertEqual(ReturnValue.OK, Solution.delete_apartment(2))
+        self.assertEqual(Apartment(1, 'a1', 'Haifa', 'Israel', 50), Solution.best_value_for_money())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2, exit=False)
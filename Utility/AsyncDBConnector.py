@@ -0,0 +1,363 @@
+import asyncio
+import collections
+import contextlib
+import time
+import weakref
+from typing import Awaitable, Callable, Optional, TypeVar, Union
+
+import psycopg2
+from psycopg2 import errors, extensions, sql
+
+from Utility.DBConnector import (_CONNECTION_ERRORS, _RETRY_TRANSACTION, RETRY_TRANSACTION_SQLSTATES, DBConnector,
+                                 PooledConnection, ResultSet, is_read_only, sqlstate_errors)
+from Utility.Exceptions import DatabaseException
+
+T = TypeVar('T')
+
+
+# waits on the event loop until the asynchronous operation in progress on the connection is done
+async def _wait(connection):
+    loop = asyncio.get_running_loop()
+    fd = connection.fileno()
+    while True:
+        state = connection.poll()
+        if state == extensions.POLL_OK:
+            return
+        ready = loop.create_future()
+
+        def wake():
+            if not ready.done():
+                ready.set_result(None)
+
+        if state == extensions.POLL_READ:
+            loop.add_reader(fd, wake)
+            try:
+                await ready
+            finally:
+                loop.remove_reader(fd)
+        elif state == extensions.POLL_WRITE:
+            loop.add_writer(fd, wake)
+            try:
+                await ready
+            finally:
+                loop.remove_writer(fd)
+        else:
+            raise DatabaseException.ConnectionInvalid("Unexpected connection state %s" % state)
+
+
+class AsyncConnectionPool:
+    """
+    A pool of asynchronous psycopg2 connections for a single event loop, the asyncio counterpart of ConnectionPool.
+
+    At least minconn and at most maxconn connections are open. Every connection runs one query at a time, so the
+    number of queries in flight is bounded by maxconn. Connections idle for longer than idle_timeout seconds are
+    closed (down to minconn).
+    """
+
+    def __init__(self, params: dict, minconn: int = 0, maxconn: int = 100, idle_timeout: float = 300.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: minconn=%d, maxconn=%d" % (minconn, maxconn))
+        self.params = params
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.__idle = collections.deque()  # (connection, time it was returned), most recently used on the right
+        self.__size = 0
+        self.__closed = False
+        self.__cond = asyncio.Condition()
+
+    async def getconn(self, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        async with self.__cond:
+            while True:
+                if self.__closed:
+                    raise DatabaseException.ConnectionInvalid("Connection pool is closed")
+                self.__evict_idle()
+                while self.__idle:
+                    connection, _ = self.__idle.pop()
+                    if not connection.closed:
+                        return connection
+                    self.__size -= 1
+                if self.__size < self.maxconn:
+                    self.__size += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise DatabaseException.ConnectionInvalid("Connection pool exhausted")
+                try:
+                    await asyncio.wait_for(self.__cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        try:
+            connection = psycopg2.connect(async_=True, connection_factory=PooledConnection, **self.params)
+            await _wait(connection)
+            return connection
+        except BaseException:
+            async with self.__cond:
+                self.__size -= 1
+                self.__cond.notify()
+            raise
+
+    # return a connection to the pool, an open transaction is rolled back. a connection whose query was
+    # interrupted (the task was cancelled) is in an unknown state and is closed
+    async def putconn(self, connection, discard: bool = False):
+        if not discard and not connection.closed:
+            try:
+                if connection.isexecuting():
+                    discard = True
+                elif connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    cursor = connection.cursor()
+                    cursor.execute("ROLLBACK")
+                    await _wait(connection)
+            except BaseException:
+                discard = True
+        async with self.__cond:
+            if discard or connection.closed or self.__closed:
+                connection.close()
+                self.__size -= 1
+            else:
+                self.__idle.append((connection, time.monotonic()))
+            self.__cond.notify()
+
+    async def closeall(self):
+        async with self.__cond:
+            self.__closed = True
+            while self.__idle:
+                self.__idle.pop()[0].close()
+                self.__size -= 1
+            self.__cond.notify_all()
+
+    def size(self) -> int:
+        return self.__size
+
+    # must be called while holding the lock
+    def __evict_idle(self):
+        now = time.monotonic()
+        while self.__idle and self.__size > self.minconn and now - self.__idle[0][1] > self.idle_timeout:
+            self.__idle.popleft()[0].close()
+            self.__size -= 1
+
+
+class AsyncDBConnector:
+    """
+    The asyncio counterpart of DBConnector, used as "async with AsyncDBConnector() as conn:".
+
+    The connection is taken from the pool of the running event loop and returned on exit. Like DBConnector, every
+    statement is committed on its own unless it runs inside "async with conn.transaction():", errors are translated
+    to DatabaseException, failed statements are retried (see __retrying) and every statement is recorded by the
+    instrumentation installed with DBConnector.instrument() (without plans, explaining a statement would block the
+    event loop). It only connects to the primary.
+    """
+
+    __pools = weakref.WeakKeyDictionary()  # event loop -> AsyncConnectionPool
+
+    def __init__(self):
+        self.connection = None
+        self.__pool = None
+        self.__depth = 0
+
+    async def __aenter__(self):
+        try:
+            self.__pool = AsyncDBConnector.pool()
+            self.connection = await self.__pool.getconn()
+        except DatabaseException.ConnectionInvalid:
+            raise
+        except Exception:
+            raise DatabaseException.ConnectionInvalid("Could not connect to database")
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
+
+    async def close(self):
+        if self.connection is not None:
+            connection, self.connection = self.connection, None
+            await self.__pool.putconn(connection)
+
+    # the connection pool of the running event loop, created on first use from database.ini
+    @staticmethod
+    def pool() -> AsyncConnectionPool:
+        loop = asyncio.get_running_loop()
+        pool = AsyncDBConnector.__pools.get(loop)
+        if pool is None:
+            pool_params = DBConnector.pool_params()
+            pool = AsyncConnectionPool(DBConnector.connection_params(),
+                                       minconn=int(pool_params.get('async_minconn', 0)),
+                                       maxconn=int(pool_params.get('async_maxconn', 100)),
+                                       idle_timeout=float(pool_params.get('idle_timeout', 300)))
+            AsyncDBConnector.__pools[loop] = pool
+        return pool
+
+    # see DBConnector.transaction
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+        if self.__depth == 0:
+            begin, commit, rollback = "BEGIN", "COMMIT", "ROLLBACK"
+        else:
+            savepoint = sql.Identifier("savepoint_%d" % self.__depth)
+            begin = sql.SQL("SAVEPOINT {}").format(savepoint)
+            commit = sql.SQL("RELEASE SAVEPOINT {}").format(savepoint)
+            rollback = sql.SQL("ROLLBACK TO SAVEPOINT {0}; RELEASE SAVEPOINT {0}").format(savepoint)
+        await self.__run(begin)
+        self.__depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.__depth -= 1
+            # the server rolls back the transaction of a lost connection itself
+            if not self.__lost():
+                await self.__run(rollback)
+            raise
+        self.__depth -= 1
+        try:
+            await self.__run(commit)
+        except _CONNECTION_ERRORS:
+            # the transaction may or may not have been committed, so it is not run again
+            if self.__depth == 0 and self.__lost():
+                raise DatabaseException.ConnectionInvalid("Could not commit changes")
+            raise
+
+    # see DBConnector.execute. outside of a transaction() block the connection is in autocommit mode, so a statement
+    # that lost its connection may have been committed: it is only run again if idempotent, None to decide by the
+    # query (reads are idempotent)
+    async def execute(self, query: Union[str, sql.Composed], printSchema=False,
+                      idempotent: Optional[bool] = None) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        if idempotent is None:
+            idempotent = is_read_only(query if isinstance(query, str) else query.as_string(self.connection))
+        return await self.__retrying(lambda: self.__execute(query, printSchema), idempotent)
+
+    # a single attempt of execute, name is the fingerprint the statement is recorded with instead of its query
+    async def __execute(self, query: Union[str, sql.Composed], printSchema=False,
+                        name: Optional[str] = None) -> (int, ResultSet):
+        instrumentation = DBConnector.instrumentation
+        if instrumentation is not None:
+            began = time.perf_counter()
+
+        cursor = await self.__run(query)
+        row_effected = max(cursor.rowcount, 0)
+        if cursor.description is not None:
+            entries = ResultSet(cursor.description, cursor.fetchall())
+        else:
+            entries = ResultSet()
+        described = cursor.description is not None
+        cursor.close()
+
+        if instrumentation is not None:
+            instrumentation.record(self, query, time.perf_counter() - began,
+                                   entries.size() if described else row_effected, name, explain=False)
+
+        if printSchema:
+            print(entries)
+
+        return row_effected, entries
+
+    # see DBConnector.execute_many, the queries run one at a time in a transaction() block
+    async def execute_many(self, queries: list, printSchema=False) -> list:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        if not queries:
+            return []
+
+        async def attempt():
+            async with self.transaction():
+                return [await self.execute(query, printSchema) for query in queries]
+
+        # a transaction that lost its connection before committing was rolled back, see transaction
+        return await (attempt() if self.__depth > 0 else self.__retrying(attempt, idempotent=True))
+
+    # see DBConnector.execute_prepared, the prepared statements of a connection are shared by both connectors
+    async def execute_prepared(self, name: str, params: tuple = (), printSchema=False) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+        query = DBConnector.statement(name)
+        text = query if isinstance(query, str) else query.as_string(self.connection)
+        return await self.__retrying(lambda: self.__execute_prepared(name, text, params, printSchema),
+                                     DBConnector.statement_idempotent(name, text))
+
+    # a single attempt of execute_prepared, on the connection of the moment
+    async def __execute_prepared(self, name: str, text: str, params: tuple, printSchema: bool) -> (int, ResultSet):
+        for attempt in range(2):
+            server_name = await self.__prepared_name(text)
+            execute = sql.SQL("EXECUTE {}").format(sql.Identifier(server_name))
+            if params:
+                execute = sql.SQL("{}({})").format(execute, sql.SQL(', ').join(map(sql.Literal, params)))
+            try:
+                return await self.__execute(execute, printSchema, name)
+            except (errors.lookup("26000"), errors.lookup("0A000")):
+                self.connection.prepared.pop(text, None)
+                if attempt == 1 or self.__depth > 0:
+                    raise
+                await self.__deallocate(server_name)
+
+    # see DBConnector.__retrying: outside of a transaction() block attempt() is run again after a backoff when it
+    # was aborted by a serialization failure or a deadlock, or on a new connection when the connection was lost and
+    # it is idempotent
+    async def __retrying(self, attempt: Callable[[], Awaitable[T]], idempotent: bool) -> T:
+        retries = 0
+        while True:
+            try:
+                return await attempt()
+            except _RETRY_TRANSACTION as e:
+                if self.__depth > 0 or self.__lost():
+                    raise
+                delay = DBConnector.retry_delay(RETRY_TRANSACTION_SQLSTATES[e.pgcode], retries)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            except _CONNECTION_ERRORS as e:
+                if self.__depth > 0 or not self.__lost():
+                    raise
+                if not idempotent:
+                    raise DatabaseException.ConnectionInvalid("Could not commit changes") from e
+                delay = DBConnector.retry_delay('connection_lost', retries)
+                if delay is None:
+                    raise DatabaseException.ConnectionInvalid("Connection lost") from e
+                await asyncio.sleep(delay)
+                await self.__reconnect()
+            retries += 1
+
+    # has the connection to the server been lost?
+    def __lost(self) -> bool:
+        return self.connection is None or self.connection.closed != 0
+
+    async def __reconnect(self):
+        connection, self.connection = self.connection, None
+        await self.__pool.putconn(connection, discard=True)
+        self.connection = await self.__pool.getconn()
+
+    async def __prepared_name(self, text: str) -> str:
+        prepared = self.connection.prepared
+        server_name = prepared.get(text)
+        if server_name is not None:
+            prepared.move_to_end(text)
+            return server_name
+
+        while len(prepared) >= DBConnector.prepared_cache_size:
+            _, evicted = prepared.popitem(last=False)
+            await self.__deallocate(evicted)
+        self.connection.prepared_count += 1
+        server_name = "prepared_%d" % self.connection.prepared_count
+        (await self.__run(sql.SQL("PREPARE {} AS ").format(sql.Identifier(server_name)) + sql.SQL(text))).close()
+        prepared[text] = server_name
+        return server_name
+
+    async def __deallocate(self, server_name: str):
+        try:
+            (await self.__run(sql.SQL("DEALLOCATE {}").format(sql.Identifier(server_name)))).close()
+        except Exception:
+            pass
+
+    # sends the query and waits for it without blocking the event loop, returns the cursor holding the results
+    async def __run(self, query: Union[str, sql.Composed]):
+        cursor = self.connection.cursor()
+        with sqlstate_errors():
+            cursor.execute(query)
+            await _wait(self.connection)
+        return cursor
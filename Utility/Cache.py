@@ -0,0 +1,260 @@
+import collections
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+
+class LRUCache:
+    """
+    A thread-safe mapping of at most maxsize entries, each expiring ttl seconds after it was stored (never if ttl
+    is None). When full, the least recently used entry is evicted.
+
+    get_or_load is a read-through lookup: on a miss the value is loaded and stored, unless an invalidation happened
+    while it was loading, in which case the loaded value may already be stale and is returned without being stored.
+    get_or_load_many does the same for many keys, loading all the keys that missed at once.
+    """
+
+    __MISSING = object()
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        if maxsize < 1:
+            raise ValueError("Invalid cache size: %d" % maxsize)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.__entries = collections.OrderedDict()  # key -> (value, expiry time), least recently used first
+        self.__lock = threading.Lock()
+        self.__invalidations = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default=None):
+        with self.__lock:
+            value = self.__lookup(key)
+        return default if value is LRUCache.__MISSING else value
+
+    def put(self, key: Hashable, value):
+        with self.__lock:
+            self.__store(key, value)
+
+    def get_or_load(self, key: Hashable, load: Callable[[], object]):
+        with self.__lock:
+            value = self.__lookup(key)
+            invalidations = self.__invalidations
+        if value is not LRUCache.__MISSING:
+            return value
+        value = load()
+        with self.__lock:
+            if invalidations == self.__invalidations:
+                self.__store(key, value)
+        return value
+
+    # get_or_load for a coroutine function load
+    async def get_or_load_async(self, key: Hashable, load: Callable[[], Awaitable]):
+        with self.__lock:
+            value = self.__lookup(key)
+            invalidations = self.__invalidations
+        if value is not LRUCache.__MISSING:
+            return value
+        value = await load()
+        with self.__lock:
+            if invalidations == self.__invalidations:
+                self.__store(key, value)
+        return value
+
+    # get_or_load for many keys: load_many is called once with the keys that missed (in order, without duplicates)
+    # and returns a dict of their values. returns the values of keys in order
+    def get_or_load_many(self, keys: Iterable[Hashable], load_many: Callable[[list], Dict]) -> List:
+        keys = list(keys)
+        values, missing, invalidations = self.__lookup_many(keys)
+        if missing:
+            self.__store_many(keys, values, load_many(missing), invalidations)
+        return values
+
+    # get_or_load_many for a coroutine function load_many
+    async def get_or_load_many_async(self, keys: Iterable[Hashable], load_many: Callable[[list], Awaitable]) -> List:
+        keys = list(keys)
+        values, missing, invalidations = self.__lookup_many(keys)
+        if missing:
+            self.__store_many(keys, values, await load_many(missing), invalidations)
+        return values
+
+    # drop the given keys, a load that is in progress will not store its result
+    def invalidate(self, *keys: Hashable):
+        with self.__lock:
+            self.__invalidations += 1
+            for key in keys:
+                self.__entries.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__invalidations += 1
+            self.__entries.clear()
+
+    def stats(self) -> dict:
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self.__entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+    # must be called while holding the lock
+    def __lookup(self, key):
+        entry = self.__entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return LRUCache.__MISSING
+        value, expiry = entry
+        if expiry is not None and expiry <= time.monotonic():
+            del self.__entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return LRUCache.__MISSING
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    # the cached values of keys (__MISSING for misses), the keys that missed and the invalidation count
+    def __lookup_many(self, keys: list):
+        with self.__lock:
+            values = [self.__lookup(key) for key in keys]
+            invalidations = self.__invalidations
+        missing = list(dict.fromkeys(key for key, value in zip(keys, values) if value is LRUCache.__MISSING))
+        return values, missing, invalidations
+
+    # fills the misses in values with the loaded ones, and stores those unless an invalidation happened meanwhile
+    def __store_many(self, keys: list, values: list, loaded: Dict, invalidations: int):
+        for i, (key, value) in enumerate(zip(keys, values)):
+            if value is LRUCache.__MISSING:
+                values[i] = loaded[key]
+        with self.__lock:
+            if invalidations == self.__invalidations:
+                for key, value in loaded.items():
+                    self.__store(key, value)
+
+    # must be called while holding the lock
+    def __store(self, key, value):
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        self.__entries[key] = (value, expiry)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+
+class ResultCache:
+    """
+    Caches the results of functions reading database tables, keyed by function name and arguments. Every table has a
+    version, which the writers of the table bump once their write is committed. A result is stored with the versions
+    of the tables it is computed from, taken before it was loaded, and is served while none of them changed: a load
+    that ran across a write is stored with the versions from before it and never served.
+
+    Only the writes of this process are seen, ttl bounds how long a result is served after a write made elsewhere.
+    stats gives the hits and misses of every function.
+
+    A result read from a replica is only stored once the replica is known to have applied the writes of the tables it
+    is computed from: the loader asks unreplicated() which writes it has to check for, reports them with replicated()
+    if the replica has them, and returns its result wrapped in ResultCache.Uncached if it does not.
+    """
+
+    __MISSING = object()
+
+    class Uncached:
+        # a result returned by a load that is passed on to the caller but not stored
+        __slots__ = ('result',)
+
+        def __init__(self, result):
+            self.result = result
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.__results = LRUCache(maxsize, ttl)  # (function, args) -> (versions, result)
+        self.__versions = collections.Counter()  # table (lower case, as in SQL) -> version
+        self.__epoch = 0  # bumped by clear, changes every version at once
+        self.__replicated = collections.Counter()  # table -> the version the replicas are known to have applied
+        self.__replicated_epoch = 0
+        self.__lock = threading.Lock()
+        self.__calls = collections.defaultdict(lambda: [0, 0])  # function -> [hits, misses]
+
+    # marks the tables as changed, the results computed from them are no longer served
+    def bump(self, *tables: str):
+        with self.__lock:
+            self.__versions.update(table.lower() for table in tables)
+
+    def version(self, table: str) -> int:
+        with self.__lock:
+            return self.__versions[table.lower()]
+
+    # the current versions of those of tables written since the replicas were last known to have applied their writes
+    # (all of them after a clear), to pass to replicated() once they are. None if there are none
+    def unreplicated(self, tables: Iterable[str]) -> Optional[tuple]:
+        with self.__lock:
+            if self.__epoch != self.__replicated_epoch:
+                written = {table.lower(): self.__versions[table.lower()] for table in tables}
+            else:
+                written = {table.lower(): self.__versions[table.lower()] for table in tables
+                           if self.__versions[table.lower()] > self.__replicated[table.lower()]}
+            return (self.__epoch, written) if written or self.__epoch != self.__replicated_epoch else None
+
+    # the replicas have applied the writes up to the versions returned by unreplicated()
+    def replicated(self, versions: tuple):
+        epoch, written = versions
+        with self.__lock:
+            if epoch < self.__replicated_epoch:
+                return
+            if epoch > self.__replicated_epoch:
+                self.__replicated_epoch = epoch
+                self.__replicated.clear()
+            for table, version in written.items():
+                self.__replicated[table] = max(self.__replicated[table], version)
+
+    # the cached result of function(*args) if none of tables changed since it was loaded, else the result of load,
+    # which is stored unless it is Uncached. refresh skips the lookup, the result of load replaces the cached one
+    def get_or_load(self, function: str, args: tuple, tables: Iterable[str], load: Callable[[], object],
+                    refresh: bool = False):
+        key, versions, result = self.__lookup(function, args, tables, refresh)
+        if result is ResultCache.__MISSING:
+            result = load()
+            if isinstance(result, ResultCache.Uncached):
+                return result.result
+            self.__results.put(key, (versions, result))
+        return result
+
+    # get_or_load for a coroutine function load
+    async def get_or_load_async(self, function: str, args: tuple, tables: Iterable[str],
+                                load: Callable[[], Awaitable], refresh: bool = False):
+        key, versions, result = self.__lookup(function, args, tables, refresh)
+        if result is ResultCache.__MISSING:
+            result = await load()
+            if isinstance(result, ResultCache.Uncached):
+                return result.result
+            self.__results.put(key, (versions, result))
+        return result
+
+    def clear(self):
+        with self.__lock:
+            self.__epoch += 1
+        self.__results.clear()
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {function: {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+                    for function, (hits, misses) in self.__calls.items()}
+
+    def __len__(self):
+        return len(self.__results)
+
+    # the key of the result, the current versions of tables and the result if it is still valid (else __MISSING)
+    def __lookup(self, function: str, args: tuple, tables: Iterable[str], refresh: bool):
+        key = (function, args)
+        with self.__lock:
+            versions = (self.__epoch,) + tuple(self.__versions[table.lower()] for table in tables)
+        entry = None if refresh else self.__results.get(key)
+        result = entry[1] if entry is not None and entry[0] == versions else ResultCache.__MISSING
+        with self.__lock:
+            self.__calls[function][result is ResultCache.__MISSING] += 1
+        return key, versions, result
@@ -1,9 +1,57 @@
 import psycopg2
-from psycopg2 import errors, sql
+from psycopg2 import errors, extensions, extras, sql
 from configparser import ConfigParser
 from Utility.Exceptions import DatabaseException
+import atexit
+import collections
+import contextlib
+import functools
+import itertools
+import operator
 import os
-from typing import Union
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional, TypeVar, Union
+
+T = TypeVar('T')
+
+# the SQLSTATEs of a transaction that was aborted only because of concurrent ones, so it can succeed when run again,
+# with the error class they are counted under by DBConnector.retries()
+RETRY_TRANSACTION_SQLSTATES = {"40001": 'serialization_failure', "40P01": 'deadlock_detected'}
+_RETRY_TRANSACTION = tuple(errors.lookup(sqlstate) for sqlstate in RETRY_TRANSACTION_SQLSTATES)
+_CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+_READ_ONLY = re.compile(r"\s*(select|values|show|table)\b", re.IGNORECASE)
+_WITH = re.compile(r"\s*with\b", re.IGNORECASE)
+_WRITE = re.compile(r"\b(insert|update|delete|merge)\b", re.IGNORECASE)
+
+
+# translates the SQLSTATE of errors raised inside the block to DatabaseException
+@contextlib.contextmanager
+def sqlstate_errors():
+    try:
+        yield
+    except errors.lookup("23502"):
+        raise DatabaseException.NOT_NULL_VIOLATION("NOT_NULL_VIOLATION")
+    except errors.lookup("23503"):
+        raise DatabaseException.FOREIGN_KEY_VIOLATION("FOREIGN_KEY_VIOLATION")
+    except errors.lookup("23505"):
+        raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
+    except errors.lookup("23514"):
+        raise DatabaseException.CHECK_VIOLATION("CHECK_VIOLATION")
+    except errors.lookup("23P01"):
+        raise DatabaseException.EXCLUSION_VIOLATION("EXCLUSION_VIOLATION")
+
+
+# does the query only read? a read has the same effect however often it runs. a SELECT calling a function that
+# writes is not told apart, such a query must be executed with idempotent=False
+@functools.lru_cache(maxsize=4096)
+def is_read_only(query: str) -> bool:
+    if _WITH.match(query):
+        return not _WRITE.search(query)
+    return _READ_ONLY.match(query) is not None
 
 
 class ResultSetDict(dict):
@@ -13,17 +61,93 @@ class ResultSetDict(dict):
         return super().__getitem__(item.lower())
 
 
+class ResultSetRow:
+    """
+    A row of a ResultSet, backed by the row tuple returned by the database.
+
+    Behaves like ResultSetDict (row['col'], case insensitive, None for non-string keys) but all rows of a
+    ResultSet share one _Columns index, so a row costs a single small object instead of a dict.
+    """
+    __slots__ = ('values', '__columns')
+
+    def __init__(self, values: tuple, columns: '_Columns'):
+        self.values = values
+        self.__columns = columns
+
+    def __getitem__(self, item):
+        try:
+            return self.values[self.__columns.index[item]]
+        except KeyError:
+            if type(item) is not str:
+                return None
+            return self.values[self.__columns.index[item.lower()]]
+        except TypeError:
+            return None
+
+    def get(self, item, default=None):
+        try:
+            return self[item]
+        except KeyError:
+            return default
+
+    def __contains__(self, item):
+        return type(item) is str and (item in self.__columns.index or item.lower() in self.__columns.index)
+
+    def keys(self):
+        return self.__columns.header
+
+    def items(self):
+        return list(zip(self.__columns.header, self.values))
+
+    def __iter__(self):
+        return iter(self.__columns.header)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __eq__(self, other):
+        if isinstance(other, (ResultSetRow, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class _Columns:
+    # the column names of a result and a map from every name, and its lower case form, to its index in the rows
+    __slots__ = ('header', 'index')
+
+    def __init__(self, header: list):
+        self.header = header
+        self.index = {}
+        for i, col in reversed(list(enumerate(header))):
+            self.index[col] = i
+            self.index.setdefault(col.lower(), i)
+
+    # index of the column, case insensitive, KeyError if there is no such column
+    def position(self, col: str) -> int:
+        try:
+            return self.index[col]
+        except KeyError:
+            return self.index[col.lower()]
+
+
 class ResultSet:
     # constructor
     def __init__(self, description=None, results=None):
         self.rows = []
         self.cols_header = []
         self.cols = ResultSetDict()
+        self.__columns = _Columns([])
         self.__fromQuery(description, results)
 
+    # rs[i] is the i-th row, rs['col'] is the whole column as a list (empty, whatever the column, if there are no rows)
     def __getitem__(self, idx):
         if type(idx) == str:
-            return [x[self.cols[idx]] for x in self.rows]
+            if not self.rows:
+                return []
+            return list(map(operator.itemgetter(self.__columns.position(idx)), self.rows))
         return self.__getRow(idx)
 
     # so you can use print(ResultSet)
@@ -39,8 +163,15 @@ class ResultSet:
         return string
 
     def __iter__(self):
-        for row in range(len(self.rows)):
-            yield self.__getRow(row)
+        columns = self.__columns
+        for values in self.rows:
+            yield ResultSetRow(values, columns)
+
+    # all columns at once, as a dict from column name to a tuple of its values
+    def columns(self) -> dict:
+        if not self.rows:
+            return {col: () for col in self.cols_header}
+        return dict(zip(self.cols_header, zip(*self.rows)))
 
     # what is the size of the ResultSet?
     def size(self):
@@ -54,51 +185,569 @@ class ResultSet:
         if len(self.rows) <= row:
             print('Invalid row ' + str(row))
             return ResultSetDict()
-        row_to_return = ResultSetDict()
-        for val, col in zip(self.rows[row], self.cols_header):
-            row_to_return[col] = val
-        return row_to_return
+        return ResultSetRow(self.rows[row], self.__columns)
 
     def __fromQuery(self, description, results: list):
         if results is None or len(results) == 0:  # no results
             self.cols = ResultSetDict()
         else:
-            self.rows = results.copy()
+            self.rows = results
             self.cols_header = [d.name for d in description]
             self.cols = ResultSetDict()
             for col, index in zip(self.cols_header, range(len(results[0]))):
                 self.cols[col] = index
+            self.__columns = _Columns(self.cols_header)
 
 
-class DBConnector:
-    # constructor
-    def __init__(self):
+class StreamingResultSet:
+    """
+    A single-pass ResultSet over a server-side cursor, returned by DBConnector.execute_stream.
+
+    Rows are fetched from the server itersize at a time while iterating, so only one batch is held in memory no
+    matter how large the result is. The cursor is closed once iteration is done or close() is called.
+    """
+
+    def __init__(self, cursor, rows):
+        self.cols_header = []
+        self.rows_fetched = 0
+        self.__cursor = cursor
+        self.__rows = rows
+
+    def __iter__(self):
+        columns = None
+        for row in self.__rows:
+            if columns is None:
+                self.cols_header = [d.name for d in self.__cursor.description]
+                columns = _Columns(self.cols_header)
+            self.rows_fetched += 1
+            yield ResultSetRow(row, columns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    # stop iterating and close the server-side cursor
+    def close(self):
+        self.__rows.close()
+        if not self.__cursor.closed:
+            try:
+                self.__cursor.close()
+            except Exception:
+                pass
+
+
+class _CountingCursor(extensions.cursor):
+    # a cursor that counts the round trips of its statements on its PooledConnection
+    def execute(self, query, vars=None):
+        self.connection.count_statement()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        for _ in vars_list:
+            self.connection.count_statement()
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        self.connection.count_statement()
+        return super().copy_expert(sql, file, size)
+
+
+class PooledConnection(extensions.connection):
+    # a psycopg2 connection that remembers the statements prepared on it, see DBConnector.execute_prepared, and
+    # counts its round trips to the server
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = collections.OrderedDict()  # statement text -> server-side name, least recently used first
+        self.prepared_count = 0
+        self.round_trips = 0
+        self.cursor_factory = _CountingCursor
+        self.savepoint = None  # while pinned (see DBConnector.pin), the savepoint that commits and rollbacks end
+        self.pending = False  # were statements executed since the last commit or rollback?
+
+    # psycopg2 sends a separate BEGIN before the first statement of a transaction
+    def count_statement(self):
+        self.pending = True
+        if not self.async_ and not self.autocommit and self.status == extensions.STATUS_READY:
+            self.round_trips += 2
+        else:
+            self.round_trips += 1
+
+    def commit(self):
+        if self.savepoint is not None:
+            return self.__end_savepoint("RELEASE SAVEPOINT {0}; SAVEPOINT {0}")
+        if self.status == extensions.STATUS_BEGIN:
+            self.round_trips += 1
+        self.pending = False
+        super().commit()
+
+    def rollback(self):
+        if self.savepoint is not None:
+            return self.__end_savepoint("ROLLBACK TO SAVEPOINT {0}")
+        if self.status == extensions.STATUS_BEGIN:
+            self.round_trips += 1
+        self.pending = False
+        super().rollback()
+
+    # a pinned connection stays in its transaction, only the work since its savepoint is committed or rolled back
+    def __end_savepoint(self, query: str):
+        with self.cursor(cursor_factory=extensions.cursor) as cursor:
+            cursor.execute(sql.SQL(query).format(sql.Identifier(self.savepoint)))
+        self.round_trips += 1
+        self.pending = False
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of psycopg2 connections.
+
+    At least minconn connections are kept open and at most maxconn are open at any time. Connections that have
+    been idle for longer than idle_timeout seconds are closed (down to minconn). On checkout a connection is
+    checked for health: a closed or broken connection is discarded, and one that has been idle for longer than
+    health_check_interval seconds, or since suspect() was last called, is pinged with a trivial query before it is
+    handed out.
+    """
+
+    def __init__(self, params: dict, minconn: int = 1, maxconn: int = 10, idle_timeout: float = 300.0,
+                 health_check_interval: float = 30.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: minconn=%d, maxconn=%d" % (minconn, maxconn))
+        self.params = params
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.__idle = collections.deque()  # (connection, time it was returned), most recently used on the right
+        self.__size = 0  # open connections, idle or checked out
+        self.__closed = False
+        self.__suspect_before = float('-inf')  # connections returned before this time are pinged on checkout
+        self.__cond = threading.Condition()
+        for _ in range(minconn):
+            self.__idle.append((self.__connect(), time.monotonic()))
+            self.__size += 1
+
+    # take a connection from the pool, blocking up to timeout seconds (forever if None) while the pool is exhausted
+    def getconn(self, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__cond:
+            while True:
+                if self.__closed:
+                    raise DatabaseException.ConnectionInvalid("Connection pool is closed")
+                self.__evict_idle()
+                while self.__idle:
+                    connection, last_used = self.__idle.pop()
+                    if self.__healthy(connection, last_used):
+                        return connection
+                    self.__discard(connection)
+                if self.__size < self.maxconn:
+                    self.__size += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise DatabaseException.ConnectionInvalid("Connection pool exhausted")
+                self.__cond.wait(remaining)
+        # open the new connection outside the lock, the slot was already reserved above
         try:
-            # Obtain the configuration parameters
-            params = DBConnector.__config()
-            self.connection = psycopg2.connect(**params)
-            self.connection.autocommit = False
-            self.cursor = self.connection.cursor()
-        except Exception as e:
-            self.connection = None
-            self.cursor = None
-            raise DatabaseException.ConnectionInvalid("Could not connect to database")
+            return self.__connect()
+        except Exception:
+            with self.__cond:
+                self.__size -= 1
+                self.__cond.notify()
+            raise
+
+    # return a connection to the pool, any uncommitted work is rolled back
+    def putconn(self, connection, discard: bool = False):
+        if not discard and not connection.closed:
+            try:
+                if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except Exception:
+                discard = True
+        with self.__cond:
+            if discard or connection.closed or self.__closed:
+                self.__discard(connection)
+            else:
+                self.__idle.append((connection, time.monotonic()))
+            self.__cond.notify()
+
+    # close every idle connection, connections still checked out are closed when they are returned
+    def closeall(self):
+        with self.__cond:
+            self.__closed = True
+            while self.__idle:
+                self.__discard(self.__idle.pop()[0])
+            self.__cond.notify_all()
+
+    @contextlib.contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        connection = self.getconn(timeout)
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+    # the idle connections are pinged before they are handed out again. called when a connection turned out to be
+    # broken, as the others may be too (the server restarted)
+    def suspect(self):
+        with self.__cond:
+            self.__suspect_before = time.monotonic()
+
+    # number of open connections, idle or checked out
+    def size(self) -> int:
+        with self.__cond:
+            return self.__size
+
+    def __connect(self):
+        connection = psycopg2.connect(connection_factory=PooledConnection, **self.params)
+        connection.autocommit = False
+        return connection
+
+    def __healthy(self, connection, last_used: float) -> bool:
+        if connection.closed or connection.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval and last_used > self.__suspect_before:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    # must be called while holding the lock
+    def __evict_idle(self):
+        now = time.monotonic()
+        # the least recently used connections are on the left
+        while self.__idle and self.__size > self.minconn and now - self.__idle[0][1] > self.idle_timeout:
+            self.__discard(self.__idle.popleft()[0])
+
+    # must be called while holding the lock
+    def __discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self.__size -= 1
+
+
+class ReplicaRouter:
+    """
+    Hands out connections to replicas of the database, taking the pools in turns (round-robin).
 
-    # close connection
+    A replica that cannot be connected to is skipped for retry_interval seconds, the pools check the health of the
+    connections they hand out. getconn returns (None, None) when no replica is available, and the caller falls back
+    to the primary.
+    """
+
+    def __init__(self, pools: list, retry_interval: float = 30.0):
+        self.pools = pools
+        self.retry_interval = retry_interval
+        self.__turns = itertools.count()
+        self.__down_until = [float('-inf')] * len(pools)  # monotonic time until which a replica is skipped
+
+    # (pool, connection) of the next available replica, blocking up to timeout seconds while its pool is exhausted
+    def getconn(self, timeout: Optional[float] = None):
+        for _ in range(len(self.pools)):
+            index = next(self.__turns) % len(self.pools)
+            if self.__down_until[index] > time.monotonic():
+                continue
+            pool = self.pools[index]
+            try:
+                return pool, pool.getconn(timeout)
+            except psycopg2.OperationalError:
+                self.__down_until[index] = time.monotonic() + self.retry_interval
+        return None, None
+
+    def closeall(self):
+        for pool in self.pools:
+            pool.closeall()
+
+
+class DBConnector:
+    __pool = None
+    __replicas = None
+    __pinned = None  # (pool, connection) used by every DBConnector while pinned, see pin()
+    __overrides = {}  # connection parameters replacing those of database.ini, see override_params()
+    __pool_lock = threading.Lock()
+    __statements = {}  # name -> statement registered with define_statement
+    __round_trips = 0  # round trips of all the closed DBConnectors
+    __round_trips_lock = threading.Lock()
+    __idempotent = set()  # names of the statements registered as idempotent
+    __retries = collections.Counter()  # error class -> retries, see retries()
+    __gave_up = collections.Counter()  # error class -> statements and transactions that failed after retry_attempts
+    __retries_lock = threading.Lock()
+    prepared_cache_size = 64  # statements kept prepared on each connection
+    retry_attempts = 5  # attempts of a statement, transaction or connect that keeps failing for a retryable reason
+    retry_base_delay = 0.05  # seconds of backoff before the first retry, doubled for every further one
+    retry_max_delay = 2.0  # seconds of backoff at most
+    instrumentation = None  # the Instrumentation recording every statement, see instrument()
+
+    # constructor, the connection is taken from the process-wide pool. a read_only connector is connected to one of
+    # the replicas of database.ini if there are any available, which may lag behind the primary
+    def __init__(self, read_only: bool = False):
+        self.__streams = 0  # number of server-side cursors opened, used to name them
+        self.__depth = 0  # nesting level of transaction() blocks, statements are not committed while it is > 0
+        self.__read_only = read_only
+        self.connection = None
+        self.cursor = None
+        self.__connect()
+
+    # takes a connection from the pool, retrying with backoff while the server cannot be reached
+    def __connect(self):
+        retries = 0
+        while True:
+            try:
+                if DBConnector.__pinned is not None:
+                    self.__from_pool, self.connection = DBConnector.__pinned
+                    self.__on_replica = False
+                    break
+                if self.__read_only:
+                    self.__from_pool, self.connection = DBConnector.replicas().getconn()
+                self.__on_replica = self.connection is not None
+                if self.connection is None:
+                    self.__from_pool = DBConnector.pool()
+                    self.connection = self.__from_pool.getconn()
+                break
+            except psycopg2.OperationalError:
+                if not DBConnector.__backoff('connect_failed', retries):
+                    raise DatabaseException.ConnectionInvalid("Could not connect to database")
+            except Exception:
+                raise DatabaseException.ConnectionInvalid("Could not connect to database")
+            retries += 1
+        self.__first_round_trip = self.connection.round_trips
+        self.cursor = self.connection.cursor()
+
+    # so you can use "with DBConnector() as conn:"
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    # close connection, the underlying connection is returned to the pool
     def close(self):
         if self.cursor is not None:
             self.cursor.close()
+            self.cursor = None
         if self.connection is not None:
-            self.connection.close()
+            self.__return_connection()
+
+    # returns the connection to the pool (a broken one is closed there) and adds up its round trips. the pinned
+    # connection stays open, only the work that was not committed is rolled back, as the pool would
+    def __return_connection(self):
+        with DBConnector.__round_trips_lock:
+            DBConnector.__round_trips += self.connection.round_trips - self.__first_round_trip
+        if self.connection.savepoint is None:
+            self.__from_pool.putconn(self.connection)
+        elif self.connection.pending and not self.connection.closed:
+            self.connection.rollback()
+        self.connection = None
+
+    # replaces the lost connection with a new one, the statements prepared on it are prepared again when used
+    def __reconnect(self):
+        self.__from_pool.suspect()
+        self.cursor = None
+        self.__return_connection()
+        self.__connect()
+
+    # has the connection to the server been lost?
+    def __lost(self) -> bool:
+        return self.connection is None or self.connection.closed != 0
+
+    # the number of round trips to the server made by all the DBConnectors closed so far
+    @staticmethod
+    def round_trips() -> int:
+        return DBConnector.__round_trips
+
+    # the retries made by all DBConnectors so far and the statements and transactions that failed after
+    # retry_attempts attempts, per error class: connect_failed, connection_lost and the values of
+    # RETRY_TRANSACTION_SQLSTATES. {error class: {'retries': n, 'gave_up': n}}
+    @staticmethod
+    def retries() -> dict:
+        with DBConnector.__retries_lock:
+            return {error_class: {'retries': DBConnector.__retries[error_class],
+                                  'gave_up': DBConnector.__gave_up[error_class]}
+                    for error_class in DBConnector.__retries.keys() | DBConnector.__gave_up.keys()}
+
+    # counts a failed attempt, and unless it was the last one returns how long to wait before the next: a random
+    # time of up to retry_base_delay * 2 ** retries seconds (at most retry_max_delay), so clients that failed together
+    # do not all retry together. None if not to retry. AsyncDBConnector backs off with it too
+    @staticmethod
+    def retry_delay(error_class: str, retries: int) -> Optional[float]:
+        with DBConnector.__retries_lock:
+            if retries + 1 >= DBConnector.retry_attempts:
+                DBConnector.__gave_up[error_class] += 1
+                return None
+            DBConnector.__retries[error_class] += 1
+        return random.uniform(0, min(DBConnector.retry_max_delay, DBConnector.retry_base_delay * 2 ** retries))
+
+    # waits as retry_delay says, returns whether to retry
+    @staticmethod
+    def __backoff(error_class: str, retries: int) -> bool:
+        delay = DBConnector.retry_delay(error_class, retries)
+        if delay is None:
+            return False
+        time.sleep(delay)
+        return True
+
+    # runs attempt() until it succeeds. outside of a transaction() block the work of a failed attempt is rolled back
+    # by the server, so it is run again after a backoff when it was aborted by a serialization failure or a deadlock,
+    # or on a new connection when the connection was lost. inside a block the whole transaction has to run again,
+    # which run_transaction does. an error that is not retried leaves the connection usable outside of a block
+    def __retrying(self, attempt: Callable[[], T]) -> T:
+        retries = 0
+        while True:
+            try:
+                return attempt()
+            except _RETRY_TRANSACTION as e:
+                if self.__depth > 0 or self.__lost() or \
+                        not DBConnector.__backoff(RETRY_TRANSACTION_SQLSTATES[e.pgcode], retries):
+                    self.__abort_statement()
+                    raise
+                self.connection.rollback()
+            except _CONNECTION_ERRORS as e:
+                if self.__depth > 0 or not self.__lost():
+                    self.__abort_statement()
+                    raise
+                if not DBConnector.__backoff('connection_lost', retries):
+                    raise DatabaseException.ConnectionInvalid("Connection lost") from e
+                self.__reconnect()
+            except BaseException:
+                self.__abort_statement()
+                raise
+            retries += 1
+
+    # rolls back the transaction a failed statement aborted, so the next statement does not fail with
+    # InFailedSqlTransaction. inside a transaction() block the block rolls back itself
+    def __abort_statement(self):
+        if self.__depth == 0 and not self.__lost():
+            try:
+                self.connection.rollback()
+            except Exception:
+                pass  # the error being raised says more than a failed rollback
+
+    # record every statement executed from now on with the given Utility.Instrumentation.Instrumentation, None stops
+    # recording. when nothing is recorded executing a statement costs one attribute lookup more
+    @staticmethod
+    def instrument(instrumentation):
+        DBConnector.instrumentation = instrumentation
+
+    # the process-wide connection pool, created on first use from database.ini
+    @staticmethod
+    def pool() -> ConnectionPool:
+        if DBConnector.__pool is None:
+            with DBConnector.__pool_lock:
+                if DBConnector.__pool is None:
+                    pool_params = DBConnector.__pool_config()
+                    DBConnector.__pool = ConnectionPool(DBConnector.connection_params(),
+                                                        minconn=int(pool_params.get('minconn', 1)),
+                                                        maxconn=int(pool_params.get('maxconn', 10)),
+                                                        idle_timeout=float(pool_params.get('idle_timeout', 300)),
+                                                        health_check_interval=float(
+                                                            pool_params.get('health_check_interval', 30)))
+                    atexit.register(DBConnector.__pool.closeall)
+        return DBConnector.__pool
+
+    # the process-wide router to the replicas of database.ini, created on first use. the replica pools open their
+    # connections on demand, so an unreachable replica is skipped instead of failing the router
+    @staticmethod
+    def replicas() -> ReplicaRouter:
+        if DBConnector.__replicas is None:
+            with DBConnector.__pool_lock:
+                if DBConnector.__replicas is None:
+                    pool_params = DBConnector.__pool_config()
+                    pools = [ConnectionPool(params, minconn=0, maxconn=int(pool_params.get('maxconn', 10)),
+                                            idle_timeout=float(pool_params.get('idle_timeout', 300)),
+                                            health_check_interval=float(pool_params.get('health_check_interval', 30)))
+                             for params in DBConnector.replica_params()]
+                    DBConnector.__replicas = ReplicaRouter(
+                        pools, retry_interval=float(pool_params.get('replica_retry_interval', 30)))
+                    atexit.register(DBConnector.__replicas.closeall)
+        return DBConnector.__replicas
+
+    # the connection parameters of the [postgresql] section of database.ini, with those of override_params()
+    @staticmethod
+    def connection_params() -> dict:
+        return dict(DBConnector.__config(), **DBConnector.__overrides)
+
+    # replaces connection parameters of database.ini (of the primary and the replicas) for the connections opened
+    # from now on, for example options='-c search_path=...'. the pools are closed, so no older connection is used
+    @staticmethod
+    def override_params(**params):
+        DBConnector.__overrides = params
+        DBConnector.close_pool()
+
+    # until unpin(), every DBConnector uses the same connection, in one transaction that unpin() rolls back. the
+    # commits of the connectors only end a savepoint and their rollbacks return to it, so they see each other's work
+    # as usual but leave nothing behind. for tests running in a single thread
+    @staticmethod
+    def pin():
+        pool = DBConnector.pool()
+        connection = pool.getconn()
+        with connection.cursor() as cursor:
+            cursor.execute("SAVEPOINT pinned")
+        connection.savepoint = 'pinned'
+        connection.pending = False
+        DBConnector.__pinned = (pool, connection)
+
+    # rolls back everything done since pin() and returns its connection to the pool
+    @staticmethod
+    def unpin():
+        if DBConnector.__pinned is not None:
+            pool, connection = DBConnector.__pinned
+            DBConnector.__pinned = None
+            connection.savepoint = None
+            pool.putconn(connection)
+
+    # the optional [pool] section of database.ini
+    @staticmethod
+    def pool_params() -> dict:
+        return DBConnector.__pool_config()
+
+    # the connection parameters of every replica in database.ini, with those of override_params()
+    @staticmethod
+    def replica_params() -> list:
+        return [dict(params, **DBConnector.__overrides) for params in DBConnector.__replica_config()]
+
+    # close every pooled connection, the next DBConnector() creates fresh pools
+    @staticmethod
+    def close_pool():
+        with DBConnector.__pool_lock:
+            if DBConnector.__pool is not None:
+                DBConnector.__pool.closeall()
+                DBConnector.__pool = None
+            if DBConnector.__replicas is not None:
+                DBConnector.__replicas.closeall()
+                DBConnector.__replicas = None
+
+    # is the connection to a replica?
+    def on_replica(self) -> bool:
+        return self.connection is not None and self.__on_replica
 
     # commit connection's changes
     def commit(self):
         if self.connection is not None:
             try:
                 self.connection.commit()
+            except _RETRY_TRANSACTION:
+                raise
             except Exception:
                 raise DatabaseException.ConnectionInvalid("Could not commit changes")
 
+    # commits a statement executed outside of a transaction() block. if the connection is lost while committing,
+    # the statement may or may not have been committed, so it is only run again (see __retrying) if idempotent()
+    def __commit_statement(self, idempotent: Callable[[], bool]):
+        try:
+            self.connection.commit()
+        except _CONNECTION_ERRORS:
+            if self.__lost() and not idempotent():
+                raise DatabaseException.ConnectionInvalid("Could not commit changes")
+            raise
+
     # rollback connection's changes
     def rollback(self):
         if self.connection is not None:
@@ -107,25 +756,83 @@ class DBConnector:
             except Exception:
                 raise DatabaseException.ConnectionInvalid("Could not rollback changes")
 
+    # statements executed inside "with conn.transaction():" are committed once when the block exits, or rolled back
+    # if it raises. a nested block is a savepoint: if it raises only its own statements are rolled back
+    @contextlib.contextmanager
+    def transaction(self):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+        if self.__depth == 0:
+            self.__depth = 1
+            try:
+                yield self
+            except BaseException:
+                self.__depth = 0
+                # the server rolls back the transaction of a lost connection itself
+                if not self.__lost():
+                    self.rollback()
+                raise
+            self.__depth = 0
+            self.commit()
+        else:
+            savepoint = sql.Identifier("savepoint_%d" % self.__depth)
+            self.cursor.execute(sql.SQL("SAVEPOINT {}").format(savepoint))
+            self.__depth += 1
+            try:
+                yield self
+            except BaseException:
+                self.__depth -= 1
+                if not self.__lost():
+                    self.cursor.execute(sql.SQL("ROLLBACK TO SAVEPOINT {}").format(savepoint))
+                    self.cursor.execute(sql.SQL("RELEASE SAVEPOINT {}").format(savepoint))
+                raise
+            self.__depth -= 1
+            self.cursor.execute(sql.SQL("RELEASE SAVEPOINT {}").format(savepoint))
+
+    # runs body(self) in a transaction() block and returns its result. the whole transaction is run again, after a
+    # backoff, when it is aborted by a serialization failure or a deadlock or loses its connection before committing,
+    # so body must not have effects outside of the database. nested in another block it is a savepoint like
+    # transaction(), and runs again with the outermost run_transaction
+    def run_transaction(self, body: Callable[['DBConnector'], T]) -> T:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+        def attempt():
+            with self.transaction():
+                return body(self)
+
+        return attempt() if self.__depth > 0 else self.__retrying(attempt)
+
+    # is there an open transaction() block?
+    def in_transaction(self) -> bool:
+        return self.__depth > 0
+
     # executes the query, if it is SELECT you may ask to print the results with printSchema
-    # returns the number of rows effected and a ResultSet (for SELECT)
-    def execute(self, query: Union[str, sql.Composed], printSchema=False) -> (int, ResultSet):
+    # returns the number of rows effected and a ResultSet (for SELECT).
+    # outside of a transaction() block a query that fails for a retryable reason is run again (see __retrying). if the
+    # connection is lost while it is committed, it is only run again if idempotent: True if running it twice has the
+    # same effect and result as running it once, None to decide by the query (reads are idempotent)
+    def execute(self, query: Union[str, sql.Composed], printSchema=False,
+                idempotent: Optional[bool] = None) -> (int, ResultSet):
         if self.connection is None:
             raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        return self.__retrying(lambda: self.__execute(query, printSchema, idempotent=idempotent))
+
+    # a single attempt of execute, name is the fingerprint the statement is recorded with instead of its query
+    def __execute(self, query: Union[str, sql.Composed], printSchema=False, name: Optional[str] = None,
+                  idempotent: Optional[bool] = None):
+        instrumentation = DBConnector.instrumentation
+        if instrumentation is not None:
+            began = time.perf_counter()
 
         # try execute the query
-        try:
+        with sqlstate_errors():
             self.cursor.execute(query)
             row_effected = max(self.cursor.rowcount, 0)
-            self.commit()
-        except errors.lookup("23502"):
-            raise DatabaseException.NOT_NULL_VIOLATION("NOT_NULL_VIOLATION")
-        except errors.lookup("23503"):
-            raise DatabaseException.FOREIGN_KEY_VIOLATION("FOREIGN_KEY_VIOLATION")
-        except errors.lookup("23505"):
-            raise DatabaseException.UNIQUE_VIOLATION("UNIQUE_VIOLATION")
-        except errors.lookup("23514"):
-            raise DatabaseException.CHECK_VIOLATION("CHECK_VIOLATION")
+            if self.__depth == 0:
+                self.__commit_statement(lambda: is_read_only(self.cursor.query.decode())
+                                        if idempotent is None else idempotent)
 
         # get entries in case of SELECT
         if self.cursor.description is not None:
@@ -133,14 +840,233 @@ class DBConnector:
         else:
             entries = ResultSet()
 
+        if instrumentation is not None:
+            instrumentation.record(self, query, time.perf_counter() - began,
+                                   entries.size() if self.cursor.description is not None else row_effected, name)
+
         # print SELECT entries
         if printSchema:
             print(entries)
 
         return row_effected, entries
 
-    # grant credentials
+    # executes the queries in order in one transaction (a savepoint inside a transaction() block), so that if one
+    # fails none of them takes effect, and returns the (number of rows effected, ResultSet) of every query. each
+    # query is a round trip of its own: psycopg2 keeps only the last result of a query string and has no nextset.
+    # outside of a block the transaction is run again like run_transaction. like execute, the queries have no
+    # parameters, their values have to be composed into them with psycopg2.sql
+    def execute_many(self, queries: list, printSchema=False) -> list:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        if not queries:
+            return []
+        return self.run_transaction(lambda conn: [conn.execute(query, printSchema) for query in queries])
+
+    # the plan of the query. a query that only reads (see is_read_only) is explained with EXPLAIN (ANALYZE, BUFFERS),
+    # which executes it in a transaction (or savepoint inside a transaction() block) that is rolled back. a write is
+    # not executed again, its plan is the estimate of a plain EXPLAIN. name is the statement registered under it
+    # that the query EXECUTEs, if any, whose text decides instead
+    def explain(self, query: Union[str, sql.Composed], name: Optional[str] = None) -> str:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+        text = DBConnector.__statements.get(name, query)
+        analyze = is_read_only(text if isinstance(text, str) else text.as_string(self.connection))
+        explain = sql.SQL("EXPLAIN (ANALYZE, BUFFERS) " if analyze else "EXPLAIN ") + \
+            (sql.SQL(query) if isinstance(query, str) else query)
+        if self.__depth == 0:
+            try:
+                self.cursor.execute(explain)
+                plan = self.cursor.fetchall()
+            finally:
+                self.rollback()
+        else:
+            self.cursor.execute("SAVEPOINT explain_plan")
+            try:
+                self.cursor.execute(explain)
+                plan = self.cursor.fetchall()
+            finally:
+                self.cursor.execute("ROLLBACK TO SAVEPOINT explain_plan")
+                self.cursor.execute("RELEASE SAVEPOINT explain_plan")
+        return '\n'.join(row[0] for row in plan)
+
+    # executes the SELECT query through a named server-side cursor and returns a StreamingResultSet that fetches
+    # itersize rows per round trip while it is iterated. no other statement should be executed on this connection
+    # until the iteration is done, unless inside a transaction() block (a commit closes the cursor)
+    def execute_stream(self, query: Union[str, sql.Composed], itersize: int = 2000) -> StreamingResultSet:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+
+        def declare():
+            self.__streams += 1
+            cursor = self.connection.cursor(name="stream_%d" % self.__streams)
+            cursor.itersize = itersize
+            with sqlstate_errors():
+                cursor.execute(query)
+            return cursor
+
+        cursor = self.__retrying(declare)
+
+        instrumentation = DBConnector.instrumentation
+        began = time.perf_counter()
+
+        def rows():
+            fetched = 0
+            try:
+                with sqlstate_errors():
+                    for row in cursor:
+                        fetched += 1
+                        yield row
+            finally:
+                # the cursor fetches itersize rows at a time, and the last fetch comes back short
+                if self.connection is not None:
+                    self.connection.round_trips += fetched // itersize + 1
+                    # a stream is timed from its declaration until it is closed
+                    if instrumentation is not None:
+                        instrumentation.record(self, query, time.perf_counter() - began, fetched, explain=False)
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+                # end the read-only transaction the cursor was declared in
+                if self.__depth == 0 and self.connection is not None:
+                    self.commit()
+
+        return StreamingResultSet(cursor, rows())
+
+    # registers a statement that can be executed by name with execute_prepared, parameters are written $1, $2, ...
+    # a write is idempotent if running it twice has the same effect and result as running it once (reads always are)
+    @staticmethod
+    def define_statement(name: str, query: Union[str, sql.Composed], idempotent: bool = False):
+        DBConnector.__statements[name] = query
+        if idempotent:
+            DBConnector.__idempotent.add(name)
+        else:
+            DBConnector.__idempotent.discard(name)
+
+    # the statement registered under name with define_statement, KeyError if there is none
+    @staticmethod
+    def statement(name: str) -> Union[str, sql.Composed]:
+        return DBConnector.__statements[name]
+
+    # may the statement registered under name, whose text is text, run twice? see define_statement
+    @staticmethod
+    def statement_idempotent(name: str, text: str) -> bool:
+        return name in DBConnector.__idempotent or is_read_only(text)
+
+    # executes the statement registered under name with the given parameters. the statement is PREPAREd on this
+    # connection the first time it is used, so later executions skip parsing and planning. each connection keeps
+    # at most prepared_cache_size statements, the least recently used one is DEALLOCATEd to make room.
+    # returns the number of rows effected and a ResultSet (for SELECT), and is retried, like execute
+    def execute_prepared(self, name: str, params: tuple = (), printSchema=False) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        return self.__retrying(lambda: self.__execute_prepared(name, params, printSchema))
+
+    # a single attempt of execute_prepared, on the connection of the moment
+    def __execute_prepared(self, name: str, params: tuple, printSchema: bool) -> (int, ResultSet):
+        query = DBConnector.__statements[name]
+        text = query if isinstance(query, str) else query.as_string(self.connection)
+        idempotent = DBConnector.statement_idempotent(name, text)
+        for attempt in range(2):
+            server_name = self.__prepared_name(text)
+            execute = sql.SQL("EXECUTE {}").format(sql.Identifier(server_name))
+            if params:
+                execute = sql.SQL("{}({})").format(execute, sql.SQL(', ').join(map(sql.Literal, params)))
+            try:
+                return self.__execute(execute, printSchema, name, idempotent)
+            except (errors.lookup("26000"), errors.lookup("0A000")):
+                # the statement is gone (the session was reset) or its result type changed (the table was
+                # recreated). prepare it again, unless it failed inside a transaction() that is now aborted
+                self.connection.prepared.pop(text, None)
+                if attempt == 1 or self.__depth > 0:
+                    raise
+                self.rollback()
+                self.__deallocate(server_name)
+
+    # server-side name of the prepared statement, preparing it on this connection if needed
+    def __prepared_name(self, text: str) -> str:
+        prepared = self.connection.prepared
+        server_name = prepared.get(text)
+        if server_name is not None:
+            prepared.move_to_end(text)
+            return server_name
+
+        while len(prepared) >= DBConnector.prepared_cache_size:
+            _, evicted = prepared.popitem(last=False)
+            self.__deallocate(evicted)
+        self.connection.prepared_count += 1
+        server_name = "prepared_%d" % self.connection.prepared_count
+        with sqlstate_errors():
+            self.cursor.execute(sql.SQL("PREPARE {} AS ").format(sql.Identifier(server_name)) + sql.SQL(text))
+        prepared[text] = server_name
+        return server_name
+
+    def __deallocate(self, server_name: str):
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute(sql.SQL("DEALLOCATE {}").format(sql.Identifier(server_name)))
+        except Exception:
+            # already gone, nothing is pending outside of a transaction() so the aborted one can be dropped
+            if self.__depth == 0:
+                self.rollback()
+
+    # executes query once for all rows (a list of tuples) using psycopg2.extras.execute_values, the query must
+    # contain a single %s placeholder for the VALUES list and is sent in pages of page_size rows.
+    # if fetch is True the query must have a RETURNING clause, the returned rows of all pages are collected.
+    # returns the number of rows effected (of the last page unless fetch is True) and a ResultSet (for RETURNING).
+    # it is retried like execute, idempotent tells whether it may run again when the connection is lost committing it
+    def execute_values(self, query: Union[str, sql.Composed], rows: list, template: Optional[str] = None,
+                       page_size: int = 1000, fetch: bool = False, printSchema=False,
+                       idempotent: bool = False) -> (int, ResultSet):
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        return self.__retrying(lambda: self.__execute_values(query, rows, template, page_size, fetch, printSchema,
+                                                             idempotent))
+
+    def __execute_values(self, query, rows, template, page_size, fetch, printSchema, idempotent):
+        instrumentation = DBConnector.instrumentation
+        if instrumentation is not None:
+            began = time.perf_counter()
+
+        with sqlstate_errors():
+            returned = extras.execute_values(self.cursor, query, rows, template, page_size, fetch)
+            row_effected = len(returned) if fetch else max(self.cursor.rowcount, 0)
+            if self.__depth == 0:
+                self.__commit_statement(lambda: idempotent)
+
+        # recorded with the query template, which cannot be explained
+        if instrumentation is not None:
+            instrumentation.record(self, query, time.perf_counter() - began, len(rows), explain=False)
+
+        entries = ResultSet(self.cursor.description, returned) if fetch else ResultSet()
+        if printSchema:
+            print(entries)
+
+        return row_effected, entries
+
+    # executes a COPY ... TO STDOUT or COPY ... FROM STDIN statement, writing the rows to or reading them from file
+    # (binary, or text). returns the number of rows copied. it is not retried, the file may be partly read or written
+    def copy_expert(self, query: Union[str, sql.Composed], file) -> int:
+        if self.connection is None:
+            raise DatabaseException.ConnectionInvalid("Connection Invalid")
+        instrumentation = DBConnector.instrumentation
+        if instrumentation is not None:
+            began = time.perf_counter()
+
+        with sqlstate_errors():
+            self.cursor.copy_expert(query, file)
+            row_effected = max(self.cursor.rowcount, 0)
+            if self.__depth == 0:
+                self.__commit_statement(lambda: False)
+
+        if instrumentation is not None:
+            instrumentation.record(self, query, time.perf_counter() - began, row_effected, explain=False)
+        return row_effected
+
+    # grant credentials, database.ini is only parsed once
     @staticmethod
+    @functools.lru_cache(maxsize=None)
     def __config(filename=os.path.join(os.path.join(os.getcwd(), "Utility"), 'database.ini'),
                  section='postgresql'):
         # create a parser
@@ -161,3 +1087,25 @@ class DBConnector:
             if db is None:
                 raise DatabaseException.database_ini_ERROR("Please modify database.ini file under Utility")
         return db
+
+    # optional [pool] section of database.ini, empty if missing
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def __pool_config(section='pool'):
+        for directory in (os.getcwd(), os.path.dirname(os.getcwd())):
+            parser = ConfigParser()
+            if parser.read(os.path.join(directory, 'Utility', 'database.ini')):
+                return dict(parser.items(section)) if parser.has_section(section) else {}
+        return {}
+
+    # the [replica...] sections of database.ini in file order, each completed with the [postgresql] parameters it
+    # leaves out (usually all but host and port)
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def __replica_config() -> tuple:
+        for directory in (os.getcwd(), os.path.dirname(os.getcwd())):
+            parser = ConfigParser()
+            if parser.read(os.path.join(directory, 'Utility', 'database.ini')):
+                return tuple(dict(DBConnector.__config(), **dict(parser.items(section)))
+                             for section in parser.sections() if section.startswith('replica'))
+        return ()
@@ -0,0 +1,168 @@
+import bisect
+import collections
+import functools
+import json
+import random
+import re
+import sys
+import threading
+from typing import Callable, Iterable, Optional
+
+# upper bounds of the latency histogram buckets, in milliseconds. the last bucket has no bound
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# the modules whose public functions are reported as the callers of statements
+CALLER_MODULES = ('Solution', 'SolutionAio')
+
+# statements that EXPLAIN accepts
+_EXPLAINABLE = re.compile(r"\s*(\(|select|with|insert|update|delete|values|execute)\b", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACE = re.compile(r"\s+")
+
+StatementEvent = collections.namedtuple('StatementEvent', ['fingerprint', 'query', 'seconds', 'rows', 'caller',
+                                                           'plan'])
+
+
+# the query with its literals replaced by ? and its whitespace collapsed, so executions of the same statement with
+# different values have the same fingerprint
+@functools.lru_cache(maxsize=4096)
+def fingerprint(query: str) -> str:
+    query = _STRING.sub('?', query)
+    query = _NUMBER.sub('?', query)
+    query = _LIST.sub('?, ...', query)
+    return _SPACE.sub(' ', query).strip()
+
+
+# the name of the innermost public function of CALLER_MODULES on the stack, None if there is none. helpers nested
+# in a function (e.g. the load closures of the caches) are skipped in favour of the function that defines them: only
+# the code of the module level function of that name counts
+def calling_function() -> Optional[str]:
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if frame.f_globals.get('__name__') in CALLER_MODULES and not code.co_name.startswith('_') \
+                and getattr(frame.f_globals.get(code.co_name), '__code__', None) is code:
+            return code.co_name
+        frame = frame.f_back
+    return None
+
+
+class StatementStats:
+    # the statistics of one statement fingerprint, updated under the lock of its StatsRegistry
+    def __init__(self, max_plans: int):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.callers = collections.Counter()
+        self.plans = collections.deque(maxlen=max_plans)  # the latest captured (milliseconds, caller, plan)
+
+    def add(self, event: StatementEvent):
+        self.count += 1
+        self.total_seconds += event.seconds
+        self.max_seconds = max(self.max_seconds, event.seconds)
+        self.rows += event.rows
+        self.histogram[bisect.bisect_left(HISTOGRAM_BOUNDS_MS, event.seconds * 1000)] += 1
+        if event.caller is not None:
+            self.callers[event.caller] += 1
+        if event.plan is not None:
+            self.plans.append((event.seconds * 1000, event.caller, event.plan))
+
+    def as_dict(self) -> dict:
+        labels = ['<=%gms' % bound for bound in HISTOGRAM_BOUNDS_MS] + ['>%gms' % HISTOGRAM_BOUNDS_MS[-1]]
+        return {
+            'count': self.count,
+            'total_ms': self.total_seconds * 1000,
+            'mean_ms': self.total_seconds * 1000 / self.count if self.count else 0.0,
+            'max_ms': self.max_seconds * 1000,
+            'rows': self.rows,
+            'histogram': {label: n for label, n in zip(labels, self.histogram) if n},
+            'callers': dict(self.callers),
+            'plans': [{'ms': ms, 'caller': caller, 'plan': plan} for ms, caller, plan in self.plans],
+        }
+
+
+class StatsRegistry:
+    """
+    Thread-safe statistics of the executed statements per fingerprint: the number of executions, their total,
+    mean and maximal time, a latency histogram, the rows returned or effected, the Solution functions they were
+    executed by, and the latest max_plans query plans captured for them.
+    """
+
+    def __init__(self, max_plans: int = 5):
+        self.max_plans = max_plans
+        self.__statements = {}  # fingerprint -> StatementStats
+        self.__lock = threading.Lock()
+
+    def __call__(self, event: StatementEvent):
+        with self.__lock:
+            stats = self.__statements.get(event.fingerprint)
+            if stats is None:
+                stats = self.__statements[event.fingerprint] = StatementStats(self.max_plans)
+            stats.add(event)
+
+    # the statistics of every fingerprint, slowest in total first
+    def dump(self) -> dict:
+        with self.__lock:
+            ordered = sorted(self.__statements.items(), key=lambda item: item[1].total_seconds, reverse=True)
+            return {fingerprint: stats.as_dict() for fingerprint, stats in ordered}
+
+    def dump_json(self, path: str):
+        with open(path, 'w') as output:
+            json.dump(self.dump(), output, indent=2)
+
+    def reset(self):
+        with self.__lock:
+            self.__statements.clear()
+
+
+class Instrumentation:
+    """
+    Records every statement executed by a DBConnector once installed with DBConnector.instrument(). Each execution
+    is passed to every hook as a StatementEvent: its fingerprint (the statement name for prepared statements), the
+    query, its duration in seconds, the rows returned or effected, the Solution function that executed it and
+    its plan, if one was captured.
+
+    A plan is captured for a sample of the statements slower than slow_ms milliseconds: each such statement is
+    explained with probability explain_sample_rate (see DBConnector.explain). A statement that only reads is
+    explained with EXPLAIN (ANALYZE, BUFFERS) and runs a second time for this, in a transaction or savepoint that is
+    rolled back. A write is never run again, its plan is the estimate of a plain EXPLAIN.
+    """
+
+    def __init__(self, hooks: Iterable[Callable[[StatementEvent], None]] = (), registry: StatsRegistry = None,
+                 slow_ms: Optional[float] = None, explain_sample_rate: float = 0.0):
+        self.registry = StatsRegistry() if registry is None else registry
+        self.hooks = [self.registry] + list(hooks)
+        self.slow_ms = slow_ms
+        self.explain_sample_rate = explain_sample_rate
+
+    # called by DBConnector after a statement succeeded, name is the fingerprint to use instead of the query's (the
+    # name of the prepared statement it executed, if any).
+    # statements executed in several parts (streams, execute_values) are not explained
+    def record(self, connector, query, seconds: float, rows: int, name: Optional[str] = None, explain: bool = True):
+        text = query if isinstance(query, str) else query.as_string(connector.connection)
+        plan = None
+        if explain and self.slow_ms is not None and seconds * 1000 >= self.slow_ms and _EXPLAINABLE.match(text) \
+                and random.random() < self.explain_sample_rate:
+            try:
+                plan = connector.explain(query, name)
+            except Exception as e:
+                plan = 'EXPLAIN failed: %s' % e
+        event = StatementEvent(name or fingerprint(text), text, seconds, rows, calling_function(), plan)
+        for hook in self.hooks:
+            hook(event)
+
+
+# a hook that prints the statements slower than slow_ms milliseconds
+def slow_query_log(slow_ms: float, output=None) -> Callable[[StatementEvent], None]:
+    def hook(event: StatementEvent):
+        if event.seconds * 1000 >= slow_ms:
+            print('slow statement (%.1fms, %d rows, from %s): %s'
+                  % (event.seconds * 1000, event.rows, event.caller, event.query), file=output or sys.stderr)
+            if event.plan is not None:
+                print(event.plan, file=output or sys.stderr)
+
+    return hook